@@ -4,9 +4,10 @@ from experiment.TC_Configuration import TC_Configuration
 from experiment.TrafficClasses import CoDel, DropTail
 from experiment.CC_Stacks_Configuration import Stack_Client_Config, Stack_Server_Config, CC_ALGO, ECN_TYPE, SPIN_TYPE
 from experiment.iperf3_Configuration import IPERF3_UDP_Client_Config, IPERF3_UDP_Server_Config 
-from experiment.ClassifierConfiguration import Classifier_Configuration, RESPONSIVE_TEST
-from experiment.ExperimentConfiguration import ExperimentConfiguration, global_logger
+from experiment.ClassifierConfiguration import Classifier_Configuration, OUTPUT_POLICY, RESPONSIVE_TEST
+from experiment.ExperimentConfiguration import ExperimentConfiguration, global_logger, stop_classifier_daemon
 import datetime
+import io
 import time
 import progressbar
 import json
@@ -14,7 +15,12 @@ import os
 import argparse
 import pathlib
 import math
-from experiment.sshConnector import SSHConnector
+from experiment.sshConnector import SSHConnectionPool
+from experiment.VirtualTestbed import VirtualTestbed
+from experiment.TrafficFileCache import TrafficFileCache
+from experiment.Scheduler import TestbedScheduler
+from experiment.Journal import Journal
+from experiment.Planner import print_plan
 
 def round_half_up(n, decimals=0):
     multiplier = 10**decimals
@@ -24,6 +30,9 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", "-c", help="Config file to be used for the experiment (stored in `configurations/`)", default="test-config.json")
+    parser.add_argument("--backend", "-b", help="Run on the physical testbed via ssh or on a local network-namespace testbed (overrides TESTBED.BACKEND)", choices=["ssh", "namespace"], default=None)
+    parser.add_argument("--resume", "-r", help="Skip experiments and iterations that the journal of a previous run records as done and continue in their result folders", action="store_true")
+    parser.add_argument("--plan", "-p", help="Only print the estimated testbed time and result volume of the configuration", action="store_true")
     args = parser.parse_args()
 
     configuration = None
@@ -71,31 +80,47 @@ if __name__ == "__main__":
 
     RESULT_MAIN_PATH = os.path.join(configuration["ORCHESTRATION"]["RESULT_PATH"], configuration["ORCHESTRATION"]["OVERALL_NAME"])
     os.makedirs(RESULT_MAIN_PATH, exist_ok=True)
-    for experiment_configuration in progressbar.progressbar(configuration["EXPERIMENTS"]):
+    # records the finished experiments and iterations for --resume
+    JOURNAL = Journal(os.path.join(RESULT_MAIN_PATH, "journal.jsonl"))
+
+    RESET_SSH_PER_ITERATION = configuration["ORCHESTRATION"]["RESET_SSH_PER_ITERATION"] if "RESET_SSH_PER_ITERATION" in configuration["ORCHESTRATION"].keys() else False
+    TC_INCREMENTAL = configuration["ORCHESTRATION"]["TC_INCREMENTAL"] if "TC_INCREMENTAL" in configuration["ORCHESTRATION"].keys() else True
+    COLLECTION_WORKERS = configuration["ORCHESTRATION"]["COLLECTION_WORKERS"] if "COLLECTION_WORKERS" in configuration["ORCHESTRATION"].keys() else 4
+    COLLECTION_QUEUE_SIZE = configuration["ORCHESTRATION"]["COLLECTION_QUEUE_SIZE"] if "COLLECTION_QUEUE_SIZE" in configuration["ORCHESTRATION"].keys() else 64
+    READY_TIMEOUT_S = configuration["ORCHESTRATION"]["READY_TIMEOUT_S"] if "READY_TIMEOUT_S" in configuration["ORCHESTRATION"].keys() else 60
+    COMPRESSION = configuration["ORCHESTRATION"]["COMPRESSION"] if "COMPRESSION" in configuration["ORCHESTRATION"].keys() else {}
+    ADAPTIVE = configuration["ORCHESTRATION"]["ADAPTIVE"] if "ADAPTIVE" in configuration["ORCHESTRATION"].keys() else {}
+    TRACING = configuration["ORCHESTRATION"]["TRACING"] if "TRACING" in configuration["ORCHESTRATION"].keys() else True
+    RESIDENT_CLASSIFIER = configuration["ORCHESTRATION"]["RESIDENT_CLASSIFIER"] if "RESIDENT_CLASSIFIER" in configuration["ORCHESTRATION"].keys() else True
+    CLASSIFIER_LOG_FORMAT = configuration["ORCHESTRATION"]["CLASSIFIER_LOG_FORMAT"] if "CLASSIFIER_LOG_FORMAT" in configuration["ORCHESTRATION"].keys() else "csv"
+    CLASSIFIER_OUTPUT = configuration["ORCHESTRATION"]["CLASSIFIER_OUTPUT"] if "CLASSIFIER_OUTPUT" in configuration["ORCHESTRATION"].keys() else "records"
+    if CLASSIFIER_OUTPUT not in ["records", "summaries", "both"]:
+        raise Exception(f"Unknown CLASSIFIER_OUTPUT {CLASSIFIER_OUTPUT}, use records, summaries, or both.")
+    CLASSIFIER_SUMMARY_INTERVAL_S = configuration["ORCHESTRATION"]["CLASSIFIER_SUMMARY_INTERVAL_S"] if "CLASSIFIER_SUMMARY_INTERVAL_S" in configuration["ORCHESTRATION"].keys() else 0
+    CLASSIFIER_OUTPUT_POLICY = configuration["ORCHESTRATION"]["CLASSIFIER_OUTPUT_POLICY"] if "CLASSIFIER_OUTPUT_POLICY" in configuration["ORCHESTRATION"].keys() else {}
+    TCP_PROBE = configuration["ORCHESTRATION"]["TCP_PROBE"] if "TCP_PROBE" in configuration["ORCHESTRATION"].keys() else {}
+    CLASSIFIER_RINGBUF_PAGES = configuration["ORCHESTRATION"]["CLASSIFIER_RINGBUF_PAGES"] if "CLASSIFIER_RINGBUF_PAGES" in configuration["ORCHESTRATION"].keys() else 256
+    TRAFFIC_FILE_CACHE = TrafficFileCache(traffic_files_path=configuration["ORCHESTRATION"]["TRAFFIC_FILES_PATH"],
+                                          budget_mb=configuration["ORCHESTRATION"]["TRAFFIC_FILES_BUDGET_MB"] if "TRAFFIC_FILES_BUDGET_MB" in configuration["ORCHESTRATION"].keys() else None,
+                                          verify_checksum=configuration["ORCHESTRATION"]["TRAFFIC_FILES_VERIFY_CHECKSUM"] if "TRAFFIC_FILES_VERIFY_CHECKSUM" in configuration["ORCHESTRATION"].keys() else False)
+
+    # a single testbed or a list of testbeds that share the experiments
+    TESTBEDS = configuration["TESTBED"] if isinstance(configuration["TESTBED"], list) else [configuration["TESTBED"]]
+
+    if args.plan:
+        print_plan(configuration, [TestbedScheduler.name(testbed) for testbed in TESTBEDS], journal=JOURNAL if args.resume else None)
+        exit(0)
+
+    def RUN_EXPERIMENT(experiment_configuration, testbed, GET_DEVICE):
 
         print(f" Current time: {datetime.datetime.now()}, Start time: {start_time}")
 
         try:
 
-            BOTTLE  = SSHConnector(management_ip=configuration["TESTBED"]["DEVICE_IP"]["BOTTLE"],
-                                    local_ip=configuration["TESTBED"]["LOCAL_IP"]["BOTTLE"],
-                                    user=configuration["TESTBED"]["USERNAME"],
-                                    key_filename=configuration["TESTBED"]["KEY_FILE"])
-
-            LOAD1  = SSHConnector(management_ip=configuration["TESTBED"]["DEVICE_IP"]["LOAD1"],
-                                    local_ip=configuration["TESTBED"]["LOCAL_IP"]["LOAD1"],
-                                    user=configuration["TESTBED"]["USERNAME"],
-                                    key_filename=configuration["TESTBED"]["KEY_FILE"])
-
-            LOAD2  = SSHConnector(management_ip=configuration["TESTBED"]["DEVICE_IP"]["LOAD2"],
-                                    local_ip=configuration["TESTBED"]["LOCAL_IP"]["LOAD2"],
-                                    user=configuration["TESTBED"]["USERNAME"],
-                                    key_filename=configuration["TESTBED"]["KEY_FILE"])
-
-            CLIENT  = SSHConnector(management_ip=configuration["TESTBED"]["DEVICE_IP"]["CLIENT"],
-                                    local_ip=configuration["TESTBED"]["LOCAL_IP"]["CLIENT"],
-                                    user=configuration["TESTBED"]["USERNAME"],
-                                    key_filename=configuration["TESTBED"]["KEY_FILE"])
+            BOTTLE = GET_DEVICE("BOTTLE")
+            LOAD1 = GET_DEVICE("LOAD1")
+            LOAD2 = GET_DEVICE("LOAD2")
+            CLIENT = GET_DEVICE("CLIENT")
 
             QUEUES = {
                 "CODEL_ECN": CoDel(bandwidth_limit_soft=experiment_configuration["BW"], 
@@ -256,9 +281,9 @@ if __name__ == "__main__":
             LOCAL_PORT_START = (1 << 11)  + 1024
             for client_number, client_config in enumerate(experiment_configuration["CLIENT_CONFIGS"]):
 
-                SERVER_IP = configuration["TESTBED"]["LOCAL_IP"]["LOAD1"] if client_config["SERVER_MACHINE"] == 1 else configuration["TESTBED"]["LOCAL_IP"]["LOAD2"]
+                SERVER_IP = testbed["LOCAL_IP"]["LOAD1"] if client_config["SERVER_MACHINE"] == 1 else testbed["LOCAL_IP"]["LOAD2"]
                 IPERF_DEVICE = LOAD1 if client_config["SERVER_MACHINE"] == 1 else LOAD2
-                CLIENT_IP = configuration["TESTBED"]["LOCAL_IP"]["CLIENT"]
+                CLIENT_IP = testbed["LOCAL_IP"]["CLIENT"]
 
                 CLIENT_PORT = LOCAL_PORT_START+client_number
                 SERVER_PORT = None
@@ -324,7 +349,7 @@ if __name__ == "__main__":
                             flow_config["BW"], 
                             flow_config["START_DELAY"],
                             CLIENT, 
-                            configuration["TESTBED"]["LOCAL_IP"]["LOAD1"], 
+                            testbed["LOCAL_IP"]["LOAD1"], 
                             timeout=experiment_configuration["WATCHDOG_TIMEOUT"] if "WATCHDOG_TIMEOUT" in experiment_configuration.keys() else 900,
                             target_port=SERVER_PORT, 
                             local_port=LOCAL_PORT_START+CLIENT_NUMBER,
@@ -332,9 +357,9 @@ if __name__ == "__main__":
                     )
 
                     IP_PORT_CLIENT_SERVER_MAPPING[CLIENT_NUMBER] = {
-                        "SERVER_IP": configuration["TESTBED"]["LOCAL_IP"]["LOAD1"],
+                        "SERVER_IP": testbed["LOCAL_IP"]["LOAD1"],
                         "SERVER_PORT": SERVER_PORT,
-                        "CLIENT_IP": configuration["TESTBED"]["LOCAL_IP"]["CLIENT"],
+                        "CLIENT_IP": testbed["LOCAL_IP"]["CLIENT"],
                         "CLIENT_PORT": CLIENT_PORT,
                         "SERVER_STACK": "IPERF_UDP",
                         "SERVER_CCA": "None",
@@ -364,7 +389,7 @@ if __name__ == "__main__":
                             flow_config["BW"], 
                             flow_config["START_DELAY"],
                             CLIENT, 
-                            configuration["TESTBED"]["LOCAL_IP"]["LOAD2"], 
+                            testbed["LOCAL_IP"]["LOAD2"], 
                             timeout=experiment_configuration["WATCHDOG_TIMEOUT"] if "WATCHDOG_TIMEOUT" in experiment_configuration.keys() else 900,
                             target_port=SERVER_PORT, 
                             local_port=LOCAL_PORT_START+CLIENT_NUMBER,
@@ -373,9 +398,9 @@ if __name__ == "__main__":
 
 
                     IP_PORT_CLIENT_SERVER_MAPPING[CLIENT_NUMBER] = {
-                        "SERVER_IP": configuration["TESTBED"]["LOCAL_IP"]["LOAD1"],
+                        "SERVER_IP": testbed["LOCAL_IP"]["LOAD1"],
                         "SERVER_PORT": SERVER_PORT,
-                        "CLIENT_IP": configuration["TESTBED"]["LOCAL_IP"]["CLIENT"],
+                        "CLIENT_IP": testbed["LOCAL_IP"]["CLIENT"],
                         "CLIENT_PORT": CLIENT_PORT,
                         "SERVER_STACK": "IPERF_UDP",
                         "SERVER_CCA": "None",
@@ -502,24 +527,24 @@ if __name__ == "__main__":
             tc_config = class_mapping = None
             if experiment_configuration["MULTICLASS_AQM_DEPLOY"]:
                 tc_config = TC_Configuration(
-                    ingress_device=configuration["TESTBED"]["INGRESS_DEVICE"], 
-                    egress_device=configuration["TESTBED"]["EGRESS_DEVICE"], 
-                    client_device=configuration["TESTBED"]["CLIENT_DEVICE"], 
+                    ingress_device=testbed["INGRESS_DEVICE"], 
+                    egress_device=testbed["EGRESS_DEVICE"], 
+                    client_device=testbed["CLIENT_DEVICE"], 
                     trafficClasses=[GOOD_AQM, BAD_AQM],
                     defaultTrafficClass=configuration["PARAMETERS"]["STANDARD_QUEUE"],
-                    first_ifb=configuration["TESTBED"]["FIRST_IFB"],
-                    second_ifb=configuration["TESTBED"]["SECOND_IFB"])
+                    first_ifb=testbed["FIRST_IFB"],
+                    second_ifb=testbed["SECOND_IFB"])
 
                 class_mapping = CLASS_MAPPING["MULTICLASS"]
             else:
                 tc_config = TC_Configuration(
-                    ingress_device=configuration["TESTBED"]["INGRESS_DEVICE"], 
-                    egress_device=configuration["TESTBED"]["EGRESS_DEVICE"], 
-                    client_device=configuration["TESTBED"]["CLIENT_DEVICE"], 
+                    ingress_device=testbed["INGRESS_DEVICE"], 
+                    egress_device=testbed["EGRESS_DEVICE"], 
+                    client_device=testbed["CLIENT_DEVICE"], 
                     trafficClasses=[AQM],
                     defaultTrafficClass=configuration["PARAMETERS"]["STANDARD_QUEUE"],
-                    first_ifb=configuration["TESTBED"]["FIRST_IFB"],
-                    second_ifb=configuration["TESTBED"]["SECOND_IFB"])
+                    first_ifb=testbed["FIRST_IFB"],
+                    second_ifb=testbed["SECOND_IFB"])
                 class_mapping = CLASS_MAPPING["SINGLECLASS"]
         
             classifier_config = Classifier_Configuration(mapping=class_mapping, 
@@ -533,11 +558,19 @@ if __name__ == "__main__":
                                                             ECN_UNCLASS_LOSS_RESP_classid=configuration["PARAMETERS"]["ECN_UNCLASS_LOSS_RESP"], 
                                                             ECN_UNRESP_LOSS_RESP_classid=configuration["PARAMETERS"]["ECN_UNRESP_LOSS_RESP"], 
                                                             ECN_UNCLASS_LOSS_UNRESP_classid=configuration["PARAMETERS"]["ECN_UNCLASS_LOSS_UNRESP"],
-                                                            bottleneck_device=configuration["TESTBED"]["INGRESS_DEVICE"],
-                                                            client_device=configuration["TESTBED"]["CLIENT_DEVICE"],
+                                                            bottleneck_device=testbed["INGRESS_DEVICE"],
+                                                            client_device=testbed["CLIENT_DEVICE"],
                                                             measurement_subnet=BOTTLE.local_ip,
-                                                            first_ifb=configuration["TESTBED"]["FIRST_IFB"],
-                                                            second_ifb=configuration["TESTBED"]["SECOND_IFB"]
+                                                            first_ifb=testbed["FIRST_IFB"],
+                                                            second_ifb=testbed["SECOND_IFB"],
+                                                            ringbuf_pages=CLASSIFIER_RINGBUF_PAGES,
+                                                            records=CLASSIFIER_OUTPUT in ["records", "both"],
+                                                            summaries=CLASSIFIER_OUTPUT in ["summaries", "both"],
+                                                            output_policy=OUTPUT_POLICY[CLASSIFIER_OUTPUT_POLICY["POLICY"] if "POLICY" in CLASSIFIER_OUTPUT_POLICY.keys() else "ALL"],
+                                                            output_every_nth=CLASSIFIER_OUTPUT_POLICY["N"] if "N" in CLASSIFIER_OUTPUT_POLICY.keys() else 10,
+                                                            output_rate=CLASSIFIER_OUTPUT_POLICY["RATE"] if "RATE" in CLASSIFIER_OUTPUT_POLICY.keys() else 100,
+                                                            output_burst=CLASSIFIER_OUTPUT_POLICY["BURST"] if "BURST" in CLASSIFIER_OUTPUT_POLICY.keys() else 10,
+                                                            output_rtt_change_percent=CLASSIFIER_OUTPUT_POLICY["RTT_CHANGE_PERCENT"] if "RTT_CHANGE_PERCENT" in CLASSIFIER_OUTPUT_POLICY.keys() else 10
                                                         )
             
             config:ExperimentConfiguration = ExperimentConfiguration(result_folder_path=RESULT_FOLDER, 
@@ -560,12 +593,34 @@ if __name__ == "__main__":
                                                                         load1=LOAD1,
                                                                         load2=LOAD2,
                                                                         client=CLIENT,
-                                                                        interfaces=[configuration["TESTBED"]["CLIENT_DEVICE"], 
-                                                                                    configuration["TESTBED"]["INGRESS_DEVICE"], 
-                                                                                    configuration["TESTBED"]["EGRESS_DEVICE"], 
-                                                                                    configuration["TESTBED"]["FIRST_IFB"], 
-                                                                                    configuration["TESTBED"]["SECOND_IFB"]],
-                                                                        tc_viz_path=configuration["ORCHESTRATION"]["TC_VIZ_PATH"])
+                                                                        interfaces=[testbed["CLIENT_DEVICE"], 
+                                                                                    testbed["INGRESS_DEVICE"], 
+                                                                                    testbed["EGRESS_DEVICE"], 
+                                                                                    testbed["FIRST_IFB"], 
+                                                                                    testbed["SECOND_IFB"]],
+                                                                        tc_viz_path=configuration["ORCHESTRATION"]["TC_VIZ_PATH"],
+                                                                        reset_ssh_per_iteration=RESET_SSH_PER_ITERATION,
+                                                                        traffic_file_cache=TRAFFIC_FILE_CACHE,
+                                                                        tc_incremental=TC_INCREMENTAL,
+                                                                        collection_workers=COLLECTION_WORKERS,
+                                                                        collection_queue_size=COLLECTION_QUEUE_SIZE,
+                                                                        compression_codec=COMPRESSION["CODEC"] if "CODEC" in COMPRESSION.keys() else "brotli",
+                                                                        compression_level=COMPRESSION["LEVEL"] if "LEVEL" in COMPRESSION.keys() else None,
+                                                                        compression_workers=COMPRESSION["WORKERS"] if "WORKERS" in COMPRESSION.keys() else None,
+                                                                        ready_timeout_s=READY_TIMEOUT_S,
+                                                                        journal=JOURNAL,
+                                                                        resume=args.resume,
+                                                                        adaptive_min_iterations=(ADAPTIVE["MIN_ITERATIONS"] if "MIN_ITERATIONS" in ADAPTIVE.keys() else 5) if ADAPTIVE else None,
+                                                                        adaptive_rel_width=ADAPTIVE["REL_WIDTH"] if "REL_WIDTH" in ADAPTIVE.keys() else 0.05,
+                                                                        adaptive_confidence=ADAPTIVE["CONFIDENCE"] if "CONFIDENCE" in ADAPTIVE.keys() else 0.95,
+                                                                        tracing=TRACING,
+                                                                        resident_classifier=RESIDENT_CLASSIFIER,
+                                                                        classifier_log_format=CLASSIFIER_LOG_FORMAT,
+                                                                        classifier_summary_interval_s=CLASSIFIER_SUMMARY_INTERVAL_S,
+                                                                        tcp_probe_binary=TCP_PROBE["BINARY"] if "BINARY" in TCP_PROBE.keys() else False,
+                                                                        tcp_probe_on_change=TCP_PROBE["ON_CHANGE"] if "ON_CHANGE" in TCP_PROBE.keys() else False,
+                                                                        tcp_probe_min_interval_us=TCP_PROBE["MIN_INTERVAL_US"] if "MIN_INTERVAL_US" in TCP_PROBE.keys() else 0,
+                                                                        remote_compression_level=(COMPRESSION["REMOTE_LEVEL"] if "REMOTE_LEVEL" in COMPRESSION.keys() else 3) if "REMOTE" in COMPRESSION.keys() and COMPRESSION["REMOTE"] else None)
             
             config_file_dump = {
                 "experiment_config": experiment_configuration,
@@ -584,5 +639,59 @@ if __name__ == "__main__":
         finally:
             pass
 
+    def RUN_TESTBED(testbed, experiments, report):
+        # one multiplexed ssh transport per host for the whole run
+        SSH_POOL = SSHConnectionPool()
+        BACKEND = args.backend
+        if BACKEND is None:
+            BACKEND = testbed["BACKEND"] if "BACKEND" in testbed.keys() else "ssh"
+        VIRTUAL_TESTBED = None
+        if BACKEND == "namespace":
+            VIRTUAL_TESTBED = VirtualTestbed(testbed,
+                                             working_dir=testbed["NAMESPACE_WORKDIR"] if "NAMESPACE_WORKDIR" in testbed.keys() else "/tmp/crq-testbed",
+                                             prefix=testbed["NAMESPACE_PREFIX"] if "NAMESPACE_PREFIX" in testbed.keys() else "crq")
+            VIRTUAL_TESTBED.setup()
+
+        def GET_DEVICE(host):
+            if VIRTUAL_TESTBED is not None:
+                return VIRTUAL_TESTBED.connector(host)
+            return SSH_POOL.get(management_ip=testbed["DEVICE_IP"][host],
+                                local_ip=testbed["LOCAL_IP"][host],
+                                user=testbed["USERNAME"],
+                                key_filename=testbed["KEY_FILE"])
+
+        for experiment_configuration in experiments:
+            experiment_start = time.perf_counter()
+            RUN_EXPERIMENT(experiment_configuration, testbed, GET_DEVICE)
+            report(experiment_configuration, time.perf_counter() - experiment_start)
+
+        # the classifier stays loaded across experiments with the same classifier configuration
+        stop_classifier_daemon(GET_DEVICE("BOTTLE"))
+
+        if VIRTUAL_TESTBED is not None:
+            VIRTUAL_TESTBED.teardown()
+        else:
+            # with TC_INCREMENTAL the qdisc tree is kept across experiments, remove it once all are done
+            BOTTLE = GET_DEVICE("BOTTLE")
+            if BOTTLE.applied_tc_tree is not None:
+                print("Clear TC after all experiments.")
+                tc_config = TC_Configuration(ingress_device=testbed["INGRESS_DEVICE"],
+                                             egress_device=testbed["EGRESS_DEVICE"],
+                                             client_device=testbed["CLIENT_DEVICE"],
+                                             trafficClasses=[],
+                                             defaultTrafficClass=configuration["PARAMETERS"]["STANDARD_QUEUE"],
+                                             first_ifb=testbed["FIRST_IFB"],
+                                             second_ifb=testbed["SECOND_IFB"])
+                BOTTLE.get_connection().run("sudo tc -force -batch -", in_stream=io.StringIO(tc_config.get_clear_batch().script()), hide=True, warn=True)
+            print(SSH_POOL.report())
+            global_logger.info(SSH_POOL.report())
+            SSH_POOL.close_all()
+
+    if len(TESTBEDS) == 1:
+        RUN_TESTBED(TESTBEDS[0], progressbar.progressbar(configuration["EXPERIMENTS"]), lambda experiment_configuration, seconds: None)
+    else:
+        # experiments are handed out to whichever testbed is free, all results end up below RESULT_MAIN_PATH
+        TestbedScheduler(TESTBEDS, RUN_TESTBED, iterations=configuration["ORCHESTRATION"]["ITERATIONS"]).run(configuration["EXPERIMENTS"], progress=progressbar.progressbar)
+
     print(f"End time: {datetime.datetime.now()}")
     print(f"Experiments took {(time.perf_counter() - START_TIME)} seconds")
\ No newline at end of file
@@ -0,0 +1,151 @@
+from invoke import Promise, Result, watchers
+from typing import Callable, List, Union
+from time import time_ns
+from .Tracing import program
+import asyncio
+
+class MarkerWatcher(watchers.StreamWatcher):
+    """Calls `callback` from invoke's IO thread as soon as `marker` shows up in the stream."""
+    def __init__(self, marker:str, callback:Callable[[], None]):
+        super().__init__()
+        self.marker = marker
+        self.callback = callback
+        self.seen = False
+
+    def submit(self, stream):
+        if not self.seen and self.marker in stream:
+            self.seen = True
+            self.callback()
+        return []
+
+class ReadinessError(Exception):
+    """A remote process did not report readiness."""
+    def __init__(self, process:"RemoteProcess", reason:str):
+        self.process = process
+        self.reason = reason
+
+    def __str__(self) -> str:
+        host = getattr(self.process.device, "management_ip", self.process.device)
+        return f"{self.reason}\nHost: {host}\nCommand: {self.process.command}\nExpected marker: {self.process.ready_marker}\nLast output:\n{self.process.output_tail()}"
+
+class RemoteProcess:
+    """Awaitable handle for a command that runs asynchronously on a testbed device."""
+    def __init__(self, device, command:str, ready_marker:Union[str, None] = None, poll_interval_s:float = 0.01, **run_kwargs):
+        self.device = device
+        self.command = command
+        self.ready_marker = ready_marker
+        self.promise: Union[Promise, None] = None
+        self.result: Union[Result, None] = None
+        self.exception: Union[Exception, None] = None
+        self.start_time_ns: Union[int, None] = None
+        self.ready_time_ns: Union[int, None] = None
+        self.end_time_ns: Union[int, None] = None
+        self._poll_interval_s = poll_interval_s
+        self._run_kwargs = run_kwargs
+        self._ready: Union[asyncio.Event, None] = None
+        self._joined = False
+        self._callbacks: List[Callable[["RemoteProcess"], None]] = []
+
+    def start(self, loop:asyncio.AbstractEventLoop) -> "RemoteProcess":
+        self._ready = asyncio.Event()
+        run_watchers = list(self._run_kwargs.pop("watchers", []))
+        if self.ready_marker is not None:
+            run_watchers.append(MarkerWatcher(self.ready_marker, lambda: self._mark_ready(loop)))
+        self.start_time_ns = time_ns()
+        self.promise = self.device.get_connection().run(self.command, asynchronous=True, watchers=run_watchers, **self._run_kwargs)
+        return self
+
+    def _mark_ready(self, loop:asyncio.AbstractEventLoop):
+        self.ready_time_ns = time_ns()
+        loop.call_soon_threadsafe(self._ready.set)
+
+    @property
+    def finished(self) -> bool:
+        return self._joined or self.promise.runner.process_is_finished
+
+    def add_done_callback(self, callback:Callable[["RemoteProcess"], None]):
+        if self._joined:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def output_tail(self, characters:int = 2000) -> str:
+        if self.promise is None:
+            return ""
+        output = "".join(self.promise.runner.stdout) + "".join(self.promise.runner.stderr)
+        return output[-characters:]
+
+    async def ready(self, timeout_s:Union[float, None] = None):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_s if timeout_s else None
+        while not self._ready.is_set():
+            # a process that already exited will never print its marker
+            if self.finished:
+                raise ReadinessError(self, "Process exited before it was ready.")
+            if deadline is not None and loop.time() >= deadline:
+                raise ReadinessError(self, f"Process not ready after {timeout_s}s.")
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=0.1)
+            except asyncio.TimeoutError:
+                pass
+
+    async def wait(self) -> Result:
+        while not self.finished:
+            await asyncio.sleep(self._poll_interval_s)
+        return self.join()
+
+    def join(self) -> Result:
+        if not self._joined:
+            try:
+                self.result = self.promise.join()
+            except Exception as e:
+                self.exception = e
+            self._joined = True
+            self.end_time_ns = time_ns()
+            for callback in self._callbacks:
+                callback(self)
+        if self.exception is not None:
+            raise self.exception
+        return self.result
+
+
+class OrchestrationEngine:
+    """Drives RemoteProcesses on a private event loop so that phases continue the instant a process finishes or reports readiness."""
+    def __init__(self, poll_interval_s:float = 0.01, ready_timeout_s:Union[float, None] = 60):
+        self._poll_interval_s = poll_interval_s
+        self._ready_timeout_s = ready_timeout_s
+        self._loop = asyncio.new_event_loop()
+        # optional Tracing.Tracer that receives a span per finished process
+        self.tracer = None
+
+    def start(self, device, command:str, ready_marker:Union[str, None] = None, **run_kwargs) -> RemoteProcess:
+        process = RemoteProcess(device, command, ready_marker=ready_marker, poll_interval_s=self._poll_interval_s, **run_kwargs)
+        if self.tracer is not None:
+            process.add_done_callback(self._trace)
+        return process.start(self._loop)
+
+    def _trace(self, process:RemoteProcess):
+        # processes that outlive the experiment finish after its tracer was removed
+        if self.tracer is None:
+            return
+        host = getattr(process.device, "management_ip", str(process.device))
+        summary_name = f"{host}: {program(process.command)}"
+        # concurrent processes would not nest, each one gets its own lane
+        lane = f"{host}: {process.command[:60]}"
+        if process.ready_time_ns is not None:
+            self.tracer.record("until ready", "process", process.start_time_ns, process.ready_time_ns, summary_name=f"{summary_name} (until ready)", lane=lane, host=host, command=process.command)
+        self.tracer.record(process.command[:80], "process", process.start_time_ns, process.end_time_ns, summary_name=summary_name, lane=lane, host=host, command=process.command)
+
+    def run(self, coroutine):
+        return self._loop.run_until_complete(coroutine)
+
+    def wait_ready(self, *processes:RemoteProcess, timeout_s:Union[float, None] = None):
+        """Waits until all processes printed their ready marker, raises ReadinessError otherwise."""
+        timeout_s = timeout_s if timeout_s is not None else self._ready_timeout_s
+        self.run(asyncio.gather(*(process.ready(timeout_s) for process in processes)))
+
+    def wait_all(self, processes:List[RemoteProcess]) -> List[Result]:
+        return self.run(asyncio.gather(*(process.wait() for process in processes)))
+
+    def close(self):
+        self._loop.close()
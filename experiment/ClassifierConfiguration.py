@@ -1,183 +1,57 @@
-from typing import Dict, Union
+from typing import Dict, List, Union
 from enum import Enum
 from . TrafficClasses import *
+import json
 import os
 
 experiment_folder = os.path.dirname(__file__)
 
+# sizes of the tables in the configuration map of classifier.c
+MAX_CLASSES = 16
+EVENTS = ["RESPONSIVE_TO_ECN", "UNRESPONSIVE_TO_ECN", "RESPONSIVE_TO_LOSS", "UNRESPONSIVE_TO_LOSS"]
+
+# class x event -> class, classes that are not listed for an event keep their class
+DEFAULT_TRANSITIONS = {
+    "RESPONSIVE_TO_ECN": {"BOTH_UNCLASSIFIED": "ECN_RESP_LOSS_UNCLASS",
+                          "BOTH_UNRESPONSIVE": "ECN_RESP_LOSS_UNRESP",
+                          "ECN_UNCLASS_LOSS_UNRESP": "ECN_RESP_LOSS_UNRESP",
+                          "ECN_UNCLASS_LOSS_RESP": "BOTH_RESPONSIVE",
+                          "ECN_UNRESP_LOSS_UNCLASS": "ECN_RESP_LOSS_UNCLASS",
+                          "ECN_UNRESP_LOSS_RESP": "BOTH_RESPONSIVE"},
+    "UNRESPONSIVE_TO_ECN": {"BOTH_UNCLASSIFIED": "ECN_UNRESP_LOSS_UNCLASS",
+                            "BOTH_RESPONSIVE": "ECN_UNRESP_LOSS_RESP",
+                            "ECN_UNCLASS_LOSS_UNRESP": "BOTH_UNRESPONSIVE",
+                            "ECN_UNCLASS_LOSS_RESP": "ECN_UNRESP_LOSS_RESP",
+                            "ECN_RESP_LOSS_UNCLASS": "ECN_UNRESP_LOSS_UNCLASS",
+                            "ECN_RESP_LOSS_UNRESP": "BOTH_UNRESPONSIVE"},
+    "RESPONSIVE_TO_LOSS": {"BOTH_UNCLASSIFIED": "ECN_UNCLASS_LOSS_RESP",
+                           "BOTH_UNRESPONSIVE": "ECN_UNRESP_LOSS_RESP",
+                           "ECN_UNCLASS_LOSS_UNRESP": "ECN_UNCLASS_LOSS_RESP",
+                           "ECN_UNRESP_LOSS_UNCLASS": "ECN_UNRESP_LOSS_RESP",
+                           "ECN_RESP_LOSS_UNCLASS": "BOTH_RESPONSIVE",
+                           "ECN_RESP_LOSS_UNRESP": "BOTH_RESPONSIVE"},
+    "UNRESPONSIVE_TO_LOSS": {"BOTH_UNCLASSIFIED": "ECN_UNCLASS_LOSS_UNRESP",
+                             "BOTH_RESPONSIVE": "ECN_RESP_LOSS_UNRESP",
+                             "ECN_UNCLASS_LOSS_RESP": "ECN_UNCLASS_LOSS_UNRESP",
+                             "ECN_UNRESP_LOSS_UNCLASS": "BOTH_UNRESPONSIVE",
+                             "ECN_UNRESP_LOSS_RESP": "BOTH_UNRESPONSIVE",
+                             "ECN_RESP_LOSS_UNCLASS": "ECN_RESP_LOSS_UNRESP"},
+}
+
 class RESPONSIVE_TEST(Enum):
     
+    # the transitions of the events are looked up in the transition table of the active configuration of classifier.c
     RESPONSIVE_TO_ECN = """
-                switch (cin->classID) {
-                        case BOTH_UNCLASSIFIED:
-                            cin->classID = ECN_RESP_LOSS_UNCLASS;
-                            new_class = 1;
-                            break;
-                        case BOTH_UNRESPONSIVE:
-                            cin->classID = ECN_RESP_LOSS_UNRESP;
-                            new_class = 1;
-                            break;
-                        case BOTH_RESPONSIVE:
-                            // no changes
-                            new_class = 0;
-                            break;
-                        case ECN_UNCLASS_LOSS_UNRESP:
-                            cin->classID = ECN_RESP_LOSS_UNRESP;
-                            new_class = 1;
-                            break;
-                        case ECN_UNCLASS_LOSS_RESP:
-                            cin->classID = BOTH_RESPONSIVE;
-                            new_class = 1;
-                            break;
-                        case ECN_UNRESP_LOSS_UNCLASS:
-                            cin->classID = ECN_RESP_LOSS_UNCLASS;
-                            new_class = 1;
-                            break;
-                        case ECN_UNRESP_LOSS_RESP:
-                            cin->classID = BOTH_RESPONSIVE;
-                            new_class = 1;
-                            break;
-                        case ECN_RESP_LOSS_UNCLASS:
-                            // no changes
-                            new_class = 0;
-                            break;
-                        case ECN_RESP_LOSS_UNRESP:
-                            // no changes
-                            new_class = 0;
-                            break;
-                        default:
-                            // should not happen
-                            break;
-                    }"""
+                new_class = transition(cfg, cin, RESPONSIVE_TO_ECN_EVENT);"""
 
     UNRESPONSIVE_TO_ECN = """
-                switch (cin->classID) {
-                    case BOTH_UNCLASSIFIED:
-                        cin->classID = ECN_UNRESP_LOSS_UNCLASS;
-                        new_class = 1;
-                        break;
-                    case BOTH_UNRESPONSIVE:
-                        // no changes
-                        new_class = 0;
-                        break;
-                    case BOTH_RESPONSIVE:
-                        cin->classID = ECN_UNRESP_LOSS_RESP;
-                        new_class = 1;
-                        break;
-                    case ECN_UNCLASS_LOSS_UNRESP:
-                        cin->classID = BOTH_UNRESPONSIVE;
-                        new_class = 1;
-                        break;
-                    case ECN_UNCLASS_LOSS_RESP:
-                        cin->classID = ECN_UNRESP_LOSS_RESP;
-                        new_class = 1;
-                        break;
-                    case ECN_UNRESP_LOSS_UNCLASS:
-                        // no changes
-                        new_class = 0;
-                        break;
-                    case ECN_UNRESP_LOSS_RESP:
-                        // no changes
-                        new_class = 0;
-                        break;
-                    case ECN_RESP_LOSS_UNCLASS:
-                        cin->classID = ECN_UNRESP_LOSS_UNCLASS;
-                        new_class = 1;
-                        break;
-                    case ECN_RESP_LOSS_UNRESP:
-                        cin->classID = BOTH_UNRESPONSIVE;
-                        new_class = 1;
-                        break;
-                    default:
-                        // should not happen
-                        break;
-                }"""
+                new_class = transition(cfg, cin, UNRESPONSIVE_TO_ECN_EVENT);"""
     
     RESPONSIVE_TO_LOSS = """
-                switch (cin->classID) {
-                    case BOTH_UNCLASSIFIED:
-                        cin->classID = ECN_UNCLASS_LOSS_RESP;
-                        new_class = 1;
-                        break;
-                    case BOTH_UNRESPONSIVE:
-                        cin->classID = ECN_UNRESP_LOSS_RESP;
-                        new_class = 1;
-                        break;
-                    case BOTH_RESPONSIVE:
-                        // no changes
-                        new_class = 0;
-                        break;
-                    case ECN_UNCLASS_LOSS_UNRESP:
-                        cin->classID = ECN_UNCLASS_LOSS_RESP;
-                        new_class = 1;
-                        break;
-                    case ECN_UNCLASS_LOSS_RESP:
-                        // no changes
-                        new_class = 0;
-                        break;
-                    case ECN_UNRESP_LOSS_UNCLASS:
-                        cin->classID = ECN_UNRESP_LOSS_RESP;
-                        new_class = 1;
-                        break;
-                    case ECN_UNRESP_LOSS_RESP:
-                        // no changes
-                        new_class = 0;
-                        break;
-                    case ECN_RESP_LOSS_UNCLASS:
-                        cin->classID = BOTH_RESPONSIVE;
-                        new_class = 1;
-                        break;
-                    case ECN_RESP_LOSS_UNRESP:
-                        cin->classID = BOTH_RESPONSIVE;
-                        new_class = 1;
-                        break;
-                    default:
-                        // should not happen
-                        break;
-                }"""
+                new_class = transition(cfg, cin, RESPONSIVE_TO_LOSS_EVENT);"""
 
     UNRESPONSIVE_TO_LOSS = """
-                switch (cin->classID) {
-                    case BOTH_UNCLASSIFIED:
-                        cin->classID = ECN_UNCLASS_LOSS_UNRESP;
-                        new_class = 1;
-                        break;
-                    case BOTH_UNRESPONSIVE:
-                        // no changes
-                        new_class = 0;
-                        break;
-                    case BOTH_RESPONSIVE:
-                        cin->classID = ECN_RESP_LOSS_UNRESP;
-                        new_class = 1;
-                        break;
-                    case ECN_UNCLASS_LOSS_UNRESP:
-                        // no changes
-                        new_class = 0;
-                        break;
-                    case ECN_UNCLASS_LOSS_RESP:
-                        cin->classID = ECN_UNCLASS_LOSS_UNRESP;
-                        new_class = 1;
-                        break;
-                    case ECN_UNRESP_LOSS_UNCLASS:
-                        cin->classID = BOTH_UNRESPONSIVE;
-                        new_class = 1;
-                        break;
-                    case ECN_UNRESP_LOSS_RESP:
-                        cin->classID = BOTH_UNRESPONSIVE;
-                        new_class = 1;
-                        break;
-                    case ECN_RESP_LOSS_UNCLASS:
-                        cin->classID = ECN_RESP_LOSS_UNRESP;
-                        new_class = 1;
-                        break;
-                    case ECN_RESP_LOSS_UNRESP:
-                        // no changes
-                        new_class = 0;
-                        break;
-                    default:
-                        // should not happen
-                        break;
-                }"""
+                new_class = transition(cfg, cin, UNRESPONSIVE_TO_LOSS_EVENT);"""
 
     WITHOUT_GRACE_MAX_NODELETE = """
                 if (((*ecn_markings>>16) & 0xFF) != 0) {{
@@ -206,6 +80,36 @@ class RESPONSIVE_TEST(Enum):
                 }}
     """
 
+class OUTPUT_POLICY(Enum):
+
+    # decides whether the record of a cycle is emitted, records of reclassifications are always emitted and
+    # carry the number of records of the flow that were suppressed since its last record
+    ALL = """
+        emit = true;"""
+
+    EVERY_NTH = """
+        emit = (cin->suppressed + 1 >= {every_nth});"""
+
+    # a record costs interval_ns of credit, a flow gains credit with time up to burst records
+    TOKEN_BUCKET = """
+        u64 credit = cin->output_credit + (time - cin->output_time);
+        if (credit > {burst_ns}) {{
+            credit = {burst_ns};
+        }}
+        if (credit >= {interval_ns}) {{
+            credit -= {interval_ns};
+            emit = true;
+        }}
+        cin->output_credit = credit;
+        cin->output_time = time;"""
+
+    CLASS_CHANGE = """
+        emit = false;"""
+
+    # the cycle time differs from the one of the last record by at least rtt_change_percent
+    RTT_CHANGE = """
+        emit = (100 * rtt >= (100 + {rtt_change_percent}) * cin->output_rtt) || (100 * rtt <= (100 - {rtt_change_percent}) * cin->output_rtt);"""
+
 class Classifier_Configuration:
     def __init__(self, 
                     BOTH_UNCLASSIFIED_classid, BOTH_RESPONSIVE_classid, BOTH_UNRESPONSIVE_classid,
@@ -218,8 +122,31 @@ class Classifier_Configuration:
                     second_ifb,
                     responsive_test:RESPONSIVE_TEST = RESPONSIVE_TEST.WITHOUT_GRACE_MAX_NODELETE,
                     mapping:Union[Dict[int, int], None] = None,
-                    edge_threshold:int = 1) -> None:
+                    edge_threshold:int = 1,
+                    transitions:Union[Dict[str, Dict[str, str]], None] = None,
+                    default_classid = 9,
+                    ringbuf_pages:int = 256,
+                    records:bool = True,
+                    summaries:bool = False,
+                    output_policy:OUTPUT_POLICY = OUTPUT_POLICY.ALL,
+                    output_every_nth:int = 10,
+                    output_rate:float = 100,
+                    output_burst:int = 10,
+                    output_rtt_change_percent:int = 10) -> None:
         
+        if ringbuf_pages < 1 or ringbuf_pages & (ringbuf_pages - 1) != 0:
+            raise ValueError(f"The ring buffer of the classifier needs a power of two pages, not {ringbuf_pages}")
+        self._ringbuf_pages:int = ringbuf_pages
+        # the record of every cycle (ebpf_classifier_log.csv) and the per-flow summaries in the kernel
+        self._records:bool = records
+        self._summaries:bool = summaries
+        if output_every_nth < 1 or output_rate <= 0 or output_burst < 1 or not 0 < output_rtt_change_percent < 100:
+            raise ValueError("The output policy needs every_nth >= 1, rate > 0, burst >= 1, and 0 < rtt_change_percent < 100")
+        self._output_policy = output_policy
+        self._output_every_nth:int = output_every_nth
+        self._output_rate:float = output_rate
+        self._output_burst:int = output_burst
+        self._output_rtt_change_percent:int = output_rtt_change_percent
         self._edge_threshold:int = edge_threshold
         self._responsive_test = responsive_test
 
@@ -237,60 +164,49 @@ class Classifier_Configuration:
         self._client_device = client_device
         self._measurement_subnet = measurement_subnet
         self._mapping = mapping
+        self._transitions = transitions if transitions is not None else DEFAULT_TRANSITIONS
+        # class of flows before their first packet was classified
+        self._default_classid = default_classid
 
         self._first_ifb = first_ifb
         self._second_ifb = second_ifb
 
     def __str__(self) -> str:
-        return "\n".join([str(self._edge_threshold), self.get_c_code()])
-    
-    def _set_mapping(self): # MAP_CLASSES code for classifier.c
-        if self._mapping is None:
-            return ""
-        map_code = """
-        switch (calc_class) {"""
-        for key, value in self._mapping.items():
-            map_code += f"""
-            case {key}:
-                calc_class = {value};
-                break;"""
-        map_code += """
-            default:
-                break;
-        }"""
-        return map_code
-    
-    def _set_mapping_old_class(self):
-        if self._mapping is None:
-            return ""
-        map_code = """
-        switch (cin->classID) {"""
-        for key, value in self._mapping.items():
-            map_code += f"""
-            case {key}:
-                old_class_mapped = {value};
-                break;"""
-        map_code += """
-            default:
-                break;
-        }"""
-        return map_code
-    
-    def _set_mapping_new_class(self):
-        if self._mapping is None:
-            return ""
-        map_code = """
-        switch (cin->classID) {"""
-        for key, value in self._mapping.items():
-            map_code += f"""
-            case {key}:
-                new_class_mapped = {value};
-                break;"""
-        map_code += """
-            default:
-                break;
-        }"""
-        return map_code
+        return "\n".join([self.get_c_code(), self.get_runtime_config_json()])
+
+    def _class_ids(self) -> Dict[str, int]:
+        class_ids = {"BOTH_UNCLASSIFIED": self._BOTH_UNCLASSIFIED_classid, "BOTH_RESPONSIVE": self._BOTH_RESPONSIVE_classid,
+                     "BOTH_UNRESPONSIVE": self._BOTH_UNRESPONSIVE_classid, "ECN_RESP_LOSS_UNCLASS": self._ECN_RESP_LOSS_UNCLASS_classid,
+                     "ECN_RESP_LOSS_UNRESP": self._ECN_RESP_LOSS_UNRESP_classid, "ECN_UNRESP_LOSS_UNCLASS": self._ECN_UNRESP_LOSS_UNCLASS_classid,
+                     "ECN_UNCLASS_LOSS_RESP": self._ECN_UNCLASS_LOSS_RESP_classid, "ECN_UNRESP_LOSS_RESP": self._ECN_UNRESP_LOSS_RESP_classid,
+                     "ECN_UNCLASS_LOSS_UNRESP": self._ECN_UNCLASS_LOSS_UNRESP_classid}
+        return {name: int(classid) for name, classid in class_ids.items()}
+
+    def get_runtime_config(self) -> Dict[str, Union[int, List[int]]]:
+        """Parameters that classifier.py swaps into the running classifier, the transition table is indexed by class * len(EVENTS) + event."""
+        if self._edge_threshold < 1:
+            raise ValueError(f"Edge threshold {self._edge_threshold} must be at least 1")
+        class_ids = self._class_ids()
+        queue_mapping = list(range(MAX_CLASSES))
+        for classid, queue in (self._mapping if self._mapping is not None else {}).items():
+            if not 0 <= int(classid) < MAX_CLASSES:
+                raise ValueError(f"Class ID {classid} does not fit into the {MAX_CLASSES} classes of the classifier")
+            queue_mapping[int(classid)] = int(queue)
+        transitions = [classid for classid in range(MAX_CLASSES) for _ in EVENTS]
+        for event, moves in self._transitions.items():
+            for old_class, new_class in moves.items():
+                if not 0 <= class_ids[old_class] < MAX_CLASSES:
+                    raise ValueError(f"Class ID {class_ids[old_class]} of {old_class} does not fit into the {MAX_CLASSES} classes of the classifier")
+                transitions[class_ids[old_class] * len(EVENTS) + EVENTS.index(event)] = class_ids[new_class]
+        return {"edge_threshold": self._edge_threshold, "initial_class": class_ids["BOTH_UNCLASSIFIED"], "default_class": int(self._default_classid),
+                "transitions": transitions, "queue_mapping": queue_mapping, "records": int(self._records), "summaries": int(self._summaries)}
+
+    @property
+    def summaries(self) -> bool:
+        return self._summaries
+
+    def get_runtime_config_json(self) -> str:
+        return json.dumps(self.get_runtime_config())
 
     ##############################################
     #           Classifier Configuration         #
@@ -309,20 +225,17 @@ class Classifier_Configuration:
         global c_code
         with open(os.path.join(experiment_folder, "classifier.c")) as f:
             c_code = "".join(f.readlines())
+        # the edge threshold, the class IDs, and the mapping are data (get_runtime_config), the code only changes with the test, the output policy, and the ring buffer size
         return c_code.format(
-            MAP_CLASSES=self._set_mapping(),
-            MAP_CLASSES_OLD_CLASS_ID=self._set_mapping_old_class(),
-            MAP_CLASSES_NEW_CLASS_ID=self._set_mapping_new_class(),
-            edge_threshold=self._edge_threshold,
-            BOTH_UNCLASSIFIED_classid=self._BOTH_UNCLASSIFIED_classid,
-            BOTH_RESPONSIVE_classid=self._BOTH_RESPONSIVE_classid,
-            BOTH_UNRESPONSIVE_classid=self._BOTH_UNRESPONSIVE_classid,
-            ECN_RESP_LOSS_UNCLASS_classid=self._ECN_RESP_LOSS_UNCLASS_classid,
-            ECN_RESP_LOSS_UNRESP_classid=self._ECN_RESP_LOSS_UNRESP_classid,
-            ECN_UNRESP_LOSS_UNCLASS_classid=self._ECN_UNRESP_LOSS_UNCLASS_classid,
-            ECN_UNRESP_LOSS_RESP_classid=self._ECN_UNRESP_LOSS_RESP_classid,
-            ECN_UNCLASS_LOSS_UNRESP_classid=self._ECN_UNCLASS_LOSS_UNRESP_classid,
-            ECN_UNCLASS_LOSS_RESP_classid=self._ECN_UNCLASS_LOSS_RESP_classid,
+            MAX_CLASSES=MAX_CLASSES,
+            EVENTS=len(EVENTS),
+            RINGBUF_PAGES=self._ringbuf_pages,
+            output_policy=self._output_policy.value.format(
+                every_nth=self._output_every_nth,
+                interval_ns=int(pow(10, 9) / self._output_rate),
+                burst_ns=int(self._output_burst * pow(10, 9) / self._output_rate),
+                rtt_change_percent=self._output_rtt_change_percent
+            ),
             responsive_code=self._responsive_test.value.format(
                 responsive_to_ECN=RESPONSIVE_TEST.RESPONSIVE_TO_ECN.value,
                 unresponsive_to_ECN=RESPONSIVE_TEST.UNRESPONSIVE_TO_ECN.value,
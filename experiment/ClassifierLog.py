@@ -0,0 +1,215 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Iterator, List, Tuple
+import argparse
+import io
+import ipaddress
+import mmap
+import os
+import struct
+import subprocess
+import sys
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as parquet
+
+# layout of the binary classifier log, classifier.py writes it with the same constants:
+# a header (magic, format version, record size), then per record its length and the raw `struct output` of classifier.c
+MAGIC = b"CRQCLOG\x00"
+VERSION = 2
+HEADER = struct.Struct("<8sHH")
+LENGTH = struct.Struct("<I")
+# `struct output` per format version with the padding of the compiler, ports and addresses are already in host order.
+# version 2 added the number of records that the output policy suppressed before a record, version 1 logs are read with 0
+RECORDS = {1: struct.Struct("<IIHH4xQQIIIIIH2xIIII5s3x"),
+           2: struct.Struct("<IIHH4xQQIIIIIH2xIIII5s3xI4x")}
+FIELDS = ["srcIP", "dstIP", "srcPort", "dstPort", "timestamp", "rtt", "classID", "lastSpins", "bytes", "ecn_markings", "num_drops",
+          "newclass", "responsive_count_ECN", "unresponsive_count_ECN", "responsive_count_drop", "unresponsive_count_drop", "protocol", "suppressed"]
+
+def _record_dtype(version:int) -> np.dtype:
+    """A length prefix and its record as numpy maps them, the offsets of RECORDS shifted by the prefix (lastSpins is not converted)."""
+    names = ["length", "srcIP", "dstIP", "srcPort", "dstPort", "timestamp", "rtt", "classID", "bytes", "ecn_markings", "num_drops",
+             "newclass", "responsive_count_ECN", "unresponsive_count_ECN", "responsive_count_drop", "unresponsive_count_drop", "protocol"]
+    formats = ["<u4", "<u4", "<u4", "<u2", "<u2", "<u8", "<u8", "<u4", "<u4", "<u4", "<u4", "<u2", "<u4", "<u4", "<u4", "<u4", "S5"]
+    offsets = [0, 4, 8, 12, 14, 20, 28, 36, 44, 48, 52, 56, 60, 64, 68, 72, 76]
+    if version >= 2:
+        names, formats, offsets = names + ["suppressed"], formats + ["<u4"], offsets + [84]
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": LENGTH.size + RECORDS[version].size})
+
+RECORD_DTYPES = {version: _record_dtype(version) for version in RECORDS}
+
+# output format: file extension
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+LOG_NAMES = ["ebpf_classifier_log.bin", "ebpf_classifier_log.bin.zst"]
+
+CSV_HEADER = "IP-Source,IP-Destination,Port-Source,Port-Destination,Timestamp,RTT,Class-ID,Bytes,ECN,Drops,NewClass,RespCnt_ECN,UnrespCnt_ECN,RespCnt_drop,UnrespCnt_drop,Protocol,Suppressed\n"
+
+@contextmanager
+def open_log(path:str) -> Iterator[BinaryIO]:
+    """
+    Opens a binary log, logs that were compressed on the testbed (`.zst`) are decompressed while reading.
+    A compressed log that zstd cannot decompress completely raises a ValueError once it was read.
+    """
+    if not path.endswith(".zst"):
+        with open(path, "rb", buffering=1 << 20) as file:
+            yield file
+        return
+    process = subprocess.Popen(["zstd", "-dc", "-q", path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        yield process.stdout
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        process.stdout.close()
+    error = process.stderr.read().decode(errors="replace").strip()
+    if process.wait() != 0:
+        raise ValueError(f"Could not decompress {path}: {error if error else f'zstd exited with {process.returncode}'}")
+
+def read_header(file:BinaryIO, path:str) -> int:
+    """Checks the header and returns the format version."""
+    header = file.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{path} is not a binary classifier log, it is too short")
+    magic, version, record_size = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a binary classifier log")
+    if version not in RECORDS or record_size != RECORDS[version].size:
+        raise ValueError(f"{path} has version {version} with {record_size} byte records, this converter reads " +
+                         ", ".join(f"version {known} with {record.size} byte records" for known, record in RECORDS.items()))
+    return version
+
+def read_records(path:str) -> Iterator[Tuple]:
+    """Yields the fields of every record (see FIELDS). A record that was cut off by a crash of the classifier ends the log."""
+    with open_log(path) as file:
+        version = read_header(file, path)
+        record_format = RECORDS[version]
+        missing = (0,) * (len(FIELDS) - len(record_format.unpack(bytes(record_format.size))))
+        while True:
+            length = file.read(LENGTH.size)
+            if len(length) < LENGTH.size:
+                return
+            record = file.read(LENGTH.unpack(length)[0])
+            if len(record) < record_format.size:
+                return
+            yield record_format.unpack_from(record) + missing
+
+def to_csv_lines(path:str) -> Iterator[str]:
+    """The lines classifier.py writes in its CSV mode."""
+    for (src_ip, dst_ip, src_port, dst_port, timestamp, rtt, class_id, _, bytes, ecn_markings, num_drops,
+         newclass, responsive_ecn, unresponsive_ecn, responsive_drop, unresponsive_drop, protocol, suppressed) in read_records(path):
+        yield (f"{ipaddress.IPv4Address(src_ip)},{ipaddress.IPv4Address(dst_ip)},{src_port},{dst_port},{timestamp},{rtt},{class_id},{bytes},"
+               f"{ecn_markings & 0xFF},{num_drops & 0xFF},{newclass},{responsive_ecn},{unresponsive_ecn},{responsive_drop},{unresponsive_drop},"
+               f"{protocol.decode('utf-8').strip(chr(0))},{suppressed}\n")
+
+def output_path(path:str, output_format:str) -> str:
+    """The converted file next to the log, e.g., ebpf_classifier_log.bin[.zst] -> ebpf_classifier_log.parquet."""
+    path = path[:-len(".zst")] if path.endswith(".zst") else path
+    return os.path.splitext(path)[0] + FORMATS[output_format]
+
+def to_csv(path:str, csv_path:str = None) -> str:
+    """Converts a binary log into the CSV of classifier.py."""
+    csv_path = csv_path if csv_path else output_path(path, "csv")
+    with open(csv_path, "w", buffering=1 << 20) as file:
+        file.write(CSV_HEADER)
+        file.writelines(to_csv_lines(path))
+    return csv_path
+
+def map_records(path:str) -> np.ndarray:
+    """Maps the records of a binary log into a structured array (RECORD_DTYPES), without copying them unless the log is compressed."""
+    if path.endswith(".zst"):
+        with open_log(path) as file:
+            data = file.read()
+    else:
+        with open(path, "rb") as file:
+            # the mapping stays open as long as the array refers to it
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) > 0 else b""
+    version = read_header(io.BytesIO(data[:HEADER.size]), path)
+    dtype = RECORD_DTYPES[version]
+    # a record that was cut off by a crash of the classifier is left out
+    records = np.frombuffer(data, dtype=dtype, count=(len(data) - HEADER.size) // dtype.itemsize, offset=HEADER.size)
+    if np.any(records["length"] != RECORDS[version].size):
+        raise ValueError(f"{path} contains records that are not {RECORDS[version].size} bytes long")
+    return records
+
+def _dictionary(values:np.ndarray, label:Callable) -> pa.DictionaryArray:
+    """Dictionary encodes a column with few distinct values, only those are turned into strings."""
+    distinct, indices = np.unique(values, return_inverse=True)
+    return pa.DictionaryArray.from_arrays(pa.array(indices.astype(np.int32)), pa.array([label(value) for value in distinct], pa.string()))
+
+def to_table(records:np.ndarray) -> pa.Table:
+    """The columns of the CSV of classifier.py with numeric types, addresses and protocols as dictionaries of strings."""
+    def column(field:str, dtype=None) -> pa.Array:
+        values = records[field] if dtype is None else (records[field] & 0xFF).astype(dtype)
+        return pa.array(np.ascontiguousarray(values))
+    return pa.table({
+        "IP-Source": _dictionary(records["srcIP"], lambda address: str(ipaddress.IPv4Address(int(address)))),
+        "IP-Destination": _dictionary(records["dstIP"], lambda address: str(ipaddress.IPv4Address(int(address)))),
+        "Port-Source": column("srcPort"),
+        "Port-Destination": column("dstPort"),
+        "Timestamp": column("timestamp"),
+        "RTT": column("rtt"),
+        "Class-ID": column("classID"),
+        "Bytes": column("bytes"),
+        # only the lowest byte is meaningful, as in the CSV
+        "ECN": column("ecn_markings", np.uint8),
+        "Drops": column("num_drops", np.uint8),
+        "NewClass": column("newclass"),
+        "RespCnt_ECN": column("responsive_count_ECN"),
+        "UnrespCnt_ECN": column("unresponsive_count_ECN"),
+        "RespCnt_drop": column("responsive_count_drop"),
+        "UnrespCnt_drop": column("unresponsive_count_drop"),
+        "Protocol": _dictionary(records["protocol"], lambda protocol: protocol.decode("utf-8")),
+        "Suppressed": column("suppressed") if "suppressed" in records.dtype.names else pa.array(np.zeros(len(records), np.uint32)),
+    })
+
+def convert(path:str, output_format:str = "parquet") -> str:
+    """Converts a binary log next to it, Arrow files are left uncompressed so that they can be memory mapped when read."""
+    if output_format == "csv":
+        return to_csv(path)
+    converted = output_path(path, output_format)
+    write_table(to_table(map_records(path)), converted, output_format)
+    return converted
+
+def write_table(table:pa.Table, path:str, output_format:str):
+    if output_format == "parquet":
+        parquet.write_table(table, path)
+    else:
+        feather.write_feather(table, path, compression="uncompressed")
+
+def find_logs(paths:List[str]) -> List[str]:
+    """The given logs and the classifier logs in the given folders and below."""
+    logs = []
+    for path in paths:
+        if not os.path.isdir(path):
+            logs.append(path)
+            continue
+        for folder, _, files in os.walk(path):
+            logs += [os.path.join(folder, name) for name in sorted(files) if name in LOG_NAMES]
+    return logs
+
+def convert_all(logs:List[str], output_format:str = "parquet", workers:int = None, converter:Callable = None) -> List[Tuple[str, str]]:
+    """Converts the logs in parallel processes (with `converter`, by default `convert`), returns the logs that could not be converted with their error."""
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(converter if converter else convert, log, output_format): log for log in logs}
+        for future in as_completed(futures):
+            try:
+                print(f"{futures[future]} -> {future.result()}")
+            except Exception as e:
+                failed.append((futures[future], str(e)))
+    return failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts binary classifier logs (ebpf_classifier_log.bin) into CSV, Parquet, or Arrow files next to them")
+    parser.add_argument("paths", nargs="+", help="Binary logs, optionally compressed with zstd, or result folders to search for them")
+    parser.add_argument("--format", "-f", help="Output format", choices=list(FORMATS.keys()), default="csv")
+    parser.add_argument("--workers", "-w", help="Parallel conversions (default: one per core)", type=int, default=None)
+    args = parser.parse_args()
+    failed = convert_all(find_logs(args.paths), args.format, args.workers)
+    for log, error in failed:
+        print(f"Could not convert {log}: {error}")
+    sys.exit(1 if failed else 0)
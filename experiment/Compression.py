@@ -0,0 +1,107 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import perf_counter
+from typing import List, Union
+import csv
+import os
+import subprocess
+import threading
+
+# codec: (file extension, default level)
+CODECS = {"brotli": (".br", 7),
+          "zstd": (".zst", 9)}
+
+MANIFEST_HEADER = ["File", "Codec", "Level", "Bytes In", "Bytes Out", "Ratio", "Seconds", "Status"]
+
+def compression_command(codec:str, level:int, path:str, threads:int = 1) -> List[str]:
+    if codec == "brotli":
+        return ["/usr/bin/brotli", "--rm", "-f", f"--quality={level}", path]
+    if codec == "zstd":
+        # the pool runs several jobs at once, each gets its share of the cores
+        return ["zstd", f"-T{threads}", f"-{level}", "--rm", "-f", "-q", path]
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+class CompressionPool:
+    """
+    Compresses result files with a fixed number of concurrent compressor processes.
+
+    Submitting blocks once `max_pending` files are queued, so a fast producer is throttled instead of
+    overloading the machine. Every job is recorded in a CSV manifest, wait() returns once all jobs are done.
+    """
+    def __init__(self, codec:str = "brotli", level:Union[int, None] = None, workers:Union[int, None] = None, max_pending:Union[int, None] = None, manifest_path:Union[str, None] = None):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown compression codec: {codec}")
+        self.codec = codec
+        self.extension, default_level = CODECS[codec]
+        self.level = level if level is not None else default_level
+        self.workers = workers if workers else max(1, (os.cpu_count() or 2) // 2)
+        self.threads = max(1, (os.cpu_count() or 2) // self.workers)
+        self._pending = threading.BoundedSemaphore(max_pending if max_pending else 2 * self.workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="Compression")
+        self._futures:List[Future] = []
+        self._futures_lock = threading.Lock()
+        self._manifest_path = manifest_path
+        self._manifest_lock = threading.Lock()
+        self._failures:List[str] = []
+
+    def submit(self, path:str) -> Future:
+        self._pending.acquire()
+        try:
+            future = self._executor.submit(self._compress, path, self._manifest_path)
+        except:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        with self._futures_lock:
+            self._futures.append(future)
+        return future
+
+    def _compress(self, path:str, manifest_path:Union[str, None]):
+        start = perf_counter()
+        bytes_in = bytes_out = 0
+        try:
+            bytes_in = os.path.getsize(path)
+            res = subprocess.run(compression_command(self.codec, self.level, path, self.threads), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            if res.returncode == 0 and os.path.exists(path + self.extension):
+                bytes_out = os.path.getsize(path + self.extension)
+                status = "ok"
+            else:
+                status = f"failed ({res.returncode}): {res.stderr.strip()}"
+        except Exception as e:
+            status = f"failed: {e}"
+        seconds = perf_counter() - start
+        if status != "ok":
+            # the uncompressed file is kept
+            self._failures.append(f"{path}: {status}")
+            print(f"Compression of {path} {status}")
+        self.record(path, self.codec, self.level, bytes_in, bytes_out, seconds, status, manifest_path)
+
+    def record(self, path:str, codec:str, level:int, bytes_in:int, bytes_out:int, seconds:float, status:str, manifest_path:Union[str, None] = None):
+        """Adds a compressed file to the manifest, also used for files that were compressed elsewhere."""
+        manifest_path = manifest_path if manifest_path else self._manifest_path
+        if manifest_path is None:
+            return
+        row = [path, codec, level, bytes_in, bytes_out, f"{bytes_in / bytes_out:.3f}" if bytes_out else "", f"{seconds:.3f}", status]
+        with self._manifest_lock:
+            write_header = not os.path.exists(manifest_path)
+            with open(manifest_path, "a", newline="") as file:
+                writer = csv.writer(file)
+                if write_header:
+                    writer.writerow(MANIFEST_HEADER)
+                writer.writerow(row)
+
+    def wait(self) -> List[str]:
+        """Blocks until all submitted files are compressed and returns the failures since the last wait."""
+        while True:
+            with self._futures_lock:
+                futures, self._futures = self._futures, []
+            if not futures:
+                break
+            for future in futures:
+                future.result()
+        failures, self._failures = self._failures, []
+        return failures
+
+    def close(self) -> List[str]:
+        failures = self.wait()
+        self._executor.shutdown(wait=True)
+        return failures
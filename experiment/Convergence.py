@@ -0,0 +1,66 @@
+from collections import Counter
+from statistics import mean, stdev
+from typing import Dict, List, Tuple, Union
+
+# two-sided Student's t quantiles for 1 to 30 degrees of freedom, the normal quantile beyond
+T_TABLE = {
+    0.90: [6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812, 1.796, 1.782, 1.771, 1.761, 1.753,
+           1.746, 1.740, 1.734, 1.729, 1.725, 1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703, 1.701, 1.699, 1.697],
+    0.95: [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131,
+           2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042],
+    0.99: [63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250, 3.169, 3.106, 3.055, 3.012, 2.977, 2.947,
+           2.921, 2.898, 2.878, 2.861, 2.845, 2.831, 2.819, 2.807, 2.797, 2.787, 2.779, 2.771, 2.763, 2.756, 2.750],
+}
+Z_TABLE = {0.90: 1.645, 0.95: 1.960, 0.99: 2.576}
+
+def t_value(confidence:float, df:int) -> float:
+    if confidence not in T_TABLE:
+        raise ValueError(f"Unsupported confidence level {confidence}, use one of {list(T_TABLE.keys())}")
+    return T_TABLE[confidence][df - 1] if df <= len(T_TABLE[confidence]) else Z_TABLE[confidence]
+
+def confidence_interval(samples:List[float], confidence:float) -> Tuple[float, float]:
+    """Returns the mean and the half width of its confidence interval."""
+    return mean(samples), t_value(confidence, len(samples) - 1) * stdev(samples) / len(samples) ** 0.5
+
+class ConvergenceMonitor:
+    """
+    Decides when further iterations of an experiment no longer change its results.
+
+    Numeric metrics (goodput, drops) have converged once the half width of their confidence interval is at
+    most `rel_width` times their mean. Categorical metrics (the final class of a flow) are tracked as the share
+    of iterations with the most common outcome; its half width is compared against `rel_width` directly.
+    """
+    def __init__(self, min_iterations:int = 5, rel_width:float = 0.05, confidence:float = 0.95):
+        t_value(confidence, 1)
+        self.min_iterations = max(2, min_iterations)
+        self.rel_width = rel_width
+        self.confidence = confidence
+        self.samples:Dict[str, List[Union[float, str]]] = {}
+        self.iterations = 0
+
+    def add(self, metrics:Dict[str, Union[float, str]]):
+        self.iterations += 1
+        for name, value in metrics.items():
+            self.samples.setdefault(name, []).append(value)
+
+    def widths(self) -> Dict[str, Union[float, None]]:
+        """Relative half width per metric, None while a metric has fewer than two samples."""
+        widths:Dict[str, Union[float, None]] = {}
+        for name, samples in self.samples.items():
+            if len(samples) < 2:
+                widths[name] = None
+            elif isinstance(samples[0], str):
+                modal = Counter(samples).most_common(1)[0][0]
+                widths[name] = confidence_interval([1.0 if sample == modal else 0.0 for sample in samples], self.confidence)[1]
+            else:
+                center, half_width = confidence_interval(samples, self.confidence)
+                widths[name] = 0.0 if half_width == 0 else half_width / abs(center) if center != 0 else float("inf")
+        return widths
+
+    def converged(self) -> bool:
+        if self.iterations < self.min_iterations or not self.samples:
+            return False
+        return all(width is not None and width <= self.rel_width for width in self.widths().values())
+
+    def report(self) -> str:
+        return ", ".join(f"{name}: {'n/a' if width is None else f'{width:.3f}'}" for name, width in sorted(self.widths().items()))
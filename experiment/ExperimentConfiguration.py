@@ -1,22 +1,32 @@
 from . ClassifierConfiguration import Classifier_Configuration
 from . TrafficClasses import *
-from . TC_Configuration import TC_Configuration
+from . TC_Configuration import TC_Configuration, TC_Batch
 from . CC_Stacks_Configuration import Stack_Config, Stack_Client_Config, Stack_Server_Config
 from . CC_Stacks import *
 from . iperf3_Implementation import *
 from experiment.CC_Stacks import TCP
 from experiment.iperf3_Implementation import IPERF_UDP
 from .sshConnector import SSHConnector
+from .AsyncOrchestration import OrchestrationEngine, RemoteProcess
+from .TrafficFileCache import TrafficFileCache
+from .ResultCollector import ResultCollector, Artifact
+from .Compression import CompressionPool
+from .Journal import Journal, experiment_hash
+from .Convergence import ConvergenceMonitor
+from .Tracing import Tracer
 
 from time import sleep, time_ns
-from typing import List, Tuple, Union
+from typing import Dict, List, Tuple, Union
 from fabric import Connection
-from invoke import Result, exceptions, Promise, watchers
-from multiprocessing import Value
+from invoke import Result, exceptions
+import asyncio
 import datetime
+import hashlib
+import io
 import os
+import shutil
 import logging
-import subprocess
+import shlex
 import json
 import signal
 import pandas as pd
@@ -25,10 +35,6 @@ formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
 
 tmp_folder = os.path.join(os.path.dirname(__file__), "tmp")
 
-not_seen = Value('b', True)
-not_seen_tcp_server = Value('b', True)
-not_seen_tcp_client = Value('b', True)
-
 class WatchDogException(Exception):
     """WatchDog timer expired!"""
     pass
@@ -62,6 +68,49 @@ def interrupt_process_by_name(shell: Connection, name: str) -> Union[Result, Non
     except:
         return None
 
+# relative to the working directory of the bottleneck's shell, like the classifier logs
+CLASSIFIER_SOCKET = "classifier.sock"
+CLASSIFIER_CONFIG = "classifier_config.json"
+CLASSIFIER_SUMMARIES = "classifier_summaries.jsonl"
+
+class ClassifierDaemon:
+    """Classifier process on the bottleneck that is controlled through its unix socket, see classifier.py."""
+    def __init__(self, device, script_path:str, process:RemoteProcess):
+        self.device = device
+        self.script_path = script_path
+        self.process = process
+
+    def control(self, *requests:str) -> List[dict]:
+        """Sends `command` or `command=argument` requests in one connection and returns the responses."""
+        res = self.device.get_connection().run(f"sudo python3 {self.script_path} --control {CLASSIFIER_SOCKET} {' '.join(shlex.quote(request) for request in requests)}", hide=True, warn=True)
+        responses = [json.loads(line) for line in res.stdout.splitlines() if line.startswith("{")]
+        if res.failed or len(responses) != len(requests):
+            raise Exception(f"Classifier control {' '.join(requests)} failed: {res.stdout}{res.stderr}")
+        return responses
+
+    def set_config(self, values:dict) -> dict:
+        """Swaps parameters of Classifier_Configuration.get_runtime_config into the running classifier without losing the flow state."""
+        return self.control(f"set-config={json.dumps(values, separators=(',', ':'))}")[0]
+
+    def stop(self):
+        try:
+            self.control("shutdown")
+        except Exception as e:
+            print(e)
+            # only this daemon, other python processes on the bottleneck keep running
+            self.device.get_connection().run(f"sudo pkill --signal SIGINT -f '{self.script_path} --daemon'", warn=True)
+        try:
+            self.process.join()
+        except Exception as e:
+            print(f"Classifier exited with: {e}")
+
+def stop_classifier_daemon(device):
+    """Stops the classifier of the bottleneck, e.g., before its sources change or after the last experiment."""
+    if device.classifier_daemon is None:
+        return
+    device.classifier_daemon.stop()
+    device.classifier_daemon = None
+
 def create_folder(path:str):
     if path is None:
         raise Exception("Empty Folder Name")
@@ -185,6 +234,19 @@ def qdisc_s_show_to_df(stdout):
 
 
 
+QUEUE_STATS_COUNTERS = ["Bytes Sent", "Packets Sent", "Packets Dropped", "Overlimits", "Requeues", "CoDel ECN_Mark", "CoDel Drop_OverLimit"]
+
+def subtract_queue_stats(stats, baseline):
+    """Removes the counters that qdiscs kept from earlier iterations."""
+    if stats.empty or baseline.empty:
+        return stats
+    keys = ["Device", "Handle", "Queue"]
+    merged = stats.merge(baseline[keys + QUEUE_STATS_COUNTERS], on=keys, how="left", suffixes=("", " Baseline"))
+    for column in QUEUE_STATS_COUNTERS:
+        merged[column] = (pd.to_numeric(merged[column]) - pd.to_numeric(merged[column + " Baseline"]).fillna(0)).astype("Int64")
+    return merged[stats.columns]
+
+
 class ConfigurationError(Exception):
     def __init__(self, command_list, failed_command, raised_exception):
         self.command_list = command_list
@@ -203,62 +265,8 @@ class PreperationError(Exception):
     def __str__(self) -> str:
         return f"Could not create file <self.device> on device: {self.device}\nRaised exception: {self.raised_exception}"
     
-class MyWatcher(watchers.StreamWatcher):
-    def __init__(self):                                                         
-        super().__init__()                                                      
-        self.seen = False    
-
-    def submit(self, stream):
-        global not_seen 
-        if not self.seen and "Ready:" in stream:
-            # Return a response indicating that the pattern is found
-            self.seen = True
-            not_seen.value = False
-            print("Classifier started")
-            return ["Classifier gestartet"]
-        else:
-            # print(stream)
-            # self.seen = False
-            return []
-        
-class MyWatcherTCPServer(watchers.StreamWatcher):
-    def __init__(self):                                                         
-        super().__init__()                                                      
-        self.seen = False    
-
-    def submit(self, stream):
-        global not_seen_tcp_server
-        if not self.seen and "Ready" in stream:
-            # Return a response indicating that the pattern is found
-            self.seen = True
-            not_seen_tcp_server.value = False
-            print("TCP Server logging started")
-            return ["TCP Server logging started"]
-        else:
-            # print(stream)
-            # self.seen = False
-            return []
-        
-class MyWatcherTCPClient(watchers.StreamWatcher):
-    def __init__(self):                                                         
-        super().__init__()                                                      
-        self.seen = False    
-
-    def submit(self, stream):
-        global not_seen_tcp_client
-        if not self.seen and "Ready" in stream:
-            # Return a response indicating that the pattern is found
-            self.seen = True
-            not_seen_tcp_client.value = False
-            print("TCP Client logging started")
-            return ["TCP Client logging started"]
-        else:
-            # print(stream)
-            # self.seen = False
-            return []
-
-QUIC_Client_Promise_Tuple = Tuple[Stack_Client_Config, Union[Result, None]]
-QUIC_Server_Promise_Tuple = Tuple[Stack_Server_Config, Union[Result, None]]
+QUIC_Client_Promise_Tuple = Tuple[Stack_Client_Config, Union[RemoteProcess, Result, None]]
+QUIC_Server_Promise_Tuple = Tuple[Stack_Server_Config, Union[RemoteProcess, Result, None]]
 class ExperimentConfiguration:
     def __init__(self, 
                  result_folder_path:str, 
@@ -275,7 +283,7 @@ class ExperimentConfiguration:
                  load2:SSHConnector,
                  client:SSHConnector,
                  interfaces:[str],
-                 iterations:int = 30, deploy_QUIC_classifier:bool = True, only_UDP:bool = True, tcp_dump:bool = True, tcp_dump_options:str = "", let_nocc_finish:bool = False, deploy_TCP_classifier:bool = False, load_qlog_data:bool = True, watch_dog_timeout_s:int = 900):
+                 iterations:int = 30, deploy_QUIC_classifier:bool = True, only_UDP:bool = True, tcp_dump:bool = True, tcp_dump_options:str = "", let_nocc_finish:bool = False, deploy_TCP_classifier:bool = False, load_qlog_data:bool = True, watch_dog_timeout_s:int = 900, reset_ssh_per_iteration:bool = False, traffic_file_cache:Union[TrafficFileCache, None] = None, tc_incremental:bool = True, collection_workers:int = 4, collection_queue_size:int = 64, compression_codec:str = "brotli", compression_level:Union[int, None] = None, compression_workers:Union[int, None] = None, remote_compression_level:Union[int, None] = None, ready_timeout_s:int = 60, journal:Union[Journal, None] = None, resume:bool = False, adaptive_min_iterations:Union[int, None] = None, adaptive_rel_width:float = 0.05, adaptive_confidence:float = 0.95, tracing:bool = True, resident_classifier:bool = True, classifier_log_format:str = "csv", classifier_summary_interval_s:float = 0, tcp_probe_binary:bool = False, tcp_probe_on_change:bool = False, tcp_probe_min_interval_us:int = 0):
         self._iterations: int = iterations
         self._rtt:int = rtt
         self._bottleneck_bw: int = bottleneck_bw
@@ -300,6 +308,39 @@ class ExperimentConfiguration:
         self._local_tmp_folder_path = local_tmp_folder_path
         self._tc_viz_path = tc_viz_path
         self._traffic_files_path = traffic_files_path
+        self._reset_ssh_per_iteration: bool = reset_ssh_per_iteration
+        self._traffic_file_cache: TrafficFileCache = traffic_file_cache if traffic_file_cache else TrafficFileCache(traffic_files_path)
+        self._engine: OrchestrationEngine = OrchestrationEngine(ready_timeout_s=ready_timeout_s)
+        self._tc_incremental: bool = tc_incremental
+        self._tc_baseline: Union[pd.DataFrame, None] = None
+        self._collection_workers: int = collection_workers
+        self._collection_queue_size: int = collection_queue_size
+        self._collector: Union[ResultCollector, None] = None
+        self._compression_codec: str = compression_codec
+        self._compression_level: Union[int, None] = compression_level
+        self._compression_workers: Union[int, None] = compression_workers
+        self._compression: Union[CompressionPool, None] = None
+        self._remote_compression_level: Union[int, None] = remote_compression_level
+        self._journal: Union[Journal, None] = journal
+        self._resume: bool = resume
+        # with adaptive_min_iterations, `iterations` is the maximum and the experiment stops once its metrics converged
+        self._adaptive_min_iterations: Union[int, None] = adaptive_min_iterations
+        self._adaptive_rel_width: float = adaptive_rel_width
+        self._adaptive_confidence: float = adaptive_confidence
+        self._tracing: bool = tracing
+        self._tracer: Tracer = Tracer(enabled=tracing)
+        # keep the compiled classifier loaded while its sources do not change, only the tc filter is attached per iteration
+        self._resident_classifier: bool = resident_classifier
+        if classifier_log_format not in ["csv", "binary"]:
+            raise ValueError(f"Unknown classifier log format {classifier_log_format}, use csv or binary")
+        # binary logs are converted offline with experiment/ClassifierLog.py
+        self._classifier_log_format: str = classifier_log_format
+        # with per-flow summaries, they are written every interval and at the end of the iteration
+        self._classifier_summary_interval_s: float = classifier_summary_interval_s
+        # raw records (converted offline with experiment/TcpProbeLog.py) and sampling of the TCP loggers on the end hosts
+        self._tcp_probe_binary: bool = tcp_probe_binary
+        self._tcp_probe_on_change: bool = tcp_probe_on_change
+        self._tcp_probe_min_interval_us: int = tcp_probe_min_interval_us
 
     def resetSshConnections(self):
         if self._load1:
@@ -308,18 +349,19 @@ class ExperimentConfiguration:
             self._load2.reset_connection()
         if self._client:
             self._client.reset_connection()
-        if self._client:
-            self._client.reset_connection()
+        if self._bottleneckrouter:
+            self._bottleneckrouter.reset_connection()
 
     def startSshConnections(self):
+        # reuses healthy connections and only reconnects broken ones
         if self._load1:
             self._load1.start_connection()
         if self._load2:
             self._load2.start_connection()
         if self._client:
             self._client.start_connection()
-        if self._client:
-            self._client.start_connection()
+        if self._bottleneckrouter:
+            self._bottleneckrouter.start_connection()
 
 
 
@@ -341,44 +383,60 @@ class ExperimentConfiguration:
                 ])
         return str(self._iterations)
 
+    def _upload_classifier_file(self, classifier_file:str, source_code:str, logger):
+        # experiments on other testbeds run in parallel processes
+        local_file = os.path.join(tmp_folder, f"{os.getpid()}_{classifier_file}")
+        while os.path.exists(local_file):
+            print(f"{classifier_file} exists.")
+            logger.info("{classifier_file} exists.")
+            sleep(1)
+        with open(local_file, "wt") as file:
+            file.write(source_code)
+        self._bottleneckrouter.get_connection().put(local_file, os.path.join(self._local_tmp_folder_path, classifier_file))
+        os.remove(local_file)
+
     def _prepare_classifier(self, logger):
-        
+        # the edge threshold, the class IDs, the transitions, and the queue mapping are swapped into the running classifier
+        self._upload_classifier_file(CLASSIFIER_CONFIG, self._classifier_config.get_runtime_config_json(), logger)
+
         classifier_files = [("classifier.c", self._classifier_config.get_c_code()), 
                             ("tracepoint_ecn.c", self._classifier_config.get_tracepoint_code()),
                             ("tracepoint_drops.c", self._classifier_config.get_loss_trace_code()),
                             ("classifier.py", self._classifier_config.get_py_code()),
                             ("tracepoint_tcp.c", self._classifier_config.get_tracepoint_code_tcp_client())]
 
-        for classifier_file, source_code in classifier_files:
+        classifier_hash = hashlib.sha256("".join(name + source_code for name, source_code in classifier_files).encode()).hexdigest()
+        if self._bottleneckrouter.classifier_hash == classifier_hash:
+            print("Classifier sources unchanged, skip upload and compilation.")
+            logger.info("Classifier sources unchanged.")
+            return
+        # the loaded classifier was compiled from other sources
+        stop_classifier_daemon(self._bottleneckrouter)
+        self._bottleneckrouter.classifier_hash = None
 
-            while os.path.exists(os.path.join(tmp_folder, classifier_file)):
-                print(f"{classifier_file} exists.")
-                logger.info("{classifier_file} exists.")
-                sleep(1)
-            with open(os.path.join(tmp_folder, classifier_file), "wt") as file:
-                file.write(source_code)
-            self._bottleneckrouter.get_connection().put(os.path.join(tmp_folder, classifier_file), os.path.join(self._local_tmp_folder_path, classifier_file))
-            os.remove(os.path.join(tmp_folder, classifier_file))
+        for classifier_file, source_code in classifier_files:
+            self._upload_classifier_file(classifier_file, source_code, logger)
+        self._bottleneckrouter.classifier_hash = classifier_hash
 
 
     def _prepare_TCP_logging_script(self):
         for client in self._client_start_list:
             if (isinstance(client.implementation, TCP)):
                 print("Deploy TCP logging script to", os.path.join(tmp_folder, "tcp_probe_bpf.py"))
-                with open(os.path.join(tmp_folder, "tcp_probe_bpf.py"), "wt") as file:
+                with open(os.path.join(tmp_folder, f"{os.getpid()}_tcp_probe_bpf.py"), "wt") as file:
                     with open("experiment/tcp_probe_bpf.py") as f:
                         file.write("".join(f.readlines()))
-                client.device.get_connection().put(os.path.join(tmp_folder, "tcp_probe_bpf.py"), os.path.join(self._local_tmp_folder_path, "tcp_probe_bpf.py"))
+                client.device.get_connection().put(os.path.join(tmp_folder, f"{os.getpid()}_tcp_probe_bpf.py"), os.path.join(self._local_tmp_folder_path, "tcp_probe_bpf.py"))
         for server in self._server_list:
             if (isinstance(server.implementation, TCP)):
                 print("Deploy TCP logging script to", os.path.join(tmp_folder, "tcp_probe_bpf.py"))
-                with open(os.path.join(tmp_folder, "tcp_probe_bpf.py"), "wt") as file:
+                with open(os.path.join(tmp_folder, f"{os.getpid()}_tcp_probe_bpf.py"), "wt") as file:
                     with open("experiment/tcp_probe_bpf.py") as f:
                         file.write("".join(f.readlines()))
                 #with server.device.get_connection() as connection:
-                server.device.get_connection().put(os.path.join(tmp_folder, "tcp_probe_bpf.py"), os.path.join(self._local_tmp_folder_path, "tcp_probe_bpf.py"))
+                server.device.get_connection().put(os.path.join(tmp_folder, f"{os.getpid()}_tcp_probe_bpf.py"), os.path.join(self._local_tmp_folder_path, "tcp_probe_bpf.py"))
         
-    def _start_measurements(self, device:Union[SSHConnector, None] = None, deploy_QUIC_classifier:bool = True, filename_bpf:str = "ebpf_classifier_log.csv", only_UDP:bool = True, filename_tcpdump:str = "tcpdump_bottleneck.pcap", tcp_dump:Union[bool, None] = None, tcp_dump_options:str = "-s 50", deploy_TCP_classifier:bool = False, filename_bpf_tcp:str = "TCP_ebpf_classifier_log.csv") -> Tuple[Union[Promise, None], Union[Promise, None]]:
+    def _start_measurements(self, device:Union[SSHConnector, None] = None, deploy_QUIC_classifier:bool = True, filename_bpf:str = "ebpf_classifier_log.csv", only_UDP:bool = True, filename_tcpdump:str = "tcpdump_bottleneck.pcap", tcp_dump:Union[bool, None] = None, tcp_dump_options:str = "-s 50", deploy_TCP_classifier:bool = False, filename_bpf_tcp:str = "TCP_ebpf_classifier_log.csv") -> Tuple[Union[ClassifierDaemon, None], Union[RemoteProcess, None]]:
         if device is None:
             device = self._bottleneckrouter
         if tcp_dump is None:
@@ -386,28 +444,28 @@ class ExperimentConfiguration:
         if tcp_dump_options is None:
             tcp_dump_options = self._tcp_dump_options
 
-        def callback(stream, matcher):
-            print("Classifier started!")
-            matcher.proc.stop()
-
-        promise_bpf:Union[Promise, None] = None
-        promise_tcpdump:Union[Promise, None] = None
+        promise_bpf:Union[ClassifierDaemon, None] = None
+        promise_tcpdump:Union[RemoteProcess, None] = None
         if tcp_dump:
-            #with device.get_connection() as connection:  
-            promise_tcpdump = device.get_connection().run(f"sudo tcpdump -U -i {self._tc_config._egress_device} -w {filename_tcpdump} {tcp_dump_options}", asynchronous=True)
+            promise_tcpdump = self._engine.start(device, f"sudo tcpdump -U -i {self._tc_config._egress_device} -w {filename_tcpdump} {tcp_dump_options}")
 
         # there is only one classifier 
         if deploy_QUIC_classifier or deploy_TCP_classifier:
-            print("Start Classifier")
-            watcher = MyWatcher()
-            #with device.get_connection() as connection:  
-            promise_bpf = device.get_connection().run(f"sudo python3 {os.path.join(self._local_tmp_folder_path, "classifier.py")} {filename_bpf}", asynchronous=True, watchers = [watcher], pty=True)
-            global not_seen
-            while not_seen.value: # trigger watcher to read input
-                responses = watcher.submit("") 
-                sleep(1)
-
-            not_seen.value = True
+            if device.classifier_daemon is None or device.classifier_daemon.process.finished:
+                stop_classifier_daemon(device)
+                print("Start Classifier")
+                script_path = os.path.join(self._local_tmp_folder_path, "classifier.py")
+                process = self._engine.start(device, f"sudo python3 {script_path} --daemon {CLASSIFIER_SOCKET}", ready_marker="Listening:", pty=True)
+                # continue as soon as the programs are compiled and the socket accepts commands
+                self._engine.wait_ready(process)
+                device.classifier_daemon = ClassifierDaemon(device, script_path, process)
+            # the compiled programs are reused, only the flow state, the log, and the filter are new
+            requests = ["reset", f"set-config={os.path.join(self._local_tmp_folder_path, CLASSIFIER_CONFIG)}", f"rotate={filename_bpf}"]
+            if self._classifier_config.summaries:
+                requests.append(f"summarize={CLASSIFIER_SUMMARIES}" + (f",{self._classifier_summary_interval_s}" if self._classifier_summary_interval_s > 0 else ""))
+            device.classifier_daemon.control(*requests, "attach")
+            promise_bpf = device.classifier_daemon
+            print("Classifier started")
 
         return promise_bpf, promise_tcpdump
 
@@ -432,7 +490,7 @@ class ExperimentConfiguration:
                     if client._startDelay_ms * pow(10,6) > time_since_last_responsive:
                         sleep((client._startDelay_ms * pow(10,6) - time_since_last_responsive)/pow(10,9))
 
-                promise:Promise = client.device.get_connection().run(client.implementation.get_run_command_client(client), asynchronous=True, env={'PATH':'/home/test/.cargo/bin:/usr/local/go/bin:/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin:/usr/games:/usr/local/games:/snap/bin', 'QLOGDIR':'/home/test', 'SSLKEYLOGFILE': '/home/test/sslkeys/new'})
+                promise:RemoteProcess = self._engine.start(client.device, client.implementation.get_run_command_client(client), env=ExperimentConfiguration._stack_env(client.device))
                 print(f"_startClients on {client.device.local_ip}: ", client.implementation.get_run_command_client(client))               
                 clientPromises.append((client, promise))
             return clientPromises 
@@ -443,34 +501,39 @@ class ExperimentConfiguration:
             iteration_logger.critical(e)
             raise e
         
-    def _start_TCP_logging_clients(self) -> List[Union[Promise, None]]:
-        client_promises:List[Union[Promise, None]] = []
+    def _tcp_log_name(self, client_number:int, side:str) -> str:
+        return f"{client_number}_TCPlog_{side}.{'bin' if self._tcp_probe_binary else 'csv'}"
+
+    def _tcp_probe_command(self, filter:str, filename:str) -> str:
+        options = " --binary" if self._tcp_probe_binary else ""
+        options += " --on-change" if self._tcp_probe_on_change else ""
+        options += f" --min-interval-us {self._tcp_probe_min_interval_us}" if self._tcp_probe_min_interval_us > 0 else ""
+        return f'sudo python3 {os.path.join(self._local_tmp_folder_path, "tcp_probe_bpf.py")} --filter "{filter}" --output {filename}{options}'
+
+    def _start_TCP_logging_clients(self) -> List[Union[RemoteProcess, None]]:
+        client_promises:List[Union[RemoteProcess, None]] = []
         # Start eBPF logging for TCP Clients
         # start a logging per associated client        
         for client in self._client_start_list:
                 if (isinstance(client.implementation, TCP)):
                     for server_config in self._server_list:
                         if isinstance(server_config.implementation, TCP) and client.target_ip == server_config.device.local_ip and server_config._server_port == client.target_port:
-                            promise_tcp_client:Union[Promise, None] = None
+                            promise_tcp_client:Union[RemoteProcess, None] = None
                             print("Start TCP client logging")
                             saddr = client.device.local_ip
                             dport = client.target_port
                             sport = client.local_port
-                            filename = f"{client.client_number}_TCPlog_client.csv"
-
-                            watcher = MyWatcherTCPClient()
-            
-                            promise_tcp_client = client.device.get_connection().run(f'sudo python3 {os.path.join(self._local_tmp_folder_path, "tcp_probe_bpf.py")} --filter "(saddr {saddr}) and (sport {sport})" --output {filename}', asynchronous=True, watchers = [watcher], pty=True)
-                            global not_seen_tcp_client
-                            while not_seen_tcp_client.value: # trigger watcher to read input
-                                responses = watcher.submit("") 
-                                sleep(1)
-
-                            not_seen_tcp_client.value = True
+                            filename = self._tcp_log_name(client.client_number, "client")
 
+                            promise_tcp_client = self._engine.start(client.device, self._tcp_probe_command(f"(saddr {saddr}) and (sport {sport})", filename), ready_marker="Ready", pty=True)
                             client_promises.append(promise_tcp_client)
 
-                            client.device.get_connection().run("sudo ip tcp_metrics flush")
+        # the client loggers compile their probes at the same time, the server loggers were awaited as a separate batch before the servers started
+        if client_promises:
+            self._engine.wait_ready(*client_promises)
+            print("TCP Client logging started")
+        for device in {promise.device for promise in client_promises}:
+            device.get_connection().run("sudo ip tcp_metrics flush")
 
         return client_promises
 
@@ -482,9 +545,9 @@ class ExperimentConfiguration:
                     interrupt_process_by_name(client.device.get_connection(), "tcp_probe_bpf.py")
                 break
 
-    def _join_TCP_logging_clients_promises(self, client_promises:List[Union[Promise, None]], iteration_logger:logging.Logger, folder_path:str):
-        for bpf_pro_tcp, index in enumerate(client_promises):
-            if isinstance(bpf_pro_tcp, Promise):
+    def _join_TCP_logging_clients_promises(self, client_promises:List[Union[RemoteProcess, None]], iteration_logger:logging.Logger, folder_path:str):
+        for index, bpf_pro_tcp in enumerate(client_promises):
+            if isinstance(bpf_pro_tcp, RemoteProcess):
                 try:
                     print("------------------------- TRY JOIN CLIENT PROMISE")
                     bpf_result = bpf_pro_tcp.join()
@@ -498,41 +561,46 @@ class ExperimentConfiguration:
                 with open(folder_path + f"TCP_client_log_{index}.log", "w") as std_class:
                     std_class.write(bpf_result.stdout)
 
+    @staticmethod
+    def _stack_env(device:SSHConnector) -> Dict[str, str]:
+        # qlogs and TLS keys are written to the home of the host, the hosts of a VirtualTestbed each have their own
+        return {'PATH':'/home/test/.cargo/bin:/usr/local/go/bin:/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin:/usr/games:/usr/local/games:/snap/bin',
+                'QLOGDIR': device.home_dir,
+                'SSLKEYLOGFILE': os.path.join(device.home_dir, "sslkeys", "new")}
+
     def _startServers(self) -> List[QUIC_Server_Promise_Tuple]:
         serverPromises:List[QUIC_Server_Promise_Tuple] = []
         for server_config in self._server_list:
             cmd:str = server_config.implementation.get_run_command_server(server_config)
             #with server_config.device.get_connection() as connection:
             print(f"_startServers on {server_config.device.local_ip}:  {server_config.implementation.get_run_command_server(server_config)}")
-            promise:Promise = server_config.device.get_connection().run(cmd, asynchronous=True, env={'PATH':'/home/test/.cargo/bin:/usr/local/go/bin:/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin:/usr/games:/usr/local/games:/snap/bin', 'QLOGDIR':'/home/test', 'SSLKEYLOGFILE': '/home/test/sslkeys/new'})
+            promise:RemoteProcess = self._engine.start(server_config.device, cmd, env=ExperimentConfiguration._stack_env(server_config.device))
             #sleep(0.1)
             serverPromises.append((server_config, promise))
         return serverPromises
 
-    def _start_TCP_logging_servers(self) -> List[Union[Promise, None]]:
-        server_promises:List[Union[Promise, None]] = []        
+    def _start_TCP_logging_servers(self) -> List[Union[RemoteProcess, None]]:
+        server_promises:List[Union[RemoteProcess, None]] = []        
         for server_config in self._server_list:
             for client_config in self._client_start_list:
                 print("Start TCP logging for server")
                 if isinstance(client_config.implementation, TCP) and client_config.target_ip == server_config.device.local_ip and server_config._server_port == client_config.target_port:
-                    promise_tcp_server:Union[Promise, None] = None
+                    promise_tcp_server:Union[RemoteProcess, None] = None
                     print("Start TCP server")
                     saddr = server_config.device.local_ip
                     sport = server_config._server_port
                     dport = client_config.local_port
-                    filename = f"{client_config.client_number}_TCPlog_server.csv"
+                    filename = self._tcp_log_name(client_config.client_number, "server")
 
-                    watcher = MyWatcherTCPServer()
-                    #with server_config.device.get_connection() as connection:
-                    promise_tcp_server = server_config.device.get_connection().run(f'sudo python3 {os.path.join(self._local_tmp_folder_path, "tcp_probe_bpf.py")} --filter "(saddr {saddr}) and (dport {dport})" --output {filename}', asynchronous=True, watchers = [watcher], pty=True)
-                    global not_seen_tcp_server
-                    while not_seen_tcp_server.value: # trigger watcher to read input
-                        responses = watcher.submit("") 
-                        sleep(1)
-
-                    not_seen_tcp_server.value = True
+                    promise_tcp_server = self._engine.start(server_config.device, self._tcp_probe_command(f"(saddr {saddr}) and (dport {dport})", filename), ready_marker="Ready", pty=True)
                     server_promises.append(promise_tcp_server)
-                    server_config.device.get_connection().run("sudo ip tcp_metrics flush")
+
+        # the server loggers compile their probes at the same time, they have to be ready before the servers start
+        if server_promises:
+            self._engine.wait_ready(*server_promises)
+            print("TCP Server logging started")
+        for device in {promise.device for promise in server_promises}:
+            device.get_connection().run("sudo ip tcp_metrics flush")
 
         return server_promises
     
@@ -542,9 +610,9 @@ class ExperimentConfiguration:
                     interrupt_process_by_name(server.device.get_connection(), "tcp_probe_bpf.py")
                 break
 
-    def _join_TCP_logging_servers_promises(self, server_promises:List[Union[Promise, None]], iteration_logger:logging.Logger, folder_path:str):
-        for bpf_pro_tcp, index in enumerate(server_promises):
-            if isinstance(bpf_pro_tcp, Promise):
+    def _join_TCP_logging_servers_promises(self, server_promises:List[Union[RemoteProcess, None]], iteration_logger:logging.Logger, folder_path:str):
+        for index, bpf_pro_tcp in enumerate(server_promises):
+            if isinstance(bpf_pro_tcp, RemoteProcess):
                 try:
                     bpf_result = bpf_pro_tcp.join()
                 except WatchDogException as e:
@@ -556,150 +624,155 @@ class ExperimentConfiguration:
                 with open(folder_path + f"TCP_server_log_{index}.log", "w") as std_class:
                     std_class.write(bpf_result.stdout)
 
+    def _run_tc_batch(self, batch:TC_Batch) -> List[Tuple[str, str, bool, str]]:
+        # -force keeps tc going after a failed line so that all errors are reported at once
+        try:
+            res:Result = self._bottleneckrouter.get_connection().run("sudo tc -force -batch -", in_stream=io.StringIO(batch.script()), hide=True, warn=True)
+        except (exceptions.UnexpectedExit, exceptions.Failure, exceptions.ThreadException) as e:
+            raise ConfigurationError(batch.commands, "sudo tc -force -batch -", e)
+        return batch.failures(res.stderr)
+
     def _configure_tc(self, logger):
-        cmds:List[str]
-        cmds_clear:List[str]
-        cmds_ingress:List[str]
-        cmds_egress:List[str]
-        cmds_ifb:List[str]
-        cmds, (cmds_clear, cmds_general, cmds_ingress, cmds_egress, cmds_ifb) = self._tc_config.get_config_commands(self._rtt, self._bottleneck_bw)
-        print("=== Clear ====")
-        for com in cmds_clear:
-            res = None
-            try:
-                res:Union[Result, None] = self._bottleneckrouter.get_connection().run(com, hide=True)
-                print(com)
-            except (exceptions.UnexpectedExit, exceptions.Failure, exceptions.ThreadException) as e:
-                if res is not None and res.stderr == "Error: Cannot delete qdisc with handle of zero.":
-                    logger.info(f"Qdisc already empty: {com}")
-                else:
-                    if "ifb" in com:
-                        pass
-                    else:
-                        logger.warning(f"Initial cleanup: could not clean tc-config: {com}")
-                        logger.info(e.__str__)
-        
-        print("=== General ====")
-        for com in cmds_general:
-            try:
-                print(com)
-                #with self._bottleneckrouter.get_connection() as connection:
-                self._bottleneckrouter.get_connection().run(com, hide=True)
-            except (exceptions.UnexpectedExit, exceptions.Failure, exceptions.ThreadException) as e:
+        if self._tc_incremental:
+            batch, full_rebuild = self._tc_config.get_update_batch(self._bottleneckrouter.applied_tc_tree, self._rtt, self._bottleneck_bw)
+        else:
+            batch, full_rebuild = self._tc_config.get_config_batch(self._rtt, self._bottleneck_bw), True
+        # unknown until the batch went through
+        self._bottleneckrouter.applied_tc_tree = None
+        logger.info("Egress configuration: " + str(batch.section_commands("egress")))
+        print(f"=== Configure tc ({'rebuild' if full_rebuild else 'update'}) ====")
+        print(batch.script())
+        errors:List[Tuple[str, str, bool, str]] = []
+        for section, com, tolerant, message in self._run_tc_batch(batch):
+            if not tolerant:
+                logger.error(f"Could not configure tc on {section}: {com}")
+                logger.info(message)
+                errors.append((section, com, tolerant, message))
+            elif "handle of zero" in message:
+                logger.info(f"Qdisc already empty: {com}")
+            elif section == "general":
                 logger.info(f"Configuration already done: {com}")
-                pass
+            elif "ifb" not in com:
+                logger.warning(f"Initial cleanup: could not clean tc-config: {com}")
+                logger.info(message)
 
-        logger.info("Egress configuration: " + str(cmds_egress))
-        print("=== Egress ====")
-        for com in cmds_egress:
-            try:
-                print(com)
-                #with self._bottleneckrouter.get_connection() as connection:
-                self._bottleneckrouter.get_connection().run(com)
-            except (exceptions.UnexpectedExit, exceptions.Failure, exceptions.ThreadException) as e:
-                logger.error(f"Could not configure tc on egress: {com}")
-                logger.info(cmds_egress)
-                logger.info(e.__str__)
-                raise ConfigurationError(cmds_egress, com, e)
-
-        print("=== Ingress ====")
-        for com in cmds_ingress:
-            try:
-                print(com)
-                #with self._bottleneckrouter.get_connection() as connection:
-                self._bottleneckrouter.get_connection().run(com)
-            except (exceptions.UnexpectedExit, exceptions.Failure, exceptions.ThreadException) as e:
-                logger.error(f"Could not configure tc on ingress: {com}")
-                logger.info(cmds_ingress)
-                logger.info(e.__str__)
-                raise ConfigurationError(cmds_ingress, com, e)
-           
-        print("=== IFB ====")   
-        for com in cmds_ifb:
-            try:
-                print(com)
-                #with self._bottleneckrouter.get_connection() as connection:
-                self._bottleneckrouter.get_connection().run(com, echo=False)
-            except (exceptions.UnexpectedExit, exceptions.Failure, exceptions.ThreadException) as e:
-                logger.error(f"Could not configure delay on ifb: {com}")
-                logger.info(cmds_ifb)
-                logger.info(e.__str__)
-                raise ConfigurationError(cmds_ingress, com, e)
+        if errors:
+            # never leave the bottleneck half-configured
+            self._run_tc_batch(self._tc_config.get_clear_batch())
+            section, com, _, message = errors[0]
+            raise ConfigurationError(batch.section_commands(section), com, message)
+
+        if self._tc_incremental:
+            self._bottleneckrouter.applied_tc_tree = self._tc_config.get_tree(self._rtt, self._bottleneck_bw)
+        # qdiscs that survived the update still count the traffic of earlier iterations
+        self._tc_baseline = None if full_rebuild else self._get_queue_stats()
+
+    def _get_queue_stats(self) -> pd.DataFrame:
+        res:Result = self._bottleneckrouter.get_connection().run("tc -s qdisc show", hide=True)
+        return qdisc_s_show_to_df(res.stdout)
 
     def _clear_tc(self, logger):
-        cmds_clear:List[str]
         print("Clear tc")
-        _, (cmds_clear, _, _, _, _) = self._tc_config.get_config_commands(self._rtt, self._bottleneck_bw, initial=False)
-        for com in cmds_clear:
-            res = None
-            try:
-                #with self._bottleneckrouter.get_connection() as connection:
-                res:Union[Result, None] = self._bottleneckrouter.get_connection().run(com, hide=True)
-
-            except (exceptions.UnexpectedExit, exceptions.Failure, exceptions.ThreadException) as e:
-                if res is not None and res.stderr == "Error: Cannot delete qdisc with handle of zero.":
-                    logger.info(f"Qdisc already empty: {com}")
-                else:
-                    logger.warning(f"After run cleanup: Could not clean tc-config: {com}")
-                    logger.info(e.__str__)
+        for _, com, _, message in self._run_tc_batch(self._tc_config.get_clear_batch()):
+            if "handle of zero" in message:
+                logger.info(f"Qdisc already empty: {com}")
+            else:
+                logger.warning(f"After run cleanup: Could not clean tc-config: {com}")
+                logger.info(message)
 
 
     def _get_tc_debug(self, logger, folder_path):
         
         print("Get TC Debug Information")
-        res = None
         try:
-            res:Union[Result, None] = self._bottleneckrouter.get_connection().run("tc -s qdisc show", hide=True)
+            queue_stats = self._get_queue_stats()
         except Exception as e:
             print(e)
             raise e
-        queue_stats = qdisc_s_show_to_df(res.stdout)
+        if self._tc_baseline is not None:
+            queue_stats = subtract_queue_stats(queue_stats, self._tc_baseline)
         queue_stats.to_csv(os.path.join(folder_path, "queue-stats.csv"))
 
+        # render the current tree right away, the images are pulled in the background
+        STAGING_DIR = self._collector.staging_dir()
+        COMMAND = " && ".join([f"mkdir -p {STAGING_DIR}"] + [f"python3 {os.path.join(self._tc_viz_path, "tcviz.py")} {interface} | dot -Tpng > {os.path.join(STAGING_DIR, f"{interface}.png")}" for interface in self._interfaces])
+        try:
+            self._bottleneckrouter.get_connection().run(COMMAND, hide=True)
+        except Exception as e:
+            print(e)
+            raise e
         for interface in self._interfaces:
-
-            FILE_NAME = os.path.join(self._local_tmp_folder_path, f"{interface}.png")
-            LOCAL_FILENAME = os.path.join(folder_path, f"{interface}.png")
-            COMMAND = f"python3 {os.path.join(self._tc_viz_path, "tcviz.py")} {interface} | dot -Tpng > {FILE_NAME}"
-
-            res = None
-            try:
-                res:Union[Result, None] = self._bottleneckrouter.get_connection().run(COMMAND, hide=True)
-                self._bottleneckrouter.get_connection().get(remote=FILE_NAME, local=LOCAL_FILENAME)
-                self._bottleneckrouter.get_connection().run(f"sudo rm {FILE_NAME}")
-            except Exception as e:
-                print(e)
-                raise e    
+            self._collector.collect(self._bottleneckrouter, os.path.join(STAGING_DIR, f"{interface}.png"), Artifact(f"{interface}.png", folder_path))
+        return queue_stats
+
+    def _final_classes(self, snapshot:dict) -> Dict[int, str]:
+        """Last Class-ID the classifier logged for the flow of each client."""
+        # taken from the flow map of the classifier daemon, which works for both log formats and leaves the log to the background collection
+        classes:Dict[Tuple[int, int], str] = {(source_port, destination_port): str(class_id) for source_port, destination_port, class_id in snapshot["classes"]}
+        final_classes:Dict[int, str] = {}
+        for client in self._client_start_list:
+            # the classifier tracks the server->client direction
+            for (source_port, destination_port), class_id in classes.items():
+                if destination_port == client.local_port:
+                    final_classes[client.client_number] = class_id
+        return final_classes
+
+    def _iteration_metrics(self, client_promises:List[QUIC_Client_Promise_Tuple], queue_stats:pd.DataFrame, final_classes:Dict[int, str]) -> Dict[str, Union[float, str]]:
+        metrics:Dict[str, Union[float, str]] = {}
+        for client, process in client_promises:
+            if isinstance(client.implementation, IPERF_UDP) or process.result is None or process.end_time_ns is None:
+                continue
+            seconds = (process.end_time_ns - process.start_time_ns) / pow(10, 9)
+            if seconds > 0:
+                metrics[f"goodput_client_{client.client_number}"] = client._transfer_amount * 8 / seconds
+        for client_number, class_id in final_classes.items():
+            metrics[f"class_client_{client_number}"] = class_id
+        for _, row in queue_stats.iterrows():
+            if not pd.isna(row["Packets Dropped"]):
+                metrics[f"drops_{row['Device']}_{row['Handle']}"] = float(row["Packets Dropped"])
+        return metrics
 
     def _create_files(self, servers: List[SSHConnector], filesizes: List[int], implementations):
-        for server in set(servers):
+        # files of the right size survive across experiments, only missing ones are created.
+        # servers that share their storage (the namespaces of a VirtualTestbed) would race on the same files and manifest, they are planned once
+        hosts = {}
+        for server in servers:
+            hosts.setdefault(server.storage, server)
+        missing_files = {}
+        for server in hosts.values():
             try:
-                server.get_connection().run(f"rm {os.path.join(self._traffic_files_path, '*')}")
+                missing_files[server] = self._traffic_file_cache.plan(server, filesizes)
             except Exception as e:
                 print(e)
-                pass
+                raise PreperationError(server, self._traffic_files_path, e)
         all_promises = []
-        for filesize in filesizes:
+        for current_server, missing in missing_files.items():
+            for filesize in missing:
+                try:
+                    print(f"Create download file of size {filesize} on server {current_server.local_ip}.")
+                    promise = current_server.get_connection().run(self._traffic_file_cache.creation_command(filesize), asynchronous=True, hide=True)
+                    all_promises.append((promise,(filesize,current_server)))
+                except Exception as e:
+                    raise PreperationError(current_server, filesize.__str__, e)
+
+        checksums = {server: {} for server in missing_files}
+        for promise, (filesize, server) in all_promises:
             try:
-                for current_server in set(servers):
-                    try:
-                        print(f"Create download file of size {filesize} on server {current_server.local_ip}.")
-                        promise:Promise = current_server.get_connection().run(f"head -c {filesize}M </dev/urandom > {os.path.join(self._traffic_files_path, f'{filesize}MB')}", asynchronous=True)
-                        all_promises.append((promise,(filesize,current_server.local_ip)))
-                    except Exception as e:
-                        raise PreperationError(server, filesize.__str__, e)
+                res:Result = promise.join()
             except Exception as e:
+                print(e)
+                print(f"Creating download file of size {filesize} on server {server.local_ip} failed.")
                 raise PreperationError("local", filesize.__str__, e) 
+            else:
+                checksums[server][filesize] = res.stdout.strip()
+                print(f"Finished creating download file of size {filesize} on server {server.local_ip}.")
 
-        for promise, (filesize, host) in all_promises:
+        for server in missing_files:
             try:
-                promise.join()
+                self._traffic_file_cache.commit(server, filesizes, checksums[server])
             except Exception as e:
                 print(e)
-                print(f"Creating download file of size {filesize} on server {host} failed.")
-                raise PreperationError("local", filesize.__str__, e) 
-            else:
-                print(f"Finished creating download file of size {filesize} on server {host}.")
+                raise PreperationError(server, self._traffic_files_path, e)
 
 
     def _prepare(self, logger):
@@ -714,47 +787,29 @@ class ExperimentConfiguration:
             logger.info("Next: prepare TCP logging script.")
             self._prepare_TCP_logging_script()
 
-    @staticmethod
-    def _join_client_promises(promises:List[QUIC_Client_Promise_Tuple], let_nocc_finish:bool) -> List[QUIC_Client_Promise_Tuple]:
+    def _join_client_promises(self, promises:List[QUIC_Client_Promise_Tuple], let_nocc_finish:bool) -> List[QUIC_Client_Promise_Tuple]:
         results:List[QUIC_Client_Promise_Tuple] = []
-        error:bool = False
 
         raiseWatchDog = False
 
+        async def join_client(promise:QUIC_Client_Promise_Tuple):
+            try:
+                result = await promise[1].wait()
+            except WatchDogException:
+                raise
+            except Exception as e:
+                print(e)
+                results.append((promise[0], None))
+                raise e
+            print(f"{promise[0].implementation} complete.")
+            results.append((promise[0], result))
 
-        client_indexing = {}
-        for index, promise in enumerate(promises):
-            client_indexing[index] = {
-                "joined": False,
-                "UDP": isinstance(promise[0].implementation, IPERF_UDP)
-            }
-
-        print("Start a flexible while loop to iteratively stop the processes once they become stoppable")
-        while not all([client_indexing[index]["joined"] for index in client_indexing.keys() if not(client_indexing[index]["UDP"])]):
-            
-            for index in client_indexing.keys():
-                
-                promise = promises[index]
-                if not client_indexing[index]["joined"] and not client_indexing[index]["UDP"]:
-                    if not promise[1].runner.process_is_finished:
-                        pass
-                    else:
-
-                        try:
-                            print(f"Join: {promise[0].implementation}")
-                            results.append((promise[0], promise[1].join()))
-                            client_indexing[index]["joined"] = True
-                        except WatchDogException as e:
-                            raiseWatchDog = True
-                            break
-                        except Exception as e:
-                            print(e)
-                            results.append((promise[0], None))
-                            raise e
-
-                        else:
-                            print(f"{promise[0].implementation} complete.")
-            sleep(1)
+        # UDP background flows do not finish on their own and are stopped once all other clients are done
+        print("Wait for the clients to finish; each one is joined the moment it terminates")
+        try:
+            self._engine.run(asyncio.gather(*(join_client(promise) for promise in promises if not isinstance(promise[0].implementation, IPERF_UDP))))
+        except WatchDogException as e:
+            raiseWatchDog = True
 
         for promise in promises:
             if isinstance(promise[0].implementation, IPERF_UDP) and not let_nocc_finish:
@@ -836,7 +891,7 @@ class ExperimentConfiguration:
             file.write(res.command)
 
 
-    def kill_everything(self):
+    def kill_everything(self, keep_classifier:bool = False):
 
         for server in self._server_list:
             try:
@@ -850,64 +905,157 @@ class ExperimentConfiguration:
             except:
                 pass
 
-        interrupt_process_by_name(self._bottleneckrouter.get_connection(), "python")
+        if not keep_classifier:
+            stop_classifier_daemon(self._bottleneckrouter)
         interrupt_process_by_name(self._bottleneckrouter.get_connection(), "tcpdump")    
 
 
+    def _set_tracer(self, tracer:Union[Tracer, None]):
+        # the devices are shared with other experiments, only trace while this one runs
+        for device in [self._bottleneckrouter, self._load1, self._load2, self._client]:
+            if device:
+                device.tracer = tracer
+        self._engine.tracer = tracer
+
+    def _iteration_collected(self, experiment:str, iteration:int, collected:bool):
+        # called once the last file of the iteration has been pulled, from a transfer worker or the orchestration
+        if self._journal is not None:
+            self._journal.append(experiment, "collected" if collected else "failed", iteration=iteration)
+        # the spans of the iteration are complete now, also those of its transfers
+        iteration_folder = os.path.join(self._result_folder_path, f"iter_{iteration:03}")
+        if self._tracing and os.path.isdir(iteration_folder):
+            self._tracer.write_trace(os.path.join(iteration_folder, "trace.json"), iteration)
+
     def run(self, json_obj, filename_bpf:str = "ebpf_classifier_log.csv", filename_tcpdump:str = "tcpdump_bottleneck.pcap", filename_bpf_tcp:str = "TCP_ebpf_classifier_log.csv"):
-        start_time = datetime.datetime.now()
         try:
-            os.makedirs(self._result_folder_path, exist_ok=False)
-        except:
-            self._result_folder_path = self._result_folder_path + "__" + str(datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
-            os.makedirs(self._result_folder_path, exist_ok=False)
+            self._run(json_obj, filename_bpf, filename_tcpdump, filename_bpf_tcp)
         finally:
-            self._result_folder_path = self._result_folder_path + "/"
+            # also when the experiment was skipped or could not be prepared
+            self._engine.close()
+
+    def _run(self, json_obj, filename_bpf:str, filename_tcpdump:str, filename_bpf_tcp:str):
+        start_time = datetime.datetime.now()
+        if self._classifier_log_format == "binary":
+            filename_bpf = os.path.splitext(filename_bpf)[0] + ".bin"
+        experiment = experiment_hash(json_obj)
+        completed_iterations = set()
+        state = self._journal.state(experiment) if self._journal is not None and self._resume else None
+        if state is not None and state.done:
+            print(f"Experiment {experiment} already done in {state.folder}, skipped.")
+            return
+        if state is not None and state.folder is not None and os.path.isdir(state.folder):
+            self._result_folder_path = state.folder.rstrip("/") + "/"
+            # iterations are only reused if their folder survived, partially collected ones are repeated
+            completed_iterations = {iteration for iteration in state.iterations if os.path.isdir(os.path.join(self._result_folder_path, f"iter_{iteration:03}"))}
+            for iteration in range(self._iterations):
+                if iteration not in completed_iterations:
+                    shutil.rmtree(os.path.join(self._result_folder_path, f"iter_{iteration:03}"), ignore_errors=True)
+            print(f"Resume experiment {experiment} in {self._result_folder_path}, {len(completed_iterations)} of {self._iterations} iterations done.")
+        else:
+            try:
+                os.makedirs(self._result_folder_path, exist_ok=False)
+            except:
+                self._result_folder_path = self._result_folder_path + "__" + str(datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+                os.makedirs(self._result_folder_path, exist_ok=False)
+            finally:
+                self._result_folder_path = self._result_folder_path + "/"
+        if self._journal is not None:
+            self._journal.append(experiment, "started", folder=self._result_folder_path)
 
         logger = setup_logger("Experiment", self._result_folder_path + "log")
 
         with open(self._result_folder_path + "configs.json", 'w') as f:
             json.dump(json_obj, f, indent=4)
 
+        self._set_tracer(self._tracer if self._tracing else None)
+        logger.info("Prepare experiment.")
+        self._tracer.phase("prepare")
         try:
             self._prepare(logger)
         except Exception as e:
             logger.critical("Could not do overall experiment preparation.")
             logger.info(f"Experiment: {self._result_folder_path}\n" + e.__str__())
             reset_logger(logger) 
+            self._set_tracer(None)
             return
+        self._tracer.end_phase()
+
+        self._compression = CompressionPool(codec=self._compression_codec,
+                                            level=self._compression_level,
+                                            workers=self._compression_workers,
+                                            manifest_path=os.path.join(self._result_folder_path, "compression-manifest.csv"))
+        self._collector = ResultCollector(staging_path=os.path.join(self._local_tmp_folder_path, "staging"),
+                                          logger=logger,
+                                          workers=self._collection_workers,
+                                          max_pending=self._collection_queue_size,
+                                          compression=self._compression,
+                                          remote_compression_level=self._remote_compression_level,
+                                          tracer=self._tracer if self._tracing else None)
+
+        monitor = None
+        converged = False
+        if self._adaptive_min_iterations is not None:
+            monitor = ConvergenceMonitor(min_iterations=self._adaptive_min_iterations, rel_width=self._adaptive_rel_width, confidence=self._adaptive_confidence)
 
         for iteration in range(self._iterations):
+            if iteration in completed_iterations:
+                print(f"Iteration {iteration:03} already collected, skipped.")
+                metrics_path = os.path.join(self._result_folder_path, f"iter_{iteration:03}", "metrics.json")
+                if monitor is not None and os.path.exists(metrics_path):
+                    with open(metrics_path) as f:
+                        monitor.add(json.load(f))
+                continue
+            if monitor is not None and monitor.converged():
+                # the iterations collected before --resume may already suffice, fresh ones are checked after they ran
+                logger.info(f"Converged after {monitor.iterations} collected iterations: {monitor.report()}")
+                print(f"Metrics converged with the collected iterations, stop before iteration {iteration:03}.")
+                converged = True
+                break
             logger.info(f"Start iteration {iteration:03}")
             print(f"Start iteration {iteration:03}")
             print(f" Current time: {datetime.datetime.now()}, start time for this parameter configuration: {start_time}")
-            print("Reset all ssh connections.")
-            self.resetSshConnections()
-            self.startSshConnections()
-            sleep(1)
+            iteration_start_ns = time_ns()
+            self._tracer.iteration = iteration
+            self._tracer.phase("ssh setup")
+            if self._reset_ssh_per_iteration:
+                print("Reset all ssh connections.")
+                # transfers of the previous iteration use the same connections
+                self._collector.drain()
+                self.resetSshConnections()
+                self.startSshConnections()
+                sleep(1)
+            else:
+                self.startSshConnections()
 
             iteration_logger = None
+            iteration_complete = False
+            iteration_metrics = None
+            final_classes = {}
+            self._collector.begin(iteration)
 
-            client_TCP_logging_promises:List[Union[Promise, None]] = [] 
-            server_TCP_logging_promises:List[Union[Promise, None]] = []  
+            client_TCP_logging_promises:List[Union[RemoteProcess, None]] = [] 
+            server_TCP_logging_promises:List[Union[RemoteProcess, None]] = []  
             processes = []
-            List[Union[Promise, None]]
             try:
                 folder_path = os.path.join(self._result_folder_path, f"iter_{iteration:03}/")
                 os.mkdir(folder_path)
                 iteration_logger = setup_logger("Iteration", folder_path + "log")
 
+                self._tracer.phase("start servers")
                 print("Start servers")
                 if self._deploy_TCP_classifier:
                     server_TCP_logging_promises = self._start_TCP_logging_servers()
                 server_promises = self._startServers()
                 processes.append(server_promises)
                 
+                self._tracer.phase("configure tc")
                 print("Configure TC before experiment iteration.")
                 self._configure_tc(iteration_logger)
+                self._tracer.phase("start measurements")
                 print("Start measurements")
-                bpf_pro, tcp_dump_pro = self._start_measurements(deploy_QUIC_classifier=self._deploy_QUIC_classifier, filename_bpf="ebpf_classifier_log.csv", only_UDP=self._deploy_QUIC_classifier, tcp_dump=self._tcp_dump, filename_tcpdump="tcpdump_bottleneck.pcap", deploy_TCP_classifier=self._deploy_TCP_classifier, filename_bpf_tcp = "TCP_ebpf_classifier_log.csv")
+                bpf_pro, tcp_dump_pro = self._start_measurements(deploy_QUIC_classifier=self._deploy_QUIC_classifier, filename_bpf=filename_bpf, only_UDP=self._deploy_QUIC_classifier, tcp_dump=self._tcp_dump, filename_tcpdump="tcpdump_bottleneck.pcap", deploy_TCP_classifier=self._deploy_TCP_classifier, filename_bpf_tcp = "TCP_ebpf_classifier_log.csv")
                 
+                self._tracer.phase("start clients")
                 print("Start clients.")
                 if self._deploy_TCP_classifier:
                     client_TCP_logging_promises = self._start_TCP_logging_clients()
@@ -917,24 +1065,30 @@ class ExperimentConfiguration:
                 signal.signal(signal.SIGALRM, handler)
                 signal.alarm(self._watch_dog_timeout_s)
 
+                self._tracer.phase("flows")
                 print("wait for completion of clients")
-                sleep(5)
 
-                client_results:List[QUIC_Client_Promise_Tuple] = ExperimentConfiguration._join_client_promises(client_promises, self._let_nocc_finish)
+                client_results:List[QUIC_Client_Promise_Tuple] = self._join_client_promises(client_promises, self._let_nocc_finish)
+                self._tracer.phase("stop measurements")
                 print("Let clients completly stop and then stop measurements before stopping the servers")
                 sleep(1)
 
                 self._join_TCP_logging_clients_promises(client_TCP_logging_promises, iteration_logger, folder_path)
                 
-                interrupt_process_by_name(self._bottleneckrouter.get_connection(), "python")
                 interrupt_process_by_name(self._bottleneckrouter.get_connection(), "tcpdump")     
 
                 if self._deploy_TCP_classifier:
                     self._stop_TCP_logging_clients()
                 
-                if isinstance(bpf_pro, Promise):
+                if isinstance(bpf_pro, ClassifierDaemon):
                     try:
-                        bpf_result = bpf_pro.join()
+                        # the log is complete once it is rotated
+                        detached, rotated, snapshot, stats = bpf_pro.control("detach", "rotate", "snapshot", "stats")
+                        if self._classifier_config.summaries:
+                            # the last snapshot is taken at teardown
+                            bpf_pro.control("summarize")
+                        if not self._resident_classifier:
+                            stop_classifier_daemon(self._bottleneckrouter)
                     except WatchDogException as e:
                         raise
                     except Exception as e:
@@ -942,10 +1096,17 @@ class ExperimentConfiguration:
                         raise e
                     
                     with open(folder_path + "stdout_classifier.log", "w") as std_class:
-                        std_class.write(bpf_result.stdout)
+                        std_class.write("\n".join(snapshot["drops"]) + "\n\n\n" + "\n".join(snapshot["ecn"]) + "\n")
+                        std_class.write(f"Rows: {rotated['rows']}, lost events: {stats['lost']}, flows: {stats['flows']}\n")
+                        for error in detached["errors"]:
+                            std_class.write(f"Could not delete filter: {error}\n")
                     try:
-                        self._bottleneckrouter.get_connection().get(remote=filename_bpf, local=folder_path)
-                        self._bottleneckrouter.get_connection().run(f"sudo rm {filename_bpf}")
+                        if monitor is not None:
+                            final_classes = self._final_classes(snapshot)
+                        # the classifier log is only kept compressed if compressing it costs no time on the orchestrator
+                        self._collector.stage(self._bottleneckrouter, [Artifact(filename_bpf, folder_path, compress=self._remote_compression_level is not None)])
+                        if self._classifier_config.summaries:
+                            self._collector.stage(self._bottleneckrouter, [Artifact(CLASSIFIER_SUMMARIES, folder_path)])
                     except WatchDogException as e:
                         raise
                     except Exception as e:
@@ -953,12 +1114,10 @@ class ExperimentConfiguration:
                         iteration_logger.info(e.__str__())
                         raise e
     
-                if isinstance(tcp_dump_pro, Promise):
+                if isinstance(tcp_dump_pro, RemoteProcess):
                     tcp_dump_result = tcp_dump_pro.join()
                     try:
-                        self._bottleneckrouter.get_connection().get(remote=filename_tcpdump, local=folder_path)
-                        self._bottleneckrouter.get_connection().run(f"rm {filename_tcpdump}")
-                        subprocess.Popen(["/usr/bin/brotli", "--rm", "-f", "--quality=7", os.path.join(folder_path, filename_tcpdump)], stdin=None, stdout=None, stderr=None, close_fds=True)
+                        self._collector.stage(self._bottleneckrouter, [Artifact(filename_tcpdump, folder_path, compress=True)])
                     except WatchDogException as e:
                         raise
                     except Exception as e:
@@ -966,6 +1125,7 @@ class ExperimentConfiguration:
                         iteration_logger.info(e.__str__())
                         raise e
 
+                self._tracer.phase("collect client data")
                 print("Collect client data")
                 print("Iteration Result Folder Path:", folder_path)
 
@@ -990,26 +1150,23 @@ class ExperimentConfiguration:
                             if (not isinstance(client[0].implementation, TCP)) and (not isinstance(client[0].implementation, IPERF_UDP)):
                                 if self._load_qlog_data:
                                     print("Get Client File: ", log_file_path)
-                                    client[0].device.get_connection().get(remote=log_file_path, local=device_folder_path)
-                                    subprocess.Popen(["/usr/bin/brotli", "--rm", "-f", "--quality=7", os.path.join(device_folder_path, log_file_path)], stdin=None, stdout=None, stderr=None, close_fds=True)
+                                    self._collector.stage(client[0].device, [Artifact(log_file_path, device_folder_path, compress=True)])
                                 else:
                                     print(f"Loading client file ({log_file_path}) disabled.")
-                                client[0].device.get_connection().run(f"sudo rm {log_file_path}") 
+                                    client[0].device.get_connection().run(f"sudo rm {log_file_path}")
                             if isinstance(client[0].implementation, IPERF_UDP):
                                 print(f"Get Client File: {log_file_path}")
-                                client[0].device.get_connection().get(remote=log_file_path, local=device_folder_path) 
-                                client[0].device.get_connection().run(f"sudo rm {log_file_path}") 
+                                self._collector.stage(client[0].device, [Artifact(log_file_path, device_folder_path)])
 
                             if isinstance(client[0].implementation, TCP):
                                 if self._deploy_TCP_classifier:
-                                    LOG_FILE_NAME = f"{client[0].client_number}_TCPlog_client.csv"
+                                    LOG_FILE_NAME = self._tcp_log_name(client[0].client_number, "client")
                                     if self._load_qlog_data:
                                         print("Get Client File: ", LOG_FILE_NAME)
-                                        client[0].device.get_connection().get(remote=LOG_FILE_NAME, local=device_folder_path)
-                                        subprocess.Popen(["/usr/bin/brotli", "--rm", "-f", "--quality=7", os.path.join(device_folder_path, LOG_FILE_NAME)], stdin=None, stdout=None, stderr=None, close_fds=True)
+                                        self._collector.stage(client[0].device, [Artifact(LOG_FILE_NAME, device_folder_path, compress=True)])
                                     else:
                                         print(f"Loading client file ({LOG_FILE_NAME}) disabled.")
-                                    client[0].device.get_connection().run(f"rm {LOG_FILE_NAME}")
+                                        client[0].device.get_connection().run(f"rm {LOG_FILE_NAME}")
 
                         except WatchDogException as e:
                             raise
@@ -1025,11 +1182,11 @@ class ExperimentConfiguration:
                             if isinstance(client[0].implementation, IPERF_UDP):
                                 log_file_path:str = client[0].implementation.get_client_log_file_path(client[0])
                                 print(f"Get Client File: {log_file_path}")
-                                client[0].device.get_connection().get(remote=log_file_path, local=device_folder_path) 
-                                client[0].device.get_connection().run(f"sudo rm {log_file_path}") 
+                                self._collector.stage(client[0].device, [Artifact(log_file_path, device_folder_path)])
                             else:
                                 pass
 
+                self._tracer.phase("stop servers")
                 for server in self._server_list:
                     try:
                         server.device.get_connection().run(server.implementation.stop_server_command())
@@ -1056,6 +1213,7 @@ class ExperimentConfiguration:
                         raise e
 
                 print("servers joined")
+                self._tracer.phase("collect server data")
                 print("Collect SERVER data")
                 
                 server_results:List[QUIC_Server_Promise_Tuple] = ExperimentConfiguration._join_server_promises(server_promises)
@@ -1082,35 +1240,33 @@ class ExperimentConfiguration:
                         print("Server log_file_paths:", log_file_paths)
                         ExperimentConfiguration._dump_quic_data(device_folder_path, server[0], server[1])
                         if ((not isinstance(server[0].implementation, TCP)) and (not isinstance(server[0].implementation, IPERF_UDP))):
-                            for file_path in log_file_paths:
-                                try:
-                                    if self._load_qlog_data:
-                                        print("Get Server File: ", f"{file_path}")
-                                        server[0].device.get_connection().get(remote=file_path, local=device_folder_path)
-                                        subprocess.Popen(["/usr/bin/brotli", "--rm", "-f", "--quality=7", os.path.join(device_folder_path, os.path.basename(file_path))], stdin=None, stdout=None, stderr=None, close_fds=True)
-                                    else:
-                                        print(f"Loading server file ({file_path}) disabled.")
-                                    server[0].device.get_connection().run(f"rm {file_path}")
-                                except WatchDogException as e:
-                                    raise
-                                except Exception as e:
-                                    print(e)
-                                    iteration_logger.error(f"Could not pull server log-file: {file_path}")
-                                    raise e
+                            try:
+                                if self._load_qlog_data:
+                                    print("Get Server Files: ", log_file_paths)
+                                    self._collector.stage(server[0].device, [Artifact(file_path, device_folder_path, compress=True) for file_path in log_file_paths])
+                                else:
+                                    print(f"Loading server files ({log_file_paths}) disabled.")
+                                    for file_path in log_file_paths:
+                                        server[0].device.get_connection().run(f"rm {file_path}")
+                            except WatchDogException as e:
+                                raise
+                            except Exception as e:
+                                print(e)
+                                iteration_logger.error(f"Could not pull server log-files: {log_file_paths}")
+                                raise e
                         if isinstance(server[0].implementation, TCP):
                             try:
                                 for client_config in self._client_start_list:
-                                    LOG_FILE_NAME = f"{client_config.client_number}_TCPlog_server.csv"
+                                    LOG_FILE_NAME = self._tcp_log_name(client_config.client_number, "server")
                                     if isinstance(client_config.implementation, TCP) and client_config.target_ip == server[0].device.local_ip and server[0]._server_port == client_config.target_port:
                                         if self._deploy_TCP_classifier:
 
                                             if self._load_qlog_data:
                                                 print("Get Server File: ", LOG_FILE_NAME)
-                                                server[0].device.get_connection().get(remote=LOG_FILE_NAME, local=device_folder_path)
-                                                subprocess.Popen(["/usr/bin/brotli", "--rm", "-f", "--quality=7", os.path.join(device_folder_path, LOG_FILE_NAME)], stdin=None, stdout=None, stderr=None, close_fds=True)
+                                                self._collector.stage(server[0].device, [Artifact(LOG_FILE_NAME, device_folder_path, compress=True)])
                                             else:
                                                 print(f"Loading server file ({LOG_FILE_NAME}) disabled.")
-                                            server[0].device.get_connection().run(f"rm {LOG_FILE_NAME}")
+                                                server[0].device.get_connection().run(f"rm {LOG_FILE_NAME}")
                                             break
                             except WatchDogException as e:
                                 raise
@@ -1119,17 +1275,15 @@ class ExperimentConfiguration:
                                 iteration_logger.error(f"Could not pull TCP server log-file of server {client_config.client_number}")
                                 raise e
                         if (isinstance(server[0].implementation, IPERF_UDP)):
-                            for file_path in IPERF_UDP.get_server_log_file_paths(server[0]):
-                                try:
-                                    print("Get Server File: ", f"{file_path}")
-                                    server[0].device.get_connection().get(remote=file_path, local=device_folder_path)
-                                    server[0].device.get_connection().run(f"rm {file_path}")
-                                except WatchDogException as e:
-                                    raise
-                                except Exception as e:
-                                    print(e)
-                                    iteration_logger.error(f"Could not pull UDP Iperf server log-file {file_path}")
-                                    raise e
+                            try:
+                                print("Get Server Files: ", IPERF_UDP.get_server_log_file_paths(server[0]))
+                                self._collector.stage(server[0].device, [Artifact(file_path, device_folder_path) for file_path in IPERF_UDP.get_server_log_file_paths(server[0])])
+                            except WatchDogException as e:
+                                raise
+                            except Exception as e:
+                                print(e)
+                                iteration_logger.error(f"Could not pull UDP Iperf server log-files {IPERF_UDP.get_server_log_file_paths(server[0])}")
+                                raise e
                     else:
                         if server[0].__class__.__name__ != "IPERF3_UDP_Server_Config":
                             iteration_logger.error(f"Server did not join successfully: {server[0]}")
@@ -1137,12 +1291,21 @@ class ExperimentConfiguration:
                             pass
                 signal.alarm(0)
 
-                self._get_tc_debug(iteration_logger, folder_path = os.path.join(self._result_folder_path, f"iter_{iteration:03}/"))
+                self._tracer.phase("tc debug")
+                queue_stats = self._get_tc_debug(iteration_logger, folder_path = os.path.join(self._result_folder_path, f"iter_{iteration:03}/"))
 
-                print("Clear TC after experiment iteration.")
-                self._clear_tc(iteration_logger)
+                if monitor is not None:
+                    iteration_metrics = self._iteration_metrics(client_promises, queue_stats, final_classes)
+                    with open(folder_path + "metrics.json", "w") as f:
+                        json.dump(iteration_metrics, f, indent=4)
+
+                if not self._tc_incremental:
+                    self._tracer.phase("clear tc")
+                    print("Clear TC after experiment iteration.")
+                    self._clear_tc(iteration_logger)
 
             except WatchDogException as e:
+                self._bottleneckrouter.applied_tc_tree = None
                 print(f"Watchdog triggered: {e}")
                 print("WatchDog: Terminate all processes")
                 for process in processes:
@@ -1159,7 +1322,7 @@ class ExperimentConfiguration:
                         except:
                             pass
 
-                    interrupt_process_by_name(self._bottleneckrouter.get_connection(), "python")
+                    stop_classifier_daemon(self._bottleneckrouter)
                     interrupt_process_by_name(self._bottleneckrouter.get_connection(), "tcpdump")
 
                 print("WatchDog: terminated all processes")
@@ -1174,6 +1337,7 @@ class ExperimentConfiguration:
                     logger.info(e.__dict__)
 
             except Exception as e:
+                self._bottleneckrouter.applied_tc_tree = None
                 logger.error(f"Iteration {iteration:03} failed!:")
                 print(f"Iteration {iteration:03} failed!:")
                 if iteration_logger is not None:
@@ -1183,9 +1347,53 @@ class ExperimentConfiguration:
                     logger.error("Error:\n" + e.__str__())
                     logger.info(e.__dict__)
             else:
+                iteration_complete = True
                 logger.info(f"Complete iteration {iteration:03}")
+                if monitor is not None and iteration_metrics is not None:
+                    monitor.add(iteration_metrics)
             finally:
-                self.kill_everything()
-                self.resetSshConnections()
+                try:
+                    self._tracer.phase("teardown")
+                    # a failed iteration may have left the classifier attached
+                    self.kill_everything(keep_classifier=iteration_complete)
+                    if self._reset_ssh_per_iteration:
+                        self._collector.drain()
+                        self.resetSshConnections()
+                    self._tracer.end_phase()
+                    self._tracer.record(f"iteration {iteration:03}", "iteration", iteration_start_ns, time_ns())
+                finally:
+                    # the spans of the orchestration for this iteration are recorded, its trace is written once its transfers are done
+                    self._tracer.iteration = None
+                    self._collector.end(iteration, lambda failures, iteration=iteration, iteration_complete=iteration_complete: self._iteration_collected(experiment, iteration, iteration_complete and not failures))
             reset_logger(iteration_logger)
+            if monitor is not None:
+                print(f"Relative confidence interval widths after {monitor.iterations} iterations: {monitor.report()}")
+                if monitor.converged():
+                    logger.info(f"Converged after {monitor.iterations} iterations: {monitor.report()}")
+                    print(f"Metrics converged, stop after iteration {iteration:03}.")
+                    converged = True
+                    break
+        print("Wait for the result collection to finish.")
+        self._tracer.phase("wait for collection")
+        for failure in self._collector.close():
+            logger.error(f"Result collection failed: {failure}")
+        print("Wait for the compression of the results to finish.")
+        self._tracer.phase("wait for compression")
+        for failure in self._compression.close():
+            logger.error(f"Compression failed: {failure}")
+        self._tracer.end_phase()
+        self._set_tracer(None)
+        if self._tracing:
+            # the preparation, the wait for the results, and the spans of iterations without a folder
+            self._tracer.write_trace(os.path.join(self._result_folder_path, "trace.json"))
+            self._tracer.write_summary(os.path.join(self._result_folder_path, "phase-summary.csv"))
+        if self._journal is not None:
+            # failed or uncollected iterations leave the experiment open for --resume
+            collected = self._journal.state(experiment).iterations
+            missing = [iteration for iteration in range(self._iterations) if iteration not in collected]
+            if converged or not missing:
+                self._journal.append(experiment, "done")
+            else:
+                logger.error(f"Iterations {', '.join(f'{iteration:03}' for iteration in missing)} were not collected, the experiment stays open for --resume.")
+        logger.info("Experiment done.")
         reset_logger(logger)
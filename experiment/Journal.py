@@ -0,0 +1,76 @@
+from typing import List, Set, Union
+import hashlib
+import json
+import os
+import threading
+import time
+
+def experiment_hash(json_obj:dict) -> str:
+    """Identifies an experiment independent of the testbed it runs on and of the number of iterations."""
+    key = {"experiment_config": json_obj["experiment_config"], "parameters": json_obj["parameters"]}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+
+class JournalState:
+    def __init__(self):
+        self.folder:Union[str, None] = None
+        self.done:bool = False
+        self.iterations:Set[int] = set()
+
+class Journal:
+    """
+    Write-ahead journal of the finished work of a run, one JSON record per line.
+
+    Every record is appended with O_APPEND and fsync'ed before the work it describes is considered done,
+    so that the journal survives crashes of the orchestrator and can be shared by the processes of several
+    testbeds. A truncated last line from a crash is ignored when reading.
+    """
+    def __init__(self, path:str):
+        self._path = path
+        self._lock = threading.Lock()
+        # terminate a line that was cut off by a crash so that it does not swallow the next record
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb+") as file:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b"\n":
+                    file.write(b"\n")
+
+    def append(self, experiment:str, status:str, **fields):
+        record = {"experiment": experiment, "status": status, "time": time.time()}
+        record.update(fields)
+        line = (json.dumps(record) + "\n").encode()
+        with self._lock:
+            fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def records(self) -> List[dict]:
+        if not os.path.exists(self._path):
+            return []
+        records = []
+        with open(self._path) as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass
+        return records
+
+    def state(self, experiment:str) -> JournalState:
+        state = JournalState()
+        for record in self.records():
+            if record["experiment"] != experiment:
+                continue
+            if record["status"] == "started":
+                # a restart without --resume uses a fresh folder
+                if record["folder"] != state.folder:
+                    state.iterations = set()
+                state.folder = record["folder"]
+                state.done = False
+            elif record["status"] == "collected":
+                state.iterations.add(record["iteration"])
+            elif record["status"] == "done":
+                state.done = True
+        return state
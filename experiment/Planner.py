@@ -0,0 +1,187 @@
+from .Scheduler import ITERATION_OVERHEAD_S, background_bw, estimate_transfer_s
+from .Journal import Journal, experiment_hash
+
+from statistics import median
+from typing import Dict, List, Tuple, Union
+import datetime
+import json
+import os
+import re
+
+# preparation (traffic files, classifier upload) and final result collection of an experiment
+EXPERIMENT_OVERHEAD_S = {"prepare": 20, "finish": 10}
+
+ARTIFACT_CLASSES = ["pcap", "qlog", "csv", "other"]
+# bytes written per MB that crosses the bottleneck before compression: tcpdump stores 66 bytes of the
+# ~1100 data and ack packets of a MB, picoquic logs ~250 bytes per packet on both ends, the classifier and
+# the TCP probes ~100 bytes per packet
+DEFAULT_BYTES_PER_MB = {"pcap": 72e3, "qlog": 360e3, "csv": 110e3, "other": 2e3}
+
+LOG_LINE = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) \w+ (.*)$")
+
+def artifact_class(file_name:str) -> str:
+    for extension in [".br", ".zst"]:
+        if file_name.endswith(extension):
+            file_name = file_name[:-len(extension)]
+    for artifact in ["pcap", "qlog", "csv"]:
+        if file_name.endswith(f".{artifact}"):
+            return artifact
+    return "other"
+
+def transfer_mb(experiment_configuration:dict) -> float:
+    """MB that cross the bottleneck in one iteration: the downloads and the UDP background traffic."""
+    downloads = sum(client["FILESIZE"] for client in experiment_configuration["CLIENT_CONFIGS"])
+    return downloads + background_bw(experiment_configuration) * estimate_transfer_s(experiment_configuration) / 8
+
+def qlog_share(experiment_configuration:dict) -> float:
+    downloads = sum(client["FILESIZE"] for client in experiment_configuration["CLIENT_CONFIGS"])
+    quic = sum(client["FILESIZE"] for client in experiment_configuration["CLIENT_CONFIGS"] if client["STACK"] == "PICOQUIC")
+    return quic / downloads if downloads else 0.0
+
+def experiment_label(experiment_configuration:dict) -> str:
+    label = f"QUEUE-{experiment_configuration['QUEUE_SIZE_BDP']}_RTT-{experiment_configuration['RTT']}_BW-{experiment_configuration['BW']}"
+    if experiment_configuration["MULTICLASS_AQM_DEPLOY"]:
+        label += f"_GOOD+{experiment_configuration['RESPONSIVE_AQM']}_BAD+{experiment_configuration['STANDARD_AQM']}"
+    else:
+        label += f"_{experiment_configuration['STANDARD_AQM']}"
+    return label + f"_CLIENTS-{len(experiment_configuration['CLIENT_CONFIGS'])}"
+
+def _read_log(path:str) -> List[Tuple[datetime.datetime, str]]:
+    lines = []
+    with open(path, errors="replace") as file:
+        for line in file:
+            match = LOG_LINE.match(line.strip())
+            if match:
+                lines.append((datetime.datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S,%f"), match.group(2)))
+    return lines
+
+class Calibration:
+    """Overheads and artifact volumes observed in the experiment folders of past runs below `result_path`."""
+    def __init__(self, result_path:str):
+        self.iteration_overhead_s:float = ITERATION_OVERHEAD_S
+        self.experiment_overhead_s:Dict[str, float] = dict(EXPERIMENT_OVERHEAD_S)
+        self.bytes_per_mb:Dict[str, float] = dict(DEFAULT_BYTES_PER_MB)
+        self.iterations:int = 0
+        self.experiments:int = 0
+
+        overheads:List[float] = []
+        phases:Dict[str, List[float]] = {phase: [] for phase in EXPERIMENT_OVERHEAD_S}
+        volume:Dict[str, float] = {artifact: 0.0 for artifact in ARTIFACT_CLASSES}
+        qlog_mb = volume_mb = 0.0
+        for folder, _, files in os.walk(result_path) if os.path.isdir(result_path) else []:
+            if "configs.json" not in files or "log" not in files:
+                continue
+            try:
+                with open(os.path.join(folder, "configs.json")) as file:
+                    experiment_configuration = json.load(file)["experiment_config"]
+                transfer_s = estimate_transfer_s(experiment_configuration)
+                log = _read_log(os.path.join(folder, "log"))
+            except (OSError, ValueError, KeyError):
+                continue
+            self.experiments += 1
+
+            phase_start = None
+            starts:Dict[str, datetime.datetime] = {}
+            last_complete = None
+            for timestamp, message in log:
+                if message == "Prepare experiment.":
+                    phase_start = timestamp
+                elif message.startswith("Start iteration"):
+                    if phase_start is not None:
+                        phases["prepare"].append((timestamp - phase_start).total_seconds())
+                        phase_start = None
+                    starts[message.split()[-1]] = timestamp
+                elif message.startswith("Complete iteration") and message.split()[-1] in starts:
+                    overheads.append((timestamp - starts[message.split()[-1]]).total_seconds() - transfer_s)
+                    last_complete = timestamp
+                elif message == "Experiment done." and last_complete is not None:
+                    phases["finish"].append((timestamp - last_complete).total_seconds())
+
+            # only completely collected iterations tell the volume
+            for iteration in [name for name in os.listdir(folder) if name.startswith("iter_")]:
+                iteration_volume = {artifact: 0 for artifact in ARTIFACT_CLASSES}
+                for iteration_folder, _, iteration_files in os.walk(os.path.join(folder, iteration)):
+                    for name in iteration_files:
+                        iteration_volume[artifact_class(name)] += os.path.getsize(os.path.join(iteration_folder, name))
+                if iteration_volume["pcap"] == 0:
+                    continue
+                self.iterations += 1
+                for artifact in ARTIFACT_CLASSES:
+                    volume[artifact] += iteration_volume[artifact]
+                volume_mb += transfer_mb(experiment_configuration)
+                qlog_mb += transfer_mb(experiment_configuration) * qlog_share(experiment_configuration)
+
+        if overheads:
+            self.iteration_overhead_s = max(0.0, median(overheads))
+        for phase, values in phases.items():
+            if values:
+                self.experiment_overhead_s[phase] = max(0.0, median(values))
+        if volume_mb > 0:
+            for artifact in ["pcap", "csv", "other"]:
+                self.bytes_per_mb[artifact] = volume[artifact] / volume_mb
+            if qlog_mb > 0:
+                self.bytes_per_mb["qlog"] = volume["qlog"] / qlog_mb
+
+class ExperimentPlan:
+    def __init__(self, experiment_configuration:dict, iterations:int, calibration:Calibration, load_qlog_data:bool):
+        self.label = experiment_label(experiment_configuration)
+        self.iterations = iterations
+        self.seconds = iterations * (estimate_transfer_s(experiment_configuration) + calibration.iteration_overhead_s)
+        if iterations > 0:
+            self.seconds += sum(calibration.experiment_overhead_s.values())
+        mb = transfer_mb(experiment_configuration)
+        self.volume = {artifact: iterations * mb * calibration.bytes_per_mb[artifact] for artifact in ARTIFACT_CLASSES}
+        self.volume["qlog"] *= qlog_share(experiment_configuration) if load_qlog_data else 0.0
+
+def shard(plans:List[ExperimentPlan], testbeds:List[str]) -> Dict[str, List[ExperimentPlan]]:
+    """Replays the scheduler: longest first, each experiment goes to the testbed that becomes free first."""
+    shards:Dict[str, List[ExperimentPlan]] = {testbed: [] for testbed in testbeds}
+    for plan in sorted(plans, key=lambda plan: plan.seconds, reverse=True):
+        testbed = min(testbeds, key=lambda testbed: sum(assigned.seconds for assigned in shards[testbed]))
+        shards[testbed].append(plan)
+    return shards
+
+def _hours(seconds:float) -> str:
+    return f"{seconds / 3600:.1f}h"
+
+def _size(size:float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+def print_plan(configuration:dict, testbeds:List[str], journal:Union[Journal, None] = None, top:int = 10) -> List[ExperimentPlan]:
+    """Prints the estimated testbed time and result volume of a configuration without touching the testbed."""
+    iterations = configuration["ORCHESTRATION"]["ITERATIONS"]
+    calibration = Calibration(configuration["ORCHESTRATION"]["RESULT_PATH"])
+    if calibration.iterations:
+        print(f"Calibrated with {calibration.experiments} past experiments and {calibration.iterations} collected iterations below {configuration['ORCHESTRATION']['RESULT_PATH']}.")
+    else:
+        print("No past runs found, using the default overheads and volumes.")
+    print(f"Overhead: {calibration.iteration_overhead_s:.0f}s per iteration, " + ", ".join(f"{phase} {seconds:.0f}s" for phase, seconds in calibration.experiment_overhead_s.items()) + " per experiment")
+
+    plans = []
+    for experiment_configuration in configuration["EXPERIMENTS"]:
+        remaining = iterations
+        if journal is not None:
+            # with --resume, finished work is not repeated
+            state = journal.state(experiment_hash({"experiment_config": experiment_configuration, "parameters": configuration["PARAMETERS"]}))
+            remaining = 0 if state.done else iterations - len([iteration for iteration in state.iterations if iteration < iterations])
+        plans.append(ExperimentPlan(experiment_configuration, remaining, calibration, configuration["ORCHESTRATION"]["load_qlog_data"]))
+
+    total_s = sum(plan.seconds for plan in plans)
+    print(f"\n{len(plans)} experiments, {sum(plan.iterations for plan in plans)} iterations, {_hours(total_s)} of testbed time")
+    volume = {artifact: sum(plan.volume[artifact] for plan in plans) for artifact in ARTIFACT_CLASSES}
+    print("Result volume: " + ", ".join(f"{artifact} {_size(size)}" for artifact, size in volume.items()) + f", total {_size(sum(volume.values()))}")
+    if not calibration.iterations:
+        print("(before compression)")
+
+    print(f"\nSplit across {len(testbeds)} testbed(s):")
+    for testbed, shard_plans in shard(plans, testbeds).items():
+        print(f"  {testbed}: {len(shard_plans)} experiments, {_hours(sum(plan.seconds for plan in shard_plans))}")
+
+    print("\nLongest experiments:")
+    for plan in sorted(plans, key=lambda plan: plan.seconds, reverse=True)[:top]:
+        print(f"  {_hours(plan.seconds):>7} {_size(sum(plan.volume.values())):>9}  {plan.label}")
+    return plans
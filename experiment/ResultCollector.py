@@ -0,0 +1,216 @@
+from .Compression import CompressionPool
+from .Tracing import Tracer
+
+from contextlib import nullcontext
+from time import perf_counter
+from typing import Callable, Dict, List, Union
+import itertools
+import logging
+import os
+import queue
+import shlex
+import subprocess
+import threading
+
+def stream_command(connection, command:str, local_path:str) -> int:
+    """Runs `command` on the host of `connection`, writes its raw stdout to `local_path`, and returns the exit status."""
+    if hasattr(connection, "stream"):
+        return connection.stream(command, local_path)
+    # invoke decodes the output streams, binary data needs a plain paramiko channel
+    channel = connection.client.get_transport().open_session()
+    try:
+        channel.exec_command(command)
+        with open(local_path, "wb") as file:
+            while True:
+                data = channel.recv(1 << 20)
+                if not data:
+                    break
+                file.write(data)
+        return channel.recv_exit_status()
+    finally:
+        channel.close()
+
+def zstd_content_size(path:str) -> int:
+    res = subprocess.run(f"zstd -dc {shlex.quote(path)} | wc -c", shell=True, stdout=subprocess.PIPE, text=True, check=True)
+    return int(res.stdout.strip())
+
+class Artifact:
+    """File that an iteration left on a testbed host and that is pulled into `local_folder`."""
+    def __init__(self, remote_path:str, local_folder:str, compress:bool = False):
+        self.remote_path = remote_path
+        self.local_folder = local_folder
+        self.compress = compress
+
+class ResultCollector:
+    """
+    Pulls iteration results in the background while the next iteration is already running.
+
+    The artifacts of an iteration are first moved into a staging directory on their host with a single
+    command, so that the next iteration can reuse the file names right away. A pool of transfer workers then
+    pulls, verifies, and removes them. Transfers to the same host are serialized, the queue is bounded so
+    that a slow management network throttles the experiment instead of piling up work.
+
+    With `remote_compression_level`, artifacts that are to be compressed are compressed with zstd at low
+    priority on their host and streamed into the local file instead of being compressed after the transfer.
+    The spans that `tracer` records for a transfer belong to the iteration (group) of the artifact.
+    """
+    def __init__(self, staging_path:str, logger:logging.Logger, workers:int = 4, max_pending:int = 64,
+                 compression:Union[CompressionPool, None] = None, remote_compression_level:Union[int, None] = None, retries:int = 1,
+                 tracer:Union[Tracer, None] = None):
+        self._staging_path = staging_path
+        self._tracer = tracer
+        self._logger = logger
+        self._compression = compression
+        self._remote_compression_level = remote_compression_level
+        self._retries = retries
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._counter = itertools.count()
+        self._host_locks:Dict[str, threading.Lock] = {}
+        self._host_locks_lock = threading.Lock()
+        self._failures:List[str] = []
+        # iteration: pending transfers, failures, and the callback once its last transfer is done
+        self._groups:Dict[int, dict] = {}
+        self._groups_lock = threading.Lock()
+        self._group:Union[int, None] = None
+        self._workers = [threading.Thread(target=self._work, name=f"ResultCollector-{index}", daemon=True) for index in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def _host_lock(self, device) -> threading.Lock:
+        with self._host_locks_lock:
+            return self._host_locks.setdefault(device.management_ip, threading.Lock())
+
+    def staging_dir(self) -> str:
+        return os.path.join(self._staging_path, f"{os.getpid()}_{next(self._counter):06}")
+
+    def stage(self, device, artifacts:List[Artifact]):
+        """Moves the artifacts out of the way on their host and queues their transfer."""
+        if not artifacts:
+            return
+        staging_dir = self.staging_dir()
+        # the files may belong to root if they were written by sudo processes
+        res = device.get_connection().run(f"mkdir -p {staging_dir} && sudo mv -f {' '.join(artifact.remote_path for artifact in artifacts)} {staging_dir}/", hide=True, warn=True)
+        for artifact in artifacts:
+            self.collect(device, os.path.join(staging_dir, os.path.basename(artifact.remote_path)), artifact)
+        if res.failed:
+            raise Exception(f"Could not stage artifacts on {device.management_ip}: {res.stderr}")
+
+    def collect(self, device, staged_path:str, artifact:Artifact):
+        group = self._group
+        if group is not None:
+            with self._groups_lock:
+                self._groups[group]["pending"] += 1
+        # blocks while the queue is full
+        self._queue.put((device, staged_path, artifact, group))
+
+    def begin(self, group:int):
+        """Attributes all following transfers to `group` until the next call."""
+        with self._groups_lock:
+            self._groups[group] = {"pending": 0, "failures": [], "callback": None}
+        self._group = group
+
+    def end(self, group:int, callback:Callable[[List[str]], None]):
+        """Calls `callback` with the failures of the group once all of its transfers are done."""
+        if self._group == group:
+            self._group = None
+        with self._groups_lock:
+            self._groups[group]["callback"] = callback
+        self._finish(group)
+
+    def _finish(self, group:int):
+        with self._groups_lock:
+            entry = self._groups[group]
+            if entry["pending"] > 0 or entry["callback"] is None:
+                return
+            del self._groups[group]
+        try:
+            entry["callback"](entry["failures"])
+        except Exception as e:
+            print(f"Callback of {group} failed: {e}")
+            self._logger.error(f"Callback of {group} failed: {e}")
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            device, staged_path, artifact, group = job
+            try:
+                with self._tracer.attribute(group) if self._tracer is not None else nullcontext():
+                    local_path = None
+                    if artifact.compress and self._remote_compression_level is not None:
+                        local_path = self._transfer_compressed(device, staged_path, artifact)
+                    if local_path is None:
+                        local_path = self._transfer(device, staged_path, artifact)
+                        if artifact.compress and self._compression is not None:
+                            self._compression.submit(local_path)
+            except Exception as e:
+                message = f"Could not collect {staged_path} from {device.management_ip} into {artifact.local_folder}: {e}"
+                print(message)
+                self._logger.error(message)
+                self._failures.append(message)
+                if group is not None:
+                    with self._groups_lock:
+                        self._groups[group]["failures"].append(message)
+            finally:
+                if group is not None:
+                    with self._groups_lock:
+                        self._groups[group]["pending"] -= 1
+                    self._finish(group)
+                self._queue.task_done()
+
+    def _transfer(self, device, staged_path:str, artifact:Artifact) -> str:
+        local_path = os.path.join(artifact.local_folder, os.path.basename(staged_path))
+        with self._host_lock(device):
+            connection = device.get_connection()
+            remote_size = int(connection.run(f"stat -c %s {staged_path}", hide=True).stdout.strip())
+            for attempt in range(self._retries + 1):
+                connection.get(remote=staged_path, local=local_path)
+                if os.path.getsize(local_path) == remote_size:
+                    break
+                print(f"Size mismatch for {staged_path} ({os.path.getsize(local_path)} instead of {remote_size} bytes), attempt {attempt + 1}")
+            else:
+                raise Exception(f"Size mismatch after {self._retries + 1} attempts")
+            connection.run(f"sudo rm -f {staged_path} && rmdir --ignore-fail-on-non-empty {os.path.dirname(staged_path)}", hide=True, warn=True)
+        return local_path
+
+    def _transfer_compressed(self, device, staged_path:str, artifact:Artifact) -> Union[str, None]:
+        """Returns None if the host cannot compress so that the file is transferred as is."""
+        local_path = os.path.join(artifact.local_folder, os.path.basename(staged_path) + ".zst")
+        level = self._remote_compression_level
+        with self._host_lock(device):
+            connection = device.get_connection()
+            remote_size = int(connection.run(f"stat -c %s {staged_path}", hide=True).stdout.strip())
+            for attempt in range(self._retries + 1):
+                start = perf_counter()
+                # single-threaded and idle priority to not disturb the running iteration
+                status = stream_command(connection, f"nice -n 19 ionice -c3 zstd -q -c -T1 -{level} {staged_path}", local_path)
+                seconds = perf_counter() - start
+                if status == 127:
+                    print(f"zstd is not available on {device.management_ip}, transfer {staged_path} uncompressed.")
+                    os.remove(local_path)
+                    return None
+                if status == 0 and zstd_content_size(local_path) == remote_size:
+                    break
+                print(f"Compressed transfer of {staged_path} failed (exit status {status}), attempt {attempt + 1}")
+            else:
+                raise Exception(f"Compressed transfer failed after {self._retries + 1} attempts")
+            connection.run(f"sudo rm -f {staged_path} && rmdir --ignore-fail-on-non-empty {os.path.dirname(staged_path)}", hide=True, warn=True)
+        if self._compression is not None:
+            self._compression.record(os.path.join(artifact.local_folder, os.path.basename(staged_path)), "zstd-remote", level, remote_size, os.path.getsize(local_path), seconds, "ok")
+        return local_path
+
+    def drain(self) -> List[str]:
+        """Waits until all queued transfers are done and returns the failures since the last drain."""
+        self._queue.join()
+        failures, self._failures = self._failures, []
+        return failures
+
+    def close(self) -> List[str]:
+        failures = self.drain()
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        return failures
@@ -0,0 +1,95 @@
+from typing import Callable, Iterable, List
+import multiprocessing
+import queue
+
+# setup and teardown of an iteration (ssh, tc, classifier, file collection), measured on our testbed
+ITERATION_OVERHEAD_S = 30
+# rounds until the flows reach the bottleneck rate
+RAMP_UP_RTTS = 20
+
+def background_bw(experiment_configuration:dict) -> float:
+    background = experiment_configuration["BACKGROUND"]
+    return sum(sum(flow["BW"] for flow in background[f"{server}_FLOWS"]) for server in ["SERVER_1", "SERVER_2"] if background[server])
+
+def estimate_transfer_s(experiment_configuration:dict) -> float:
+    """Time until the last download finished, bounded by the watchdog."""
+    # unresponsive background flows may take the whole bottleneck
+    bw = max(experiment_configuration["BW"] - background_bw(experiment_configuration), 0.1 * experiment_configuration["BW"])
+
+    clients = experiment_configuration["CLIENT_CONFIGS"]
+    transfer_s = 0.0
+    if clients:
+        # the downloads share the bottleneck, but a late one may still finish last
+        transfer_s = max(sum(client["FILESIZE"] for client in clients) * 8 / bw,
+                         max(client["START_DELAY"] / 1000 + client["FILESIZE"] * 8 / bw for client in clients))
+        transfer_s += RAMP_UP_RTTS * experiment_configuration["RTT"] / 1000
+    watchdog = experiment_configuration["WATCHDOG_TIMEOUT"] if "WATCHDOG_TIMEOUT" in experiment_configuration.keys() else 900
+    return min(transfer_s, watchdog)
+
+def estimate_iteration_s(experiment_configuration:dict, overhead_s:float = ITERATION_OVERHEAD_S) -> float:
+    return estimate_transfer_s(experiment_configuration) + overhead_s
+
+def estimate_experiment_s(experiment_configuration:dict, iterations:int, overhead_s:float = ITERATION_OVERHEAD_S) -> float:
+    return iterations * estimate_iteration_s(experiment_configuration, overhead_s)
+
+class TestbedScheduler:
+    """
+    Runs the experiments on several testbeds at once, one worker process per testbed.
+
+    The experiments are handed out longest first from a shared queue to whichever testbed becomes free, so
+    the testbeds finish at about the same time even if the estimates are off. Each worker runs in its own
+    process since the watchdog of ExperimentConfiguration relies on signals of the main thread.
+    """
+    def __init__(self, testbeds:List[dict], run_testbed:Callable[[dict, Iterable[dict], Callable], None], iterations:int):
+        self._testbeds = testbeds
+        self._run_testbed = run_testbed
+        self._iterations = iterations
+        # the closures of the experiment script cannot be pickled
+        self._context = multiprocessing.get_context("fork")
+
+    @staticmethod
+    def name(testbed:dict) -> str:
+        return testbed["NAME"] if "NAME" in testbed.keys() else testbed["DEVICE_IP"]["BOTTLE"]
+
+    def _work(self, testbed:dict, pending, done):
+        def report(experiment_configuration:dict, seconds:float):
+            done.put((self.name(testbed), estimate_experiment_s(experiment_configuration, self._iterations), seconds))
+        self._run_testbed(testbed, iter(pending.get, None), report)
+
+    def run(self, experiments:List[dict], progress:Callable = lambda iterable: iterable):
+        order = sorted(experiments, key=lambda experiment: estimate_experiment_s(experiment, self._iterations), reverse=True)
+        estimated = sum(estimate_experiment_s(experiment, self._iterations) for experiment in order)
+        print(f"Schedule {len(order)} experiments on {len(self._testbeds)} testbeds, estimated {estimated / 3600:.1f}h of work, about {estimated / 3600 / len(self._testbeds):.1f}h per testbed.")
+
+        pending = self._context.Queue()
+        done = self._context.Queue()
+        for experiment in order:
+            pending.put(experiment)
+        for _ in self._testbeds:
+            pending.put(None)
+
+        workers = [self._context.Process(target=self._work, args=(testbed, pending, done), name=f"Testbed-{self.name(testbed)}") for testbed in self._testbeds]
+        for worker in workers:
+            worker.start()
+
+        finished = 0
+        for _ in progress(range(len(order))):
+            result = None
+            while result is None:
+                try:
+                    result = done.get(timeout=5)
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        break
+            if result is None:
+                break
+            testbed, estimate, seconds = result
+            finished += 1
+            print(f"Testbed {testbed} finished an experiment after {seconds:.0f}s (estimated {estimate:.0f}s).")
+
+        for worker in workers:
+            worker.join()
+            if worker.exitcode != 0:
+                print(f"{worker.name} exited with code {worker.exitcode}.")
+        if finished < len(order):
+            print(f"Only {finished} of {len(order)} experiments were run.")
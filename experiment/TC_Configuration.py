@@ -1,5 +1,44 @@
 from typing import List, Tuple
 from . TrafficClasses import *
+import re
+
+TC_BATCH_FAILURE = re.compile(r"Command failed \S+:(\d+)")
+
+class TC_Batch:
+    """tc -batch script whose lines can be mapped back to the commands they were generated from."""
+    def __init__(self) -> None:
+        self._lines:List[Tuple[str, str, bool]] = []
+
+    def add(self, section:str, cmds:List[str], tolerant:bool = False):
+        # failures of tolerant commands (e.g., deleting a qdisc that does not exist) are expected
+        for cmd in cmds:
+            self._lines.append((section, cmd, tolerant))
+
+    @property
+    def commands(self) -> List[str]:
+        return [cmd for _, cmd, _ in self._lines]
+
+    def section_commands(self, section:str) -> List[str]:
+        return [cmd for cmd_section, cmd, _ in self._lines if cmd_section == section]
+
+    def script(self) -> str:
+        # tc -batch expects the arguments without the leading "sudo tc"
+        return "".join(cmd.removeprefix("sudo ").removeprefix("tc ") + "\n" for cmd in self.commands)
+
+    def failures(self, stderr:str) -> List[Tuple[str, str, bool, str]]:
+        """Maps the errors reported by tc -force -batch to (section, command, tolerant, error message)."""
+        result:List[Tuple[str, str, bool, str]] = []
+        message:List[str] = []
+        for line in stderr.splitlines():
+            match = TC_BATCH_FAILURE.search(line)
+            if match is None:
+                if line.strip():
+                    message.append(line.strip())
+                continue
+            section, cmd, tolerant = self._lines[int(match.group(1)) - 1]
+            result.append((section, cmd, tolerant, " ".join(message)))
+            message = []
+        return result
 
 class TC_Configuration:
     def __init__(self, ingress_device: str, egress_device: str, client_device: str, trafficClasses:List[TrafficClass], defaultTrafficClass:TrafficClass, first_ifb, second_ifb) -> None:
@@ -86,3 +125,47 @@ class TC_Configuration:
         cmds.extend(cmds_egress)
         return cmds, (cmds_clear, cmds_general, cmds_ingress, cmds_egress, cmds_delay_config)
 
+
+    def get_clear_batch(self) -> TC_Batch:
+        batch = TC_Batch()
+        batch.add("clear", self._get_config_clear(), tolerant=True)
+        return batch
+
+    def get_config_batch(self, rtt, bottleneck_bw) -> TC_Batch:
+        """Clear and configure the bottleneck with a single tc invocation."""
+        batch = self.get_clear_batch()
+        batch.add("general", self._get_general_config(), tolerant=True)
+        batch.add("egress", self._get_egress_config())
+        batch.add("ingress", self._get_ingress_config())
+        batch.add("ifb", self._get_delay_config(rtt=rtt, bottleneck_bw=bottleneck_bw))
+        return batch
+
+    def get_tree(self, rtt, bottleneck_bw) -> dict:
+        """Model of the qdisc tree that get_config_batch sets up."""
+        return {"devices": [self._ingress_device, self._egress_device, self._client_device, self._first_ifb, self._second_ifb],
+                "default": str(self._defaultTrafficClass),
+                "delay": self._get_delay_config(rtt=rtt, bottleneck_bw=bottleneck_bw),
+                "classes": {str(trafficClass.classid): {"htb": trafficClass.get_htb_config_commands(), 
+                                                        "qdisc": trafficClass.get_qdisc_config_commands()} for trafficClass in self._traffic_classes}}
+
+    def get_update_batch(self, applied_tree, rtt, bottleneck_bw) -> Tuple[TC_Batch, bool]:
+        """
+        Returns the batch that turns the applied tree into the requested one and whether it rebuilds everything.
+
+        As long as the devices and the set of classes stay the same, changed HTB classes are updated in place and the
+        leaf qdiscs are re-created, which also resets their state and counters between iterations.
+        """
+        tree = self.get_tree(rtt=rtt, bottleneck_bw=bottleneck_bw)
+        if applied_tree is None or applied_tree["devices"] != tree["devices"] or applied_tree["default"] != tree["default"] or applied_tree["classes"].keys() != tree["classes"].keys():
+            return self.get_config_batch(rtt=rtt, bottleneck_bw=bottleneck_bw), True
+
+        batch = TC_Batch()
+        for classid, trafficClass in tree["classes"].items():
+            if trafficClass["htb"] != applied_tree["classes"][classid]["htb"]:
+                batch.add("egress", [f"sudo tc class change dev {self._egress_device} " + trafficClass["htb"]])
+        for classid, trafficClass in tree["classes"].items():
+            batch.add("egress", [f"sudo tc qdisc delete dev {self._egress_device} parent {HTB_ROOT_HANDLE}:{classid}"], tolerant=True)
+            batch.add("egress", [f"sudo tc qdisc add dev {self._egress_device} " + trafficClass["qdisc"]])
+        batch.add("ifb", [f"sudo tc qdisc delete dev {self._first_ifb} root", f"sudo tc qdisc delete dev {self._second_ifb} root"], tolerant=True)
+        batch.add("ifb", tree["delay"])
+        return batch, False
@@ -0,0 +1,96 @@
+from .ClassifierLog import FORMATS, HEADER, LENGTH, _dictionary, convert_all, open_log, output_path, write_table
+
+from typing import List
+import argparse
+import ipaddress
+import mmap
+import os
+import sys
+
+import numpy as np
+import pyarrow as pa
+
+# layout of the binary log of tcp_probe_bpf.py (--binary), it writes it with the same constants:
+# a header (magic, format version, record size), then per record its length and the raw `Data` of tcp_probe_bpf.py
+MAGIC = b"CRQTCPP\x00"
+VERSION = 1
+RECORD_SIZE = 176
+# `Data` of tcp_probe_bpf.py behind the length prefix, with the names it uses. addresses and ports are in network order
+RECORD_DTYPE = np.dtype({"names": ["length_prefix", "ts", "src_port", "src_addr", "dst_port", "dst_addr", "length", "ack_seq", "seq", "snd_nxt", "rcv_nxt",
+                                   "snd_una", "snd_wnd", "rcv_wnd", "snd_cwnd", "ssthresh", "srtt", "lost_out", "sacked_out", "retrans_out", "segs_out",
+                                   "segs_in", "total_retrans", "bytes_received", "bytes_acked", "rate", "intervalus", "skbuf_pacingrate"],
+                         "formats": ["<u4", "<u8", ">u2", ">u4", ">u2", ">u4", "<u2"] + ["<u4"] * 16 + ["<u8"] * 5,
+                         "offsets": [0, 4, 14, 16, 42, 44, 68] + list(range(72, 136, 4)) + list(range(140, 180, 8)),
+                         "itemsize": LENGTH.size + RECORD_SIZE})
+# the columns of the text output and their fields, in its order
+COLUMNS = [("length", "length"), ("seq", "seq"), ("ack_seq", "ack_seq"), ("snd_nxt", "snd_nxt"), ("rcv_nxt", "rcv_nxt"), ("snd_una", "snd_una"),
+           ("snd_wnd", "snd_wnd"), ("rcv_wnd", "rcv_wnd"), ("snd_cwnd", "snd_cwnd"), ("ssthresh", "ssthresh"), ("srtt", "srtt"), ("lost_out", "lost_out"),
+           ("sacked_out", "sacked_out"), ("retrans_out", "retrans_out"), ("segs_out", "segs_out"), ("segs_in", "segs_in"), ("total_retrans", "total_retrans"),
+           ("bytes_received", "bytes_received"), ("byted_acked", "bytes_acked"), ("rate", "rate"), ("intervalus", "intervalus"), ("skbuf_pacingrate", "skbuf_pacingrate")]
+LOG_SUFFIXES = ["_TCPlog_client.bin", "_TCPlog_server.bin", "_TCPlog_client.bin.zst", "_TCPlog_server.bin.zst"]
+
+def map_records(path:str) -> np.ndarray:
+    """Maps the records of a binary probe log into a structured array (RECORD_DTYPE), without copying them unless the log is compressed."""
+    if path.endswith(".zst"):
+        with open_log(path) as file:
+            data = file.read()
+    else:
+        with open(path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) > 0 else b""
+    header = bytes(data[:HEADER.size])
+    if len(header) < HEADER.size or HEADER.unpack(header)[0] != MAGIC:
+        raise ValueError(f"{path} is not a binary TCP probe log")
+    _, version, record_size = HEADER.unpack(header)
+    if version != VERSION or record_size != RECORD_SIZE:
+        raise ValueError(f"{path} has version {version} with {record_size} byte records, this converter reads version {VERSION} with {RECORD_SIZE} byte records")
+    # a record that was cut off when the probe was stopped is left out
+    records = np.frombuffer(data, dtype=RECORD_DTYPE, count=(len(data) - HEADER.size) // RECORD_DTYPE.itemsize, offset=HEADER.size)
+    if np.any(records["length_prefix"] != RECORD_SIZE):
+        raise ValueError(f"{path} contains records that are not {RECORD_SIZE} bytes long")
+    return records
+
+def _endpoints(addresses:np.ndarray, ports:np.ndarray) -> pa.DictionaryArray:
+    """`ip:port` as in the text output, dictionary encoded."""
+    endpoints = (addresses.astype(np.uint64) << np.uint64(16)) | ports.astype(np.uint64)
+    return _dictionary(endpoints, lambda endpoint: f"{ipaddress.IPv4Address(int(endpoint) >> 16)}:{int(endpoint) & 0xFFFF}")
+
+def to_table(records:np.ndarray) -> pa.Table:
+    """The columns of the text output of tcp_probe_bpf.py with numeric types."""
+    columns = {"TIME(s)": pa.array(records["ts"] / 1e9),
+               "src": _endpoints(records["src_addr"], records["src_port"]),
+               "dst": _endpoints(records["dst_addr"], records["dst_port"])}
+    for column, field in COLUMNS:
+        columns[column] = pa.array(np.ascontiguousarray(records[field]))
+    return pa.table(columns)
+
+def convert(path:str, output_format:str = "parquet") -> str:
+    """Converts a binary probe log next to it, e.g., 1_TCPlog_client.bin -> 1_TCPlog_client.parquet."""
+    converted = output_path(path, output_format)
+    table = to_table(map_records(path))
+    if output_format == "csv":
+        table.to_pandas().to_csv(converted, index=False)
+    else:
+        write_table(table, converted, output_format)
+    return converted
+
+def find_logs(paths:List[str]) -> List[str]:
+    """The given logs and the binary probe logs in the given folders and below."""
+    logs = []
+    for path in paths:
+        if not os.path.isdir(path):
+            logs.append(path)
+            continue
+        for folder, _, files in os.walk(path):
+            logs += [os.path.join(folder, name) for name in sorted(files) if any(name.endswith(suffix) for suffix in LOG_SUFFIXES)]
+    return logs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts binary TCP probe logs (<client>_TCPlog_client.bin, <client>_TCPlog_server.bin) into CSV, Parquet, or Arrow files next to them")
+    parser.add_argument("paths", nargs="+", help="Binary logs, optionally compressed with zstd, or result folders to search for them")
+    parser.add_argument("--format", "-f", help="Output format", choices=list(FORMATS.keys()), default="csv")
+    parser.add_argument("--workers", "-w", help="Parallel conversions (default: one per core)", type=int, default=None)
+    args = parser.parse_args()
+    failed = convert_all(find_logs(args.paths), args.format, args.workers, converter=convert)
+    for log, error in failed:
+        print(f"Could not convert {log}: {error}")
+    sys.exit(1 if failed else 0)
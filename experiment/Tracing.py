@@ -0,0 +1,127 @@
+from contextlib import contextmanager
+from time import time_ns
+from typing import Dict, List, Tuple, Union
+import csv
+import json
+import os
+import threading
+
+SUMMARY_HEADER = ["Category", "Name", "Count", "Total s", "Mean s", "Max s"]
+
+def program(command:str) -> str:
+    """Name of the program a shell command runs, used to aggregate commands in the summary."""
+    for token in command.split():
+        if token not in ["sudo", "nice", "ionice", "-c3", "-n", "19"] and "=" not in token:
+            return os.path.basename(token)
+    return command
+
+class Tracer:
+    """
+    Records timed spans of the orchestration and writes them as Chrome trace files (chrome://tracing, Perfetto).
+
+    Spans of the same thread nest by time. Every span belongs to the iteration that was current when it was
+    recorded, worker threads that finish the work of an earlier iteration (e.g., result transfers) set it with
+    `attribute`. The trace events are written and cleared per iteration, the aggregated time per span name is
+    kept for the summary of the whole experiment.
+    """
+    def __init__(self, enabled:bool = True):
+        self.enabled = enabled
+        # iteration of the orchestration, None before the first and after the last iteration
+        self.iteration:Union[int, None] = None
+        self._attributed = threading.local()
+        self._events:Dict[Union[int, None], List[dict]] = {}
+        self._totals:Dict[Tuple[str, str], List[float]] = {}
+        self._lock = threading.Lock()
+        self._phase:Union[Tuple[str, int], None] = None
+        # the trace format wants numeric thread ids, their names are added as metadata
+        self._tids:Dict[str, int] = {}
+
+    def record(self, name:str, category:str, start_ns:int, end_ns:int, summary_name:str = None, lane:str = None, **args):
+        """Adds a finished span, `lane` groups spans that do not belong to the calling thread (e.g., remote processes)."""
+        if not self.enabled:
+            return
+        lane = lane if lane else threading.current_thread().name
+        seconds = (end_ns - start_ns) / pow(10, 9)
+        iteration = self._attributed.iteration if hasattr(self._attributed, "iteration") else self.iteration
+        with self._lock:
+            tid = self._tids.setdefault(lane, len(self._tids))
+            self._events.setdefault(iteration, []).append({"name": name, "cat": category, "ph": "X", "ts": start_ns / 1000, "dur": (end_ns - start_ns) / 1000,
+                                 "pid": os.getpid(), "tid": tid, "args": args})
+            total = self._totals.setdefault((category, summary_name if summary_name else name), [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += seconds
+            total[2] = max(total[2], seconds)
+
+    @contextmanager
+    def attribute(self, iteration:Union[int, None]):
+        """Attributes the spans the calling thread records meanwhile to `iteration`."""
+        self._attributed.iteration = iteration
+        try:
+            yield
+        finally:
+            del self._attributed.iteration
+
+    @contextmanager
+    def span(self, name:str, category:str = "phase", **args):
+        start_ns = time_ns()
+        try:
+            yield
+        finally:
+            self.record(name, category, start_ns, time_ns(), **args)
+
+    def phase(self, name:str):
+        """Ends the current phase of the orchestration and starts the next one."""
+        self.end_phase()
+        self._phase = (name, time_ns())
+
+    def end_phase(self):
+        if self._phase is not None:
+            name, start_ns = self._phase
+            self._phase = None
+            self.record(name, "phase", start_ns, time_ns())
+
+    def write_trace(self, path:str, iteration:Union[int, None] = None):
+        """Writes and clears the spans of `iteration`, without one all spans that were not written yet."""
+        with self._lock:
+            if iteration is None:
+                events = [event for spans in self._events.values() for event in spans]
+                self._events = {}
+            else:
+                events = self._events.pop(iteration, [])
+            events += [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": lane}} for lane, tid in self._tids.items()]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def write_summary(self, path:str):
+        with self._lock:
+            totals = sorted(self._totals.items(), key=lambda item: item[1][1], reverse=True)
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(SUMMARY_HEADER)
+            for (category, name), (count, seconds, maximum) in totals:
+                writer.writerow([category, name, count, f"{seconds:.3f}", f"{seconds / count:.3f}", f"{maximum:.3f}"])
+
+class TracedConnection:
+    """Connection proxy that records a span for every blocking command and file transfer."""
+    def __init__(self, connection, tracer:Tracer, host:str):
+        self._connection = connection
+        self._tracer = tracer
+        self._host = host
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def run(self, command, **kwargs):
+        # asynchronous processes are traced by the OrchestrationEngine once they finished
+        if kwargs.get("asynchronous"):
+            return self._connection.run(command, **kwargs)
+        with self._tracer.span(command[:80], "command", summary_name=f"{self._host}: {program(command)}", host=self._host, command=command):
+            return self._connection.run(command, **kwargs)
+
+    def get(self, remote, local=None, **kwargs):
+        with self._tracer.span(f"get {os.path.basename(remote)}", "transfer", summary_name=f"{self._host}: get", host=self._host, remote=remote):
+            return self._connection.get(remote, local, **kwargs)
+
+    def put(self, local, remote=None, **kwargs):
+        with self._tracer.span(f"put {os.path.basename(str(local))}", "transfer", summary_name=f"{self._host}: put", host=self._host, remote=remote):
+            return self._connection.put(local, remote, **kwargs)
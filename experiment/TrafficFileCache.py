@@ -0,0 +1,115 @@
+from typing import Dict, List, Union
+import io
+import json
+import os
+import shlex
+import time
+
+MANIFEST_NAME = ".traffic-files-manifest.json"
+MANIFEST_SEPARATOR = "---CRQ-FILES---"
+
+def file_name(filesize:int) -> str:
+    # the stacks request the download files by this name
+    return f"{filesize}MB"
+
+def file_bytes(filesize:int) -> int:
+    # head -c <N>M creates files of N MiB
+    return filesize * 1024 * 1024
+
+class TrafficFileCache:
+    """
+    Persistent cache of the download files on the load servers, keyed by file size.
+
+    A manifest next to the files keeps track of their size, checksum, and last use so that
+    files are only created when they are missing or broken and the least recently used
+    files are evicted once the cache exceeds its disk budget.
+    """
+    def __init__(self, traffic_files_path:str, budget_mb:Union[int, None] = None, verify_checksum:bool = False):
+        self._path = traffic_files_path
+        self._budget_mb = budget_mb
+        self._verify_checksum = verify_checksum
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self._path, MANIFEST_NAME)
+
+    def _read_state(self, server):
+        """Returns the manifest and the sizes of all files currently present on the server with a single command."""
+        res = server.get_connection().run(f"mkdir -p {self._path} && (cat {self._manifest_path()} 2>/dev/null; echo {MANIFEST_SEPARATOR}; find {self._path} -maxdepth 1 -type f -name '*MB' -printf '%f %s\\n')", hide=True, warn=True)
+        manifest_text, _, listing = res.stdout.partition(MANIFEST_SEPARATOR)
+        try:
+            manifest:Dict[str, dict] = json.loads(manifest_text)["files"]
+        except (ValueError, KeyError):
+            manifest = {}
+        present:Dict[str, int] = {}
+        for line in listing.splitlines():
+            if line.strip():
+                name, size = line.split()
+                present[name] = int(size)
+        return manifest, present
+
+    def _checksums(self, server, names:List[str]) -> Dict[str, str]:
+        if not names:
+            return {}
+        res = server.get_connection().run(f"cd {self._path} && sha256sum {' '.join(names)}", hide=True, warn=True)
+        checksums = {}
+        for line in res.stdout.splitlines():
+            checksum, name = line.split()
+            checksums[name] = checksum
+        return checksums
+
+    def plan(self, server, filesizes:List[int]) -> List[int]:
+        """Evicts stale files from the server and returns the file sizes that still need to be created."""
+        manifest, present = self._read_state(server)
+        required = {file_name(filesize): filesize for filesize in filesizes}
+
+        valid:Dict[str, int] = {}
+        for name, size in present.items():
+            entry = manifest.get(name, {})
+            expected = entry.get("bytes", file_bytes(int(name[:-2])) if name[:-2].isdigit() else None)
+            if size == expected:
+                valid[name] = size
+        if self._verify_checksum:
+            checksums = self._checksums(server, [name for name in required if name in valid and "sha256" in manifest.get(name, {})])
+            for name, checksum in checksums.items():
+                if checksum != manifest[name]["sha256"]:
+                    print(f"Checksum mismatch for {name} on server {server.local_ip}.")
+                    del valid[name]
+
+        missing = [filesize for name, filesize in required.items() if name not in valid]
+
+        evict:List[str] = [name for name in present if name not in valid and name not in required]
+        if self._budget_mb is not None:
+            used_mb = sum(valid[name] for name in valid) / (1024 * 1024) + sum(missing)
+            candidates = sorted([name for name in valid if name not in required], key=lambda name: manifest.get(name, {}).get("last_used", 0))
+            while used_mb > self._budget_mb and candidates:
+                name = candidates.pop(0)
+                evict.append(name)
+                used_mb -= valid[name] / (1024 * 1024)
+            if used_mb > self._budget_mb:
+                print(f"Traffic files on server {server.local_ip} exceed the budget of {self._budget_mb}MB: {used_mb:.0f}MB required.")
+        if evict:
+            print(f"Evict traffic files on server {server.local_ip}: {evict}")
+        # leftovers of interrupted creations are removed as well
+        server.get_connection().run(f"cd {self._path} && rm -f *.partial {' '.join(evict)}", hide=True, warn=True)
+
+        print(f"Traffic files on server {server.local_ip}: {len(required) - len(missing)} cached, {len(missing)} to create.")
+        return missing
+
+    def creation_command(self, filesize:int) -> str:
+        # write to a temporary name first so that interrupted creations never look like cached files,
+        # pipefail keeps a file that head or tee could not write completely (e.g., a full disk) from being renamed
+        target = os.path.join(self._path, file_name(filesize))
+        return "bash -o pipefail -c " + shlex.quote(f"head -c {filesize}M </dev/urandom | tee {target}.partial | sha256sum | cut -d ' ' -f 1 && mv {target}.partial {target}")
+
+    def commit(self, server, filesizes:List[int], checksums:Dict[int, str]):
+        """Records the files used by the current experiment in the server's manifest."""
+        manifest, present = self._read_state(server)
+        manifest = {name: entry for name, entry in manifest.items() if name in present}
+        now = time.time()
+        for filesize in filesizes:
+            entry = manifest.get(file_name(filesize), {"size_mb": filesize, "bytes": file_bytes(filesize)})
+            if filesize in checksums:
+                entry["sha256"] = checksums[filesize]
+            entry["last_used"] = now
+            manifest[file_name(filesize)] = entry
+        server.get_connection().run(f"cat > {self._manifest_path()}", in_stream=io.StringIO(json.dumps({"files": manifest}, indent=4)), hide=True)
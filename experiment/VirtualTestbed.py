@@ -0,0 +1,109 @@
+from .namespaceConnector import NamespaceConnector
+from typing import Dict
+import json
+import os
+import subprocess
+
+HOSTS = ["CLIENT", "BOTTLE", "LOAD1", "LOAD2"]
+
+class VirtualTestbed(object):
+    """
+    Emulates the four-machine testbed with Linux network namespaces on a single machine:
+
+                                ---  LOAD1
+                               |
+    CLIENT  ---  BOTTLENECK  --(switch)
+                               |
+                                ---  LOAD2
+
+    The bottleneck uses the interface and ifb names of the TESTBED configuration so that
+    TC_Configuration and the classifier can be used unchanged.
+    """
+    def __init__(self, testbed_config:dict, working_dir:str = "/tmp/crq-testbed", prefix:str = "crq"):
+        self._local_ips:Dict[str, str] = testbed_config["LOCAL_IP"]
+        self._ingress_device:str = testbed_config["INGRESS_DEVICE"]
+        self._client_device:str = testbed_config["CLIENT_DEVICE"]
+        self._first_ifb:str = testbed_config["FIRST_IFB"]
+        self._second_ifb:str = testbed_config["SECOND_IFB"]
+        self._working_dir:str = working_dir
+        self._prefix:str = prefix
+        self.namespaces:Dict[str, str] = {host: f"{prefix}-{host.lower()}" for host in HOSTS}
+        self._switch:str = f"{prefix}-switch"
+        self._connectors:Dict[str, NamespaceConnector] = {}
+
+    @staticmethod
+    def _sh(command:str, check:bool = True):
+        return subprocess.run(command, shell=True, check=check, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    def _ns(self, host:str, command:str, check:bool = True):
+        return self._sh(f"sudo ip netns exec {self.namespaces[host]} {command}", check=check)
+
+    def _mac(self, host:str, device:str) -> str:
+        res = self._sh(f"sudo ip -n {self.namespaces[host]} -j link show dev {device}")
+        return json.loads(res.stdout)[0]["address"]
+
+    def setup(self):
+        self.teardown()
+        print(f"Set up virtual testbed with prefix {self._prefix}")
+        self._sh("sudo modprobe ifb numifbs=0")
+        for namespace in list(self.namespaces.values()) + [self._switch]:
+            self._sh(f"sudo ip netns add {namespace}")
+            self._sh(f"sudo ip -n {namespace} link set lo up")
+
+        # CLIENT <-> BOTTLENECK
+        self._sh(f"sudo ip link add {self._prefix}-c netns {self.namespaces['CLIENT']} type veth peer name {self._ingress_device} netns {self.namespaces['BOTTLE']}")
+        # BOTTLENECK, LOAD1 and LOAD2 are joined by a bridge that stands in for the switch
+        self._sh(f"sudo ip -n {self._switch} link add br0 type bridge")
+        self._sh(f"sudo ip link add {self._client_device} netns {self.namespaces['BOTTLE']} type veth peer name sw-bottle netns {self._switch}")
+        self._sh(f"sudo ip link add {self._prefix}-l1 netns {self.namespaces['LOAD1']} type veth peer name sw-load1 netns {self._switch}")
+        self._sh(f"sudo ip link add {self._prefix}-l2 netns {self.namespaces['LOAD2']} type veth peer name sw-load2 netns {self._switch}")
+        for port in ["sw-bottle", "sw-load1", "sw-load2"]:
+            self._sh(f"sudo ip -n {self._switch} link set {port} master br0 up")
+        self._sh(f"sudo ip -n {self._switch} link set br0 up")
+
+        host_devices = {"CLIENT": f"{self._prefix}-c", "LOAD1": f"{self._prefix}-l1", "LOAD2": f"{self._prefix}-l2"}
+        for host, device in host_devices.items():
+            self._sh(f"sudo ip -n {self.namespaces[host]} addr add {self._local_ips[host]}/24 dev {device}")
+            self._sh(f"sudo ip -n {self.namespaces[host]} link set {device} up")
+
+        for device in [self._ingress_device, self._client_device]:
+            self._sh(f"sudo ip -n {self.namespaces['BOTTLE']} link set {device} up")
+        self._sh(f"sudo ip -n {self.namespaces['BOTTLE']} addr add {self._local_ips['BOTTLE']}/32 dev {self._ingress_device}")
+        self._sh(f"sudo ip -n {self.namespaces['BOTTLE']} route add {self._local_ips['CLIENT']}/32 dev {self._ingress_device}")
+        self._sh(f"sudo ip -n {self.namespaces['BOTTLE']} route add {self._local_ips['LOAD1']}/32 dev {self._client_device}")
+        self._sh(f"sudo ip -n {self.namespaces['BOTTLE']} route add {self._local_ips['LOAD2']}/32 dev {self._client_device}")
+        self._ns("BOTTLE", "sysctl -q -w net.ipv4.ip_forward=1")
+        for setting in ["all", "default", self._ingress_device, self._client_device]:
+            self._ns("BOTTLE", f"sysctl -q -w net.ipv4.conf.{setting}.send_redirects=0")
+            self._ns("BOTTLE", f"sysctl -q -w net.ipv4.conf.{setting}.rp_filter=0")
+
+        # static neighbor entries as on the physical testbed, see README.md
+        bottle_to_client_mac = self._mac("BOTTLE", self._ingress_device)
+        bottle_to_loads_mac = self._mac("BOTTLE", self._client_device)
+        for load in ["LOAD1", "LOAD2"]:
+            self._sh(f"sudo ip -n {self.namespaces['CLIENT']} neigh replace {self._local_ips[load]} lladdr {bottle_to_client_mac} dev {host_devices['CLIENT']}")
+            self._sh(f"sudo ip -n {self.namespaces[load]} neigh replace {self._local_ips['CLIENT']} lladdr {bottle_to_loads_mac} dev {host_devices[load]}")
+            self._sh(f"sudo ip -n {self.namespaces['BOTTLE']} neigh replace {self._local_ips[load]} lladdr {self._mac(load, host_devices[load])} dev {self._client_device}")
+        self._sh(f"sudo ip -n {self.namespaces['BOTTLE']} neigh replace {self._local_ips['CLIENT']} lladdr {self._mac('CLIENT', host_devices['CLIENT'])} dev {self._ingress_device}")
+
+        for ifb in [self._first_ifb, self._second_ifb]:
+            self._sh(f"sudo ip -n {self.namespaces['BOTTLE']} link add {ifb} type ifb")
+            self._sh(f"sudo ip -n {self.namespaces['BOTTLE']} link set {ifb} up")
+
+        # segmentation offloads would hand multi-MTU packets to the qdiscs
+        for host, device in list(host_devices.items()) + [("BOTTLE", self._ingress_device), ("BOTTLE", self._client_device)]:
+            self._ns(host, f"ethtool -K {device} tso off gso off gro off", check=False)
+
+        for host in HOSTS:
+            os.makedirs(os.path.join(self._working_dir, self.namespaces[host], "sslkeys"), exist_ok=True)
+
+    def teardown(self):
+        for namespace in list(self.namespaces.values()) + [self._switch]:
+            self._sh(f"sudo ip netns del {namespace}", check=False)
+
+    def connector(self, host:str) -> NamespaceConnector:
+        if host not in self._connectors:
+            self._connectors[host] = NamespaceConnector(namespace=self.namespaces[host],
+                                                        local_ip=self._local_ips[host],
+                                                        working_dir=os.path.join(self._working_dir, self.namespaces[host]))
+        return self._connectors[host]
@@ -8,18 +8,15 @@
 #define QUIC_0RTT 0x01
 #define QUIC_HANDSHAKE 0x10
 #define QUIC_RETRY 0b00000110
-#define EDGE_THRESHOLD 1
-#define EDGE_THRESHOLD {edge_threshold}
-
-#define BOTH_UNCLASSIFIED {BOTH_UNCLASSIFIED_classid}
-#define BOTH_RESPONSIVE {BOTH_RESPONSIVE_classid}
-#define BOTH_UNRESPONSIVE {BOTH_UNRESPONSIVE_classid}
-#define ECN_RESP_LOSS_UNCLASS {ECN_RESP_LOSS_UNCLASS_classid}
-#define ECN_RESP_LOSS_UNRESP {ECN_RESP_LOSS_UNRESP_classid}
-#define ECN_UNRESP_LOSS_UNCLASS {ECN_UNRESP_LOSS_UNCLASS_classid}
-#define ECN_UNRESP_LOSS_RESP {ECN_UNRESP_LOSS_RESP_classid}
-#define ECN_UNCLASS_LOSS_UNRESP {ECN_UNCLASS_LOSS_UNRESP_classid}
-#define ECN_UNCLASS_LOSS_RESP {ECN_UNCLASS_LOSS_RESP_classid}
+
+#define MAX_CLASSES {MAX_CLASSES}
+#define EVENTS {EVENTS}
+#define RTT_BUCKETS 32
+// order of the events in ClassifierConfiguration.EVENTS
+#define RESPONSIVE_TO_ECN_EVENT 0
+#define UNRESPONSIVE_TO_ECN_EVENT 1
+#define RESPONSIVE_TO_LOSS_EVENT 2
+#define UNRESPONSIVE_TO_LOSS_EVENT 3
 
 #define INITIALBYTELENGTH 1
 #define VERSIONLENGTH 4
@@ -49,6 +46,10 @@ struct connectionInfo {{
         u32 responsive_count_drop;
         u32 unresponsive_count_drop;
         u32 expectedAck;
+        u32 suppressed;
+        u64 output_time;
+        u64 output_credit;
+        u64 output_rtt;
 }};
 
 struct output {{
@@ -69,6 +70,7 @@ struct output {{
         u32 responsive_count_drop;
         u32 unresponsive_count_drop;
         char protocol[5];
+        u32 suppressed;
 }};
 
 struct quichdrs {{
@@ -89,6 +91,28 @@ struct quichdrl {{
         bool headerForm : 1;
 }};
 
+struct classifierConfig {{
+        u32 edge_threshold;
+        u32 initial_class;
+        u32 default_class;
+        u32 transitions[MAX_CLASSES * EVENTS];
+        u32 queue_mapping[MAX_CLASSES];
+        u32 records;
+        u32 summaries;
+}};
+
+/* what the classifier knows about a flow at the end of its last cycle, times are bpf_ktime_get_ns */
+struct flowSummary {{
+        u64 first_seen;
+        u64 class_since;
+        u64 class_time[MAX_CLASSES];
+        u64 bytes;
+        u32 classID;
+        u32 reclassifications;
+        u32 cycles;
+        u32 rtt_log2_us[RTT_BUCKETS];
+}};
+
 struct seqAndAck {{
         u32 highestAck;
         u32 expectedAckOnAck;
@@ -101,13 +125,79 @@ BPF_TABLE_SHARED("hash", struct connectionID, u32, drop_results, 10240);
 BPF_TABLE_SHARED("hash", struct connectionID, u32, ecn, 10240);
 BPF_TABLE_SHARED("hash", struct connectionID, struct seqAndAck, highestAckMap, 10240);
 
-BPF_PERF_OUTPUT(cycleUpdates);
+/* records are consumed in batches by classifier.py, a record that does not fit into the ring buffer is counted in lost_events */
+BPF_RINGBUF_OUTPUT(cycleUpdates, {RINGBUF_PAGES});
+BPF_PERCPU_ARRAY(lost_events, u64, 1);
+
+/* per-flow summaries that classifier.py reads as snapshots, new entries are copied from the always empty emptySummary */
+BPF_HASH(flowSummaries, struct connectionID, struct flowSummary, 10240);
+BPF_ARRAY(emptySummary, struct flowSummary, 1);
+
+/* parameters that classifier.py updates while the program runs (Classifier_Configuration.get_runtime_config).
+the inactive one of the two slots is written and then made active with a single update of active_config,
+a packet reads the active slot once and uses it until it is classified */
+BPF_ARRAY(config, struct classifierConfig, 2);
+BPF_ARRAY(active_config, u32, 1);
+
+static struct classifierConfig* active_configuration() {{
+    u32 zero = 0;
+    u32* slot = active_config.lookup(&zero);
+    u32 index = (slot != NULL) ? *slot : 0;
+    return config.lookup(&index);
+}}
+
+static u16 transition(struct classifierConfig* cfg, struct connectionInfo* cin, u32 event) {{
+    u32 index = cin->classID * EVENTS + event;
+    if (index >= MAX_CLASSES * EVENTS || cfg->transitions[index] == cin->classID) {{
+        return 0;
+    }}
+    cin->classID = cfg->transitions[index];
+    return 1;
+}}
+
+static u32 map_class(struct classifierConfig* cfg, u32 classID) {{
+    return (classID < MAX_CLASSES) ? cfg->queue_mapping[classID] : classID;
+}}
 
-static int createNewCinEntry(u32 bytes, u32 expectedAck, struct connectionID cid, struct __sk_buff *skb) {{
+static void summarize(struct connectionID* cid, u32 old_class, u32 new_class, u32 bytes, u64 time, u64 rtt) {{
+    u32 zero = 0;
+    struct flowSummary* empty = emptySummary.lookup(&zero);
+    if (empty == NULL) {{
+        return;
+    }}
+    struct flowSummary* summary = flowSummaries.lookup_or_try_init(cid, empty);
+    if (summary == NULL) {{
+        return;
+    }}
+    if (summary->cycles == 0) {{
+        // the first cycle started with the flow
+        summary->first_seen = time - rtt;
+        summary->class_since = time - rtt;
+        summary->classID = old_class;
+    }}
+    if (new_class != summary->classID) {{
+        u32 previous = summary->classID;
+        if (previous < MAX_CLASSES) {{
+            summary->class_time[previous] += time - summary->class_since;
+        }}
+        summary->classID = new_class;
+        summary->class_since = time;
+        summary->reclassifications++;
+    }}
+    summary->bytes += bytes;
+    summary->cycles++;
+    u32 bucket = bpf_log2l(rtt / 1000);
+    if (bucket >= RTT_BUCKETS) {{
+        bucket = RTT_BUCKETS - 1;
+    }}
+    summary->rtt_log2_us[bucket]++;
+}}
+
+static int createNewCinEntry(u32 bytes, u32 expectedAck, struct connectionID cid, struct __sk_buff *skb, struct classifierConfig* cfg) {{
     struct connectionInfo cin = {{}};
     u64 time_now = bpf_ktime_get_ns();
     cin.timestamp = time_now;
-    cin.classID = 0;
+    cin.classID = cfg->initial_class;
     cin.rtt = 0;
     cin.bytes = bytes;
     cin.responsive_count_ECN = 0;
@@ -124,16 +214,14 @@ static int createNewCinEntry(u32 bytes, u32 expectedAck, struct connectionID cid
     drop_results.insert(&cid, &drop);
 
     // calc_class is used to label the flows based on their responsiveness
-    /* MAP_CLASSES is defined in ClassifierConfiguration.py. Effectively, it is a switch-case statement that uses the mapping given
-    as class_mapping in the start-script */ 
-    u32 calc_class = 9;
-    {MAP_CLASSES}
+    /* queue_mapping holds the mapping given as class_mapping in the start-script */ 
+    u32 calc_class = map_class(cfg, cfg->default_class);
     skb->tc_classid = calc_class;
     skb->tc_index = calc_class;
     return TC_ACT_OK;
 }}
 
-static void handleOutput(struct output *out, struct connectionInfo* cin, struct connectionID cid, u32 new_bytes, struct __sk_buff *skb){{
+static void handleOutput(struct output *out, struct connectionInfo* cin, struct connectionID cid, u32 new_bytes, struct __sk_buff *skb, struct classifierConfig* cfg){{
     u64 time = bpf_ktime_get_ns();
     u64 rtt = time - cin->timestamp;
     cin->timestamp=time;
@@ -142,9 +230,8 @@ static void handleOutput(struct output *out, struct connectionInfo* cin, struct
     u32* num_drops = drops.lookup(&cid);
     u16 new_class = 0;
 
-    u32 old_class_mapped;
-
-    {MAP_CLASSES_OLD_CLASS_ID}
+    u32 old_class = cin->classID;
+    u32 old_class_mapped = map_class(cfg, cin->classID);
 
     u32 new_class_mapped;
 
@@ -157,7 +244,7 @@ static void handleOutput(struct output *out, struct connectionInfo* cin, struct
     }} 
 
     if (new_class == 1){{
-        {MAP_CLASSES_NEW_CLASS_ID}
+        new_class_mapped = map_class(cfg, cin->classID);
 
         if (old_class_mapped != new_class_mapped) {{
             *ecn_markings = 0;
@@ -168,6 +255,10 @@ static void handleOutput(struct output *out, struct connectionInfo* cin, struct
         }}
     }}
 
+    if (cfg->summaries) {{
+        summarize(&cid, old_class, cin->classID, cin->bytes, time, rtt);
+    }}
+
     cin->bytes4 = cin->bytes3;
     cin->bytes3 = cin->bytes2;
     cin->bytes2 = cin->bytes;
@@ -200,10 +291,30 @@ static void handleOutput(struct output *out, struct connectionInfo* cin, struct
     out->unresponsive_count_ECN = cin->unresponsive_count_ECN;
     out->responsive_count_drop = cin->responsive_count_drop;
     out->unresponsive_count_drop = cin->unresponsive_count_drop;
-    cycleUpdates.perf_submit(skb, out, sizeof(struct output));
+    if (!cfg->records) {{
+        return;
+    }}
+
+    /* output policy (Classifier_Configuration.OUTPUT_POLICY) */
+    bool emit = false;
+    {output_policy}
+    if (!emit && !new_class) {{
+        cin->suppressed++;
+        return;
+    }}
+    out->suppressed = cin->suppressed;
+    cin->suppressed = 0;
+    cin->output_rtt = rtt;
+    if (cycleUpdates.ringbuf_output(out, sizeof(struct output), 0) != 0) {{
+        u32 zero = 0;
+        u64* lost = lost_events.lookup(&zero);
+        if (lost != NULL) {{
+            (*lost)++;
+        }}
+    }}
 }}
 
-static int classifier_tcp(struct __sk_buff *skb){{
+static int classifier_tcp(struct __sk_buff *skb, struct classifierConfig* cfg){{
     void *data = (void *)(unsigned long)skb->data;
     void *data_end = (void *)(unsigned long)skb->data_end;
     int minPacketSizeIP = sizeof(struct ethhdr) + sizeof(struct iphdr);
@@ -240,7 +351,7 @@ static int classifier_tcp(struct __sk_buff *skb){{
     struct connectionInfo* cin = infoMap.lookup(&cid);
     if (cin == NULL) {{
         u32 expectedAck = seqNumber + tcpLength;
-        return createNewCinEntry(bytes, expectedAck, cid, skb);
+        return createNewCinEntry(bytes, expectedAck, cid, skb, cfg);
     }} else {{
         struct seqAndAck* curr_seqAndAck = highestAckMap.lookup(&cid);
 
@@ -255,7 +366,7 @@ static int classifier_tcp(struct __sk_buff *skb){{
 
                 struct output out = {{}};
                 strcpy(out.protocol, "TCP");
-                handleOutput(&out, cin, cid, tcpLength, skb);  
+                handleOutput(&out, cin, cid, tcpLength, skb, cfg);  
                        
             }} else {{
                 cin->bytes += tcpLength;
@@ -265,14 +376,14 @@ static int classifier_tcp(struct __sk_buff *skb){{
             highestAckMap.insert(&cid, &curr_seqAck);
         }}
         infoMap.update(&cid, cin); 
-        u32 calc_class = cin->classID;{MAP_CLASSES}
+        u32 calc_class = map_class(cfg, cin->classID);
         skb->tc_classid = calc_class; 
         skb->tc_index = calc_class;
         return TC_ACT_OK;
     }}
 }}
 
-static int classifier_quic(struct __sk_buff *skb){{
+static int classifier_quic(struct __sk_buff *skb, struct classifierConfig* cfg){{
     void *data = (void *)(unsigned long)skb->data; 
     void *data_end = (void *)(unsigned long)skb->data_end;
     int minQuicPacketSize = sizeof(struct ethhdr) + sizeof(struct iphdr) + sizeof(struct udphdr) +  2;
@@ -458,7 +569,7 @@ static int classifier_quic(struct __sk_buff *skb){{
                     cin.lastSpins = 0 - quicL->longHeaderType & 0b01;
                     bpf_trace_printk("new connection, create entry");
                     cin.timestamp = bpf_ktime_get_ns();
-                    cin.classID = 0;
+                    cin.classID = cfg->initial_class;
                     cin.rtt = 0;
                     cin.bytes = bytes;
                     cin.responsive_count_ECN = 0;
@@ -492,22 +603,22 @@ static int classifier_quic(struct __sk_buff *skb){{
     struct connectionInfo* cin = infoMap.lookup(&cid);
     if (cin == NULL) {{
         u32 bytes = skb->len - minQuicPacketSize + 2;
-        return createNewCinEntry(bytes, 0, cid, skb);
+        return createNewCinEntry(bytes, 0, cid, skb, cfg);
     }} else {{ 
-        if ((cin->lastSpins + quicS->spinBit) % (1 << (EDGE_THRESHOLD)) == (1 << (EDGE_THRESHOLD - 1))) {{
+        if ((cin->lastSpins + quicS->spinBit) % (1 << (cfg->edge_threshold)) == (1 << (cfg->edge_threshold - 1))) {{
             struct output out = {{}};
             strcpy(out.protocol, "QUIC");
             out.lastSpins = cin->lastSpins;
             cin->lastSpins = (cin->lastSpins << 1) + quicS->spinBit; 
             
             u32 new_bytes = skb->len - minQuicPacketSize + 2;
-            handleOutput(&out, cin, cid, new_bytes, skb); 
+            handleOutput(&out, cin, cid, new_bytes, skb, cfg); 
         }}else {{
             cin->bytes += skb->len - minQuicPacketSize + 2;
             cin->lastSpins = (cin->lastSpins << 1) + quicS->spinBit;
         }}
         infoMap.update(&cid, cin);
-        u32 calc_class = cin->classID;{MAP_CLASSES}
+        u32 calc_class = map_class(cfg, cin->classID);
         skb->tc_classid = calc_class; 
         skb->tc_index = calc_class;
         return TC_ACT_OK;
@@ -524,10 +635,15 @@ int entrypoint_classifier(struct __sk_buff *skb){{
 
     struct iphdr *ip = data + sizeof(struct ethhdr);
 
+    struct classifierConfig* cfg = active_configuration();
+    if (cfg == NULL){{
+        return TC_ACT_UNSPEC;
+    }}
+
     if (ip->protocol == IPPROTO_TCP){{ 
-        return classifier_tcp(skb);
+        return classifier_tcp(skb, cfg);
     }} else if (ip->protocol == IPPROTO_UDP){{ 
-        return classifier_quic(skb);
+        return classifier_quic(skb, cfg);
     }} else {{
         return TC_ACT_UNSPEC;
     }}
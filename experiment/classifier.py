@@ -1,12 +1,45 @@
 import sys
+import json
+import os
+import select
+import socket
+import struct
+import time
+
+CSV_HEADER = "IP-Source,IP-Destination,Port-Source,Port-Destination,Timestamp,RTT,Class-ID,Bytes,ECN,Drops,NewClass,RespCnt_ECN,UnrespCnt_ECN,RespCnt_drop,UnrespCnt_drop,Protocol,Suppressed\n"
+# binary log (rotate to a .bin file), read by experiment/ClassifierLog.py: header with magic, format version and record size,
+# then every record prefixed with its length
+LOG_MAGIC = b"CRQCLOG\x00"
+LOG_VERSION = 2
+
+def control(socket_path, requests):
+    """Sends `command` or `command=argument` requests to the daemon, stops at the first failure."""
+    responses = []
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        stream = connection.makefile("rw")
+        for request in requests:
+            command, _, argument = request.partition("=")
+            stream.write(json.dumps({"command": command, "argument": argument if argument else None}) + "\n")
+            stream.flush()
+            responses.append(json.loads(stream.readline()))
+            if not responses[-1]["ok"]:
+                break
+    return responses
+
+# usage: classifier.py --daemon SOCKET
+#        classifier.py --control SOCKET COMMAND[=ARGUMENT]...
+# the control client returns before bcc is imported and anything is compiled
+if len(sys.argv) > 2 and sys.argv[1] == "--control":
+    responses = control(sys.argv[2], sys.argv[3:])
+    for response in responses:
+        print(json.dumps(response))
+    sys.exit(0 if len(responses) == len(sys.argv[3:]) and responses[-1]["ok"] else 1)
+
 import ctypes as ct
 import ipaddress as ia
 from bcc import BPF
 from pyroute2 import IPRoute
-import socket
-
-output_file = open(sys.argv[1], "w")
-output_file.write(f"IP-Source,IP-Destination,Port-Source,Port-Destination,Timestamp,RTT,Class-ID,Bytes,ECN,Drops,NewClass,RespCnt_ECN,UnrespCnt_ECN,RespCnt_drop,UnrespCnt_drop,Protocol\n")
 
 class Data(ct.Structure):
     _fields_ = [("srcIP", ct.c_uint),
@@ -25,49 +58,273 @@ class Data(ct.Structure):
                 ("unresponsive_count_ECN", ct.c_uint),
                 ("responsive_count_drop", ct.c_uint),
                 ("unresponsive_count_drop", ct.c_uint),
-                ("protocol", ct.c_char * 5)]
-
-def print_event(cpu, data, size):
-    event = ct.cast(data, ct.POINTER(Data)).contents
-    output_file.write(f"{ia.IPv4Address(event.srcIP)},{ia.IPv4Address(event.dstIP)},{event.srcPort},{event.dstPort},{event.timestamp},{event.rtt},{event.classID},{event.bytes},{int(event.ecn_markings & 0xFF)},{int(event.num_drops & 0xFF )},{event.newclass},{event.responsive_count_ECN},{event.unresponsive_count_ECN},{event.responsive_count_drop},{event.unresponsive_count_drop},{event.protocol.decode('utf-8').strip('\x00')}\n") 
+                ("protocol", ct.c_char * 5),
+                ("suppressed", ct.c_uint)]
 
 device = BOTTLENECK_CLIENT # interface bottleneck->client (track server->client traffic)
 device_client = BOTTLENECK_LOAD # interface bottleneck->loads (track client->server traffic)
 device_ifb = FIRST_IFB # ifb used for server->client direction
 
+def connection_id(k):
+    return f"{ia.IPv4Address(socket.ntohl(k.srcIP))}:{socket.ntohs(k.srcPrt)} <TO> {ia.IPv4Address(socket.ntohl(k.dstIP))}:{socket.ntohs(k.dstPrt)}"
+
+class ClassifierDaemon:
+    """Keeps the compiled programs loaded and serves the commands of the orchestrator between and during iterations."""
+    def __init__(self):
+        self.running = True
+        self.started = time.time()
+        self.output_file = None
+        self.output_path = None
+        self.binary = False
+        # snapshots of the per-flow summaries, written every summary_interval seconds (0: only when summarizing stops)
+        self.summary_file = None
+        self.summary_path = None
+        self.summary_interval = 0
+        self.next_summary = None
+        self.snapshots = 0
+        self.rows = 0
+        self.attached = {}
+        # raw records of the current poll, formatted and written at once after it
+        self.pending = []
+        # the active slot of the configuration map and its parameters
+        self.slot = 0
+        self.config = {}
+
+    def queue_event(self, ctx, data, size):
+        # the record is only valid during the callback
+        self.pending.append(ct.string_at(data, ct.sizeof(Data)))
+
+    def flush(self):
+        records, self.pending = self.pending, []
+        if self.output_file is None or not records:
+            return
+        if self.binary:
+            prefix = struct.pack("<I", ct.sizeof(Data))
+            self.output_file.write(b"".join(prefix + record for record in records))
+            self.rows += len(records)
+            return
+        lines = []
+        for record in records:
+            event = Data.from_buffer_copy(record)
+            lines.append(f"{ia.IPv4Address(event.srcIP)},{ia.IPv4Address(event.dstIP)},{event.srcPort},{event.dstPort},{event.timestamp},{event.rtt},{event.classID},{event.bytes},{int(event.ecn_markings & 0xFF)},{int(event.num_drops & 0xFF )},{event.newclass},{event.responsive_count_ECN},{event.unresponsive_count_ECN},{event.responsive_count_drop},{event.unresponsive_count_drop},{event.protocol.decode('utf-8').strip('\x00')},{event.suppressed}\n")
+        self.output_file.write("".join(lines))
+        self.rows += len(lines)
+
+    def lost(self):
+        # summed over the CPUs that wrote records
+        return b["lost_events"].sum(0).value
+
+    def attach(self, interface=None):
+        interface = interface if interface else device
+        if interface in self.attached:
+            return {"interface": interface}
+        if_index = ipr.link_lookup(ifname=interface)[0]
+        ipr.tc("add-filter", "bpf", if_index, ":1", fd=fn.fd, parent="ffff:fff3", classid=1, direct_action=True)
+        self.attached[interface] = if_index
+        return {"interface": interface}
+
+    def detach(self, interface=None):
+        errors = []
+        for name in [interface] if interface else list(self.attached):
+            if name not in self.attached:
+                continue
+            try:
+                ipr.tc("del-filter",  index=self.attached.pop(name), parent="ffff:fff3")
+            except Exception as e:
+                # the qdisc and its filter are gone if tc was cleared before
+                errors.append(f"{name}: {e}")
+        return {"errors": errors}
+
+    def reset(self, argument=None):
+        # every iteration starts without the flow state of the previous one
+        for table in [b["infoMap"], b["drops"], b["drop_results"], b["ecn"], b["highestAckMap"], b["lost_events"], b["flowSummaries"], drop_trace["currqdisc_en"]]:
+            table.clear()
+        return {}
+
+    def rotate(self, path=None):
+        """Closes the current output and starts `path` if given, as binary log if it ends with .bin and as CSV otherwise."""
+        b.ring_buffer_consume()
+        self.flush()
+        closed = {"closed": self.output_path, "rows": self.rows}
+        if self.output_file is not None:
+            self.output_file.close()
+        self.output_file = None
+        self.output_path = None
+        self.rows = 0
+        if path:
+            self.binary = path.endswith(".bin")
+            if self.binary:
+                self.output_file = open(path, "wb", buffering=1 << 20)
+                self.output_file.write(struct.pack("<8sHH", LOG_MAGIC, LOG_VERSION, ct.sizeof(Data)))
+            else:
+                self.output_file = open(path, "w")
+                self.output_file.write(CSV_HEADER)
+            self.output_path = path
+        return closed
+
+    def set_config(self, update=None):
+        """Writes the inactive slot of the configuration map and activates it. `update` is a JSON object or the path of a
+        JSON file with the parameters of Classifier_Configuration.get_runtime_config, missing parameters keep their value."""
+        config = dict(self.config)
+        if update:
+            if update.lstrip().startswith("{"):
+                values = json.loads(update)
+            else:
+                with open(update) as file:
+                    values = json.load(file)
+            unknown = set(values) - set(config)
+            if unknown:
+                raise ValueError(f"Unknown parameters {sorted(unknown)}")
+            config.update(values)
+        leaf = b["config"].Leaf()
+        if config["edge_threshold"] < 1:
+            raise ValueError("edge_threshold must be at least 1")
+        if len(config["transitions"]) != len(leaf.transitions) or len(config["queue_mapping"]) != len(leaf.queue_mapping):
+            raise ValueError(f"The classifier expects {len(leaf.transitions)} transitions and {len(leaf.queue_mapping)} queues")
+        leaf.edge_threshold = config["edge_threshold"]
+        leaf.initial_class = config["initial_class"]
+        leaf.default_class = config["default_class"]
+        leaf.records = config["records"]
+        leaf.summaries = config["summaries"]
+        for index, value in enumerate(config["transitions"]):
+            leaf.transitions[index] = value
+        for index, value in enumerate(config["queue_mapping"]):
+            leaf.queue_mapping[index] = value
+        slot = 1 - self.slot
+        b["config"][b["config"].Key(slot)] = leaf
+        # packets that are classified right now keep using the old slot
+        b["active_config"][b["active_config"].Key(0)] = b["active_config"].Leaf(slot)
+        self.slot = slot
+        self.config = config
+        return {"slot": slot}
+
+    def get_config(self, argument=None):
+        return dict(self.config, slot=self.slot)
+
+    def snapshot(self, argument=None):
+        return {"drops": [f"DROPS: {connection_id(k)} DROP {v.value}" for k, v in b["drop_results"].items()],
+                "ecn": [f"ECN: {connection_id(k)} ECN {v.value}" for k, v in b["ecn"].items()],
+                # the current class of every flow, the last Class-ID it logged
+                "classes": [[socket.ntohs(k.srcPrt), socket.ntohs(k.dstPrt), v.classID] for k, v in b["infoMap"].items()]}
+
+    def flow_summaries(self):
+        # bpf_ktime_get_ns counts like CLOCK_MONOTONIC, the current class lasts until now
+        now = time.monotonic_ns()
+        summaries = []
+        for k, v in b["flowSummaries"].items():
+            class_time = list(v.class_time)
+            if v.classID < len(class_time):
+                class_time[v.classID] += now - v.class_since
+            summaries.append({"flow": connection_id(k), "source_port": socket.ntohs(k.srcPrt), "destination_port": socket.ntohs(k.dstPrt),
+                              "class": v.classID, "reclassifications": v.reclassifications, "cycles": v.cycles, "bytes": v.bytes,
+                              "duration_ns": now - v.first_seen, "class_time_ns": {classID: ns for classID, ns in enumerate(class_time) if ns > 0},
+                              "rtt_log2_us": list(v.rtt_log2_us)})
+        return summaries
+
+    def write_summaries(self):
+        snapshot = json.dumps({"time": time.time(), "flows": self.flow_summaries()})
+        self.summary_file.write(snapshot + "\n")
+        self.summary_file.flush()
+        self.snapshots += 1
+        self.next_summary = time.time() + self.summary_interval if self.summary_interval > 0 else None
+
+    def summarize(self, argument=None):
+        """`FILE[,SECONDS]` starts writing snapshots of the per-flow summaries to FILE, without argument the last snapshot is
+        written and the file closed."""
+        closed = {"closed": self.summary_path, "snapshots": self.snapshots}
+        if self.summary_file is not None:
+            self.write_summaries()
+            closed["snapshots"] = self.snapshots
+            self.summary_file.close()
+        self.summary_file = None
+        self.summary_path = None
+        self.next_summary = None
+        self.snapshots = 0
+        if argument:
+            path, _, interval = argument.partition(",")
+            self.summary_interval = float(interval) if interval else 0
+            self.summary_file = open(path, "w")
+            self.summary_path = path
+            self.next_summary = time.time() + self.summary_interval if self.summary_interval > 0 else None
+        return closed
+
+    def stats(self, argument=None):
+        return {"uptime_s": time.time() - self.started, "attached": list(self.attached), "output": self.output_path, "rows": self.rows, "lost": self.lost(),
+                "flows": len(b["infoMap"]), "config_slot": self.slot}
+
+    def shutdown(self, argument=None):
+        self.detach()
+        self.rotate()
+        self.summarize()
+        self.running = False
+        return {}
+
+    def serve(self, connection):
+        connection.settimeout(5)
+        with connection:
+            stream = connection.makefile("rw")
+            for line in stream:
+                try:
+                    request = json.loads(line)
+                    if request["command"] not in ["attach", "detach", "reset", "set-config", "get-config", "rotate", "summarize", "snapshot", "stats", "shutdown"]:
+                        raise ValueError(f"Unknown command {request['command']}")
+                    response = getattr(self, request["command"].replace("-", "_"))(request["argument"])
+                    response["ok"] = True
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                stream.write(json.dumps(response) + "\n")
+                stream.flush()
+
+socket_path = sys.argv[2]
+daemon = ClassifierDaemon()
 ipr = IPRoute()
 
 b = BPF(src_file="classifier.c")
 fn = b.load_func("entrypoint_classifier", BPF.SCHED_CLS)
-if_index = ipr.link_lookup(ifname=device)[0]
+# the same defaults as Classifier_Configuration until the orchestrator sets its configuration
+queue_slots = len(b["config"].Leaf().queue_mapping)
+daemon.config = {"edge_threshold": 1, "initial_class": 0, "default_class": 9,
+                 "transitions": [classID for classID in range(queue_slots) for _ in range(len(b["config"].Leaf().transitions) // queue_slots)],
+                 "queue_mapping": list(range(queue_slots)), "records": 1, "summaries": 0}
+daemon.set_config()
+
+b["cycleUpdates"].open_ring_buffer(daemon.queue_event)
+
+ecn_trace = BPF(src_file="tracepoint_ecn.c")
+drop_trace = BPF(src_file="tracepoint_drops.c")
+
+tcp_client = BPF(src_file="tracepoint_tcp.c")
 
-b["cycleUpdates"].open_perf_buffer(print_event)
+drop_trace.attach_kprobe(event="htb_enqueue", fn_name="enqueue_skb")
+drop_trace.attach_kretprobe(event="htb_enqueue", fn_name="ret_enqueue_skb")
+drop_trace.attach_kprobe(event="tbf_enqueue", fn_name="enqueue_skb")
+drop_trace.attach_kretprobe(event="tbf_enqueue", fn_name="ret_enqueue_skb")
+
+drop_trace.attach_kprobe(event="kfree_skb_reason", fn_name="kfree_skb_own")
+
+if os.path.exists(socket_path):
+    os.unlink(socket_path)
+server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+server.bind(socket_path)
+server.listen()
 
 try:
-    ipr.tc("add-filter", "bpf", if_index, ":1", fd=fn.fd, parent="ffff:fff3", classid=1, direct_action=True)
-
-    ecn_trace = BPF(src_file="tracepoint_ecn.c")
-    drop_trace = BPF(src_file="tracepoint_drops.c")
-
-    tcp_client = BPF(src_file="tracepoint_tcp.c")
-    
-    drop_trace.attach_kprobe(event="htb_enqueue", fn_name="enqueue_skb")
-    drop_trace.attach_kretprobe(event="htb_enqueue", fn_name="ret_enqueue_skb")
-    drop_trace.attach_kprobe(event="tbf_enqueue", fn_name="enqueue_skb")
-    drop_trace.attach_kretprobe(event="tbf_enqueue", fn_name="ret_enqueue_skb")
-
-    drop_trace.attach_kprobe(event="kfree_skb_reason", fn_name="kfree_skb_own")
-        
-    print("Ready:")
-    while 1:
-        b.perf_buffer_poll()        
+    print(f"Listening: {socket_path}", flush=True)
+    while daemon.running:
+        b.ring_buffer_poll(timeout=10)
+        daemon.flush()
+        if daemon.next_summary is not None and time.time() >= daemon.next_summary:
+            daemon.write_summaries()
+        readable, _, _ = select.select([server], [], [], 0)
+        if readable:
+            try:
+                daemon.serve(server.accept()[0])
+            except OSError as e:
+                print(f"Control connection failed: {e}")
 except KeyboardInterrupt:
-    print("Done")
+    pass
 finally:
-    for k,v in b["drop_results"].items():
-        print(f"DROPS: {ia.IPv4Address(socket.ntohl(k.srcIP))}:{socket.ntohs(k.srcPrt)} <TO> {ia.IPv4Address(socket.ntohl(k.dstIP))}:{socket.ntohs(k.dstPrt)} DROP {v.value}")
-    print("\n")
-    for k,v in b["ecn"].items():
-        print(f"ECN: {ia.IPv4Address(socket.ntohl(k.srcIP))}:{socket.ntohs(k.srcPrt)} <TO> {ia.IPv4Address(socket.ntohl(k.dstIP))}:{socket.ntohs(k.dstPrt)} ECN {v.value}")
-    ipr.tc("del-filter",  index=if_index, parent="ffff:fff3")
-    output_file.close()
+    daemon.shutdown()
+    server.close()
+    os.unlink(socket_path)
+    print("Done")
@@ -0,0 +1,85 @@
+from invoke import Context
+from .Tracing import TracedConnection
+import os
+import shlex
+import subprocess
+
+class NamespaceConnection(Context):
+    """Drop-in replacement for a fabric Connection that executes commands inside a local network namespace."""
+    def __init__(self, namespace:str, working_dir:str):
+        super().__init__()
+        self.namespace = namespace
+        self.working_dir = working_dir
+
+    def _wrap(self, command:str, env=None) -> str:
+        # all namespaces share one pid space; restrict pkill to the processes of this namespace
+        command = command.replace("pkill ", "pkill --ns $$ --nslist net ")
+        exports = " ".join(f"{key}={shlex.quote(value)}" for key, value in (env or {}).items())
+        if exports:
+            command = f"export {exports} && {command}"
+        # relative paths behave like the home directory of an ssh login
+        return f"sudo ip netns exec {self.namespace} sh -c {shlex.quote(f'cd {shlex.quote(self.working_dir)} && {command}')}"
+
+    def run(self, command, **kwargs):
+        env = kwargs.pop("env", None)
+        return super().run(self._wrap(command, env), **kwargs)
+
+    def stream(self, command:str, local_path:str) -> int:
+        """Writes the raw stdout of `command` to `local_path` and returns its exit status."""
+        with open(local_path, "wb") as file:
+            return subprocess.run(self._wrap(command), shell=True, stdout=file, stderr=subprocess.DEVNULL).returncode
+
+    def _remote_path(self, path:str) -> str:
+        return path if os.path.isabs(path) else os.path.join(self.working_dir, path)
+
+    def get(self, remote, local=None):
+        remote_path = self._remote_path(remote)
+        if local is None:
+            local = os.getcwd()
+        if local.endswith("/") or os.path.isdir(local):
+            local = os.path.join(local, os.path.basename(remote_path))
+        # artifacts are created by root inside the namespace
+        super().run(f"sudo cp {shlex.quote(remote_path)} {shlex.quote(local)} && sudo chown {os.getuid()}:{os.getgid()} {shlex.quote(local)}", hide=True)
+
+    def put(self, local, remote=None):
+        remote_path = self._remote_path(remote if remote is not None else os.path.basename(local))
+        super().run(f"sudo mkdir -p {shlex.quote(os.path.dirname(remote_path))} && sudo cp {shlex.quote(local)} {shlex.quote(remote_path)}", hide=True)
+
+    def close(self):
+        pass
+
+
+class NamespaceConnector(object):
+    """Counterpart to SSHConnector for the hosts of a VirtualTestbed."""
+    def __init__(self, namespace:str, local_ip:str, working_dir:str):
+        self.management_ip = namespace
+        self.local_ip = local_ip
+        self.namespace = namespace
+        self.working_dir = working_dir
+        self.connection = None
+        # all namespaces share the file system of the local machine, absolute paths are the same for every host
+        self.storage = "localhost"
+        # relative paths (e.g., the qlogs of the stacks) are resolved against the working directory, see NamespaceConnection
+        self.home_dir = working_dir
+        # qdisc tree that is currently applied in this namespace, see TC_Configuration.get_tree
+        self.applied_tc_tree = None
+        self.tracer = None
+        # classifier sources on this host and the classifier daemon that runs them, see ExperimentConfiguration._prepare_classifier
+        self.classifier_hash = None
+        self.classifier_daemon = None
+
+    def get_connection(self):
+        if not self.connection:
+            self.connection = NamespaceConnection(self.namespace, self.working_dir)
+        if self.tracer is not None:
+            return TracedConnection(self.connection, self.tracer, self.namespace)
+        return self.connection
+
+    def is_alive(self) -> bool:
+        return self.connection is not None
+
+    def reset_connection(self):
+        self.connection = None
+
+    def start_connection(self):
+        self.get_connection()
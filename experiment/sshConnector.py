@@ -1,21 +1,60 @@
 from fabric import Connection, Config
+from time import perf_counter
+from .Tracing import TracedConnection
 
 class SSHConnector(object):
-    def __init__(self, management_ip, local_ip, user, key_filename):
+    def __init__(self, management_ip, local_ip, user, key_filename, keepalive_s:int = 30):
         self.management_ip = management_ip
         self.local_ip = local_ip
         self.user = user
         self.conf = Config()
         self.conf.connect_kwargs = {"key_filename": [key_filename]}
         self.connection = None
+        self._keepalive_s = keepalive_s
+        # hosts with the same storage share their files (traffic files, LOCAL_TMP_PATH), see ExperimentConfiguration._create_files
+        self.storage = management_ip
+        # QLOGDIR and SSLKEYLOGFILE of the stacks
+        self.home_dir = "/home/test"
+        # bookkeeping for the connection pool report
+        self.connects = 0
+        self.reuses = 0
+        self.setup_time_s = 0.0
+        # qdisc tree that is currently applied on this host, see TC_Configuration.get_tree
+        self.applied_tc_tree = None
+        # set while an experiment records a trace, see Tracing.py
+        self.tracer = None
+        # classifier sources on this host and the classifier daemon that runs them, see ExperimentConfiguration._prepare_classifier
+        self.classifier_hash = None
+        self.classifier_daemon = None
 
-    def get_connection(self):
+    def _connect(self):
+        print(f"New SSH connection for: {self.management_ip}")
+        start = perf_counter()
+        self.connection = Connection(host=self.management_ip,
+                            user=self.user,
+                            config=self.conf)
+        self.connection.open()
+        # keep the transport alive between iterations so that idle phases do not drop it
+        if self.connection.transport is not None and self._keepalive_s:
+            self.connection.transport.set_keepalive(self._keepalive_s)
+        self.setup_time_s += perf_counter() - start
+        self.connects += 1
+
+    def is_alive(self) -> bool:
+        # cheap health check: only inspects the state of the local transport
         if not self.connection:
-            print(f"New SSH connection for: {self.management_ip}")
-            self.connection = Connection(host=self.management_ip,
-                                user=self.user,
-                                config=self.conf)
-            self.connection.open()
+            return False
+        transport = self.connection.transport
+        return transport is not None and transport.is_active() and transport.is_authenticated()
+
+    def get_connection(self):
+        if not self.is_alive():
+            if self.connection:
+                print(f"SSH connection for {self.management_ip} is broken, reconnect.")
+                self.reset_connection()
+            self._connect()
+        if self.tracer is not None:
+            return TracedConnection(self.connection, self.tracer, self.management_ip)
         return self.connection
 
     def reset_connection(self):
@@ -26,9 +65,51 @@ class SSHConnector(object):
         self.connection = None
 
     def start_connection(self):
-        if not self.connection:
-            print(f"New SSH connection for: {self.management_ip}")
-            self.connection = Connection(host=self.management_ip,
-                                user=self.user,
-                                config=self.conf)
-            self.connection.open()
+        if self.is_alive():
+            self.reuses += 1
+            return
+        self.get_connection()
+
+    def average_setup_time_s(self) -> float:
+        if self.connects == 0:
+            return 0.0
+        return self.setup_time_s / self.connects
+
+
+class SSHConnectionPool(object):
+    """Keeps one SSHConnector (and thus one multiplexed transport) per host alive for a whole run."""
+
+    def __init__(self, keepalive_s:int = 30):
+        self._keepalive_s = keepalive_s
+        self._connectors = {}
+
+    def get(self, management_ip, local_ip, user, key_filename) -> SSHConnector:
+        key = (management_ip, user, key_filename)
+        connector = self._connectors.get(key)
+        if connector is None:
+            connector = SSHConnector(management_ip=management_ip,
+                                     local_ip=local_ip,
+                                     user=user,
+                                     key_filename=key_filename,
+                                     keepalive_s=self._keepalive_s)
+            self._connectors[key] = connector
+        # reuses are counted by start_connection, when the connection is actually needed
+        connector.local_ip = local_ip
+        return connector
+
+    def connectors(self):
+        return list(self._connectors.values())
+
+    def saved_setup_time_s(self) -> float:
+        return sum(connector.reuses * connector.average_setup_time_s() for connector in self._connectors.values())
+
+    def report(self) -> str:
+        lines = []
+        for connector in self._connectors.values():
+            lines.append(f"{connector.management_ip}: {connector.connects} connects ({connector.setup_time_s:.2f}s), {connector.reuses} reuses")
+        lines.append(f"SSH setup time saved by connection reuse: {self.saved_setup_time_s():.2f}s")
+        return "\n".join(lines)
+
+    def close_all(self):
+        for connector in self._connectors.values():
+            connector.reset_connection()
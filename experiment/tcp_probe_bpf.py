@@ -5,6 +5,7 @@
 #           For Linux, uses BCC, eBPF. Embedded C.
 #
 # USAGE: tcp_probe ["filter"]
+#        tcp_probe --binary --on-change --min-interval-us 1000 --output FILE
 #
 # The filter syntax is inspired by tcpdump style filters
 # use can use "host IP", "net IP/NETMASK", "saddr IP", "daddr IP", "port NUMBER",
@@ -19,6 +20,10 @@
 # IPv4 addresses are printed as dotted quads. Currently only IPv4 matchting is
 # supported
 #
+# With --binary, the raw records are written instead (converted with experiment/TcpProbeLog.py).
+# --on-change and --min-interval-us sample the records per flow in the kernel: a record
+# is emitted when the state changed or the interval passed since the last record of the flow.
+#
 # Copyright (c) 2017 Jan Rüth.
 # Licensed under the Apache License, Version 2.0 (the "License")
 #
@@ -52,15 +57,30 @@ parser.add_argument('--filter', '-f',
 
 parser.add_argument('--output', '-o', dest="output", action="store", help="Output file name")
 
+parser.add_argument('--binary', '-b', dest="binary", action="store_true", help="Write the raw records to the output file instead of text")
+
+parser.add_argument('--on-change', dest="on_change", action="store_true", help="Only emit a record when cwnd, ssthresh, srtt, or the CA state of the flow changed")
+
+parser.add_argument('--min-interval-us', dest="min_interval_us", action="store", type=int, default=0, help="Emit at most one record per flow every this many microseconds, with --on-change additionally one whenever the state changed")
+
 args = parser.parse_args()
 
+if args.binary and args.output == None:
+    parser.error("--binary needs --output")
+
 output_file = None
 OUTPUT_CALL = print
 
-if args.output != None:
+if args.output != None and args.binary:
+    output_file = open(args.output, "wb", buffering=1 << 20)
+elif args.output != None:
     output_file = open(args.output, "w")
     OUTPUT_CALL = output_file.write
 
+# binary log: header with magic, format version and record size, then every record prefixed with its length
+LOG_MAGIC = b"CRQTCPP\x00"
+LOG_VERSION = 1
+
 # define BPF program
 prog = """
     #define KBUILD_MODNAME "tcp_prober"
@@ -111,6 +131,17 @@ prog = """
 
     BPF_PERF_OUTPUT(events);
 
+    // the last emitted state of every socket for the sampling
+    struct probe_state {
+        u64 ts;
+        u32 snd_cwnd;
+        u32 ssthresh;
+        u32 srtt;
+        u8 ca_state;
+    };
+
+    BPF_TABLE("lru_hash", u64, struct probe_state, last_state, 10240);
+
     static inline int check_network4(u32 cmp, u32 truth, u32 bitmask)
     {
         u32 masked_addr = truth & bitmask;
@@ -205,6 +236,8 @@ prog = """
         data.bytes_received = tp->bytes_received;
         data.bytes_acked = tp->bytes_acked;
 
+        // SAMPLING
+
         events.perf_submit(ctx, &data, sizeof(data));
 
         return;
@@ -212,6 +245,27 @@ prog = """
 
     """
 
+# a record is emitted if the state changed (--on-change) or the interval passed (--min-interval-us) since the last record of the flow,
+# with only one of them set, only that condition applies. the first record of a flow is always emitted
+sampling = """
+        u64 sk_key = (u64)sk;
+        struct probe_state* last = last_state.lookup(&sk_key);
+        if (last != NULL) {{
+            int changed = last->snd_cwnd != data.snd_cwnd || last->ssthresh != data.ssthresh || last->srtt != data.srtt || last->ca_state != ca_state;
+            int due = {min_interval_ns} > 0 && data.ts - last->ts >= {min_interval_ns};
+            if (!(({on_change} && changed) || due))
+                return;
+        }}
+        // zero initialized, the verifier rejects passing the uninitialized padding to the map
+        struct probe_state state = {{}};
+        state.ts = data.ts;
+        state.snd_cwnd = data.snd_cwnd;
+        state.ssthresh = data.ssthresh;
+        state.srtt = data.srtt;
+        state.ca_state = ca_state;
+        last_state.update(&sk_key, &state);
+"""
+
 test_net = "({0} == (data.src.v4.sin_addr.s_addr & {1}) || {0} == (data.dst.v4.sin_addr.s_addr & {1}))"
 test_host= "(data.src.v4.sin_addr.s_addr == {0} || data.dst.v4.sin_addr.s_addr == {0})"
 test_saddr="(data.src.v4.sin_addr.s_addr == {0})"
@@ -358,6 +412,8 @@ else:
     expr = "if (!( " + parse_filter(args.filter) + " )) return;"
 
 print("Using filter expression: {}".format(expr), file=sys.stderr)
+if args.on_change or args.min_interval_us > 0:
+    prog = prog.replace("// SAMPLING", sampling.format(on_change=int(args.on_change), min_interval_ns=args.min_interval_us * 1000))
 b = BPF(text=prog.replace("// VERIFY NETWORK", expr), debug=0x00)
 b.attach_kprobe(event="tcp_rcv_established", fn_name="my_rcv_established")
 
@@ -414,7 +470,10 @@ print("Ready")
 print("\n")
 format_string = "{:<14}\t{:<21}\t{:<21}\t{:<6}\t{:<10}\t{:<10}\t{:<10}\t{:<10}\t{:<10}\t{:<10}\t{:<10}\t{:<10}\t{:<10}\t{:<10}\t{:<10}\t{:<10}\t{:<10}\t{:<10}\t{:<10}\t{:<10}\t{:<20}\t{:<20}\t{:<21}\t{:<21}\t{:<21}"
 
-OUTPUT_CALL(format_string.format("TIME(s)", "src", "dst", "length", "seq", "ack_seq", "snd_nxt", "rcv_nxt", "snd_una", "snd_wnd", "rcv_wnd", "snd_cwnd", "ssthresh", "srtt", "lost_out", "sacked_out", #"fackets_out", 
+if args.binary:
+    output_file.write(struct.pack("<8sHH", LOG_MAGIC, LOG_VERSION, ct.sizeof(Data)))
+else:
+    OUTPUT_CALL(format_string.format("TIME(s)", "src", "dst", "length", "seq", "ack_seq", "snd_nxt", "rcv_nxt", "snd_una", "snd_wnd", "rcv_wnd", "snd_cwnd", "ssthresh", "srtt", "lost_out", "sacked_out", #"fackets_out", 
 "retrans_out", "segs_out", "segs_in", "total_retrans", "bytes_received", "byted_acked", "rate", "intervalus", "skbuf_pacingrate"))
 
 total = 0
@@ -436,13 +495,19 @@ def store_event(cpu, data, size):
                                event.segs_in, event.total_retrans, event.bytes_received, event.bytes_acked,
                                event.rate, event.intervalus, event.skbuf_pacingrate))
 
+record_prefix = struct.pack("<I", ct.sizeof(Data))
+def store_record(cpu, data, size):
+    global total
+    total += 1
+    output_file.write(record_prefix + ct.string_at(data, ct.sizeof(Data)))
+
 def lost(x):
     global total
     global totalerr
     totalerr += 1
     OUTPUT_CALL("{}/{} {}\n".format(totalerr, total, total+totalerr), file=sys.stderr)
 
-b["events"].open_perf_buffer(lambda cpu, data, size: store_event(cpu, data, size), page_cnt=32, lost_cb=lost)
+b["events"].open_perf_buffer(store_record if args.binary else lambda cpu, data, size: store_event(cpu, data, size), page_cnt=32, lost_cb=lost)
 
 startTime = time.time()
 try:
@@ -476,6 +541,9 @@ except Exception as thrown_exception:
 finally:
     b.detach_kprobe("tcp_rcv_established")
     running = False
-    OUTPUT_CALL("Total: {} Errors: {}".format(total, totalerr))
+    if args.binary:
+        print("Total: {} Errors: {}".format(total, totalerr))
+    else:
+        OUTPUT_CALL("Total: {} Errors: {}".format(total, totalerr))
     if output_file:
         output_file.close()